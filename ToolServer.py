@@ -1,22 +1,23 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 import sys
 import os
 from datetime import datetime, timezone
 from zoneinfo import ZoneInfo
 import asyncio
-import re
-import math
-import random
+import threading
+import time
+from contextlib import asynccontextmanager
+import json
+import uuid
 
-# Import the web search tool
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
-from llm_web_search import Tools as WebSearchTools
+from calculator import safe_calculate, calculate_batch
+from units import convert_units, unit_label
+from dice import roll_dice, describe_distribution
+from metrics import start_request_metrics, current_request_metrics, render_metrics
 
 app = Flask(__name__)
 
-# Initialize the web search tool
-web_search_tools = WebSearchTools()
-
 # ============= AUTO-CONFIGURE WEB SEARCH TOOL =============
 # Set up the models directory automatically
 MODELS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'models')
@@ -26,142 +27,57 @@ if not os.path.exists(MODELS_DIR):
     os.makedirs(MODELS_DIR)
     print(f"[Tools API] Created models directory: {MODELS_DIR}")
 
-# Configure the web search tool
-web_search_tools.valves.embedding_model_save_path = MODELS_DIR
-web_search_tools.valves.num_results = 10
-web_search_tools.valves.max_results = 8
-web_search_tools.valves.cpu_only = False  # Set to True if you don't have a GPU
-web_search_tools.valves.simple_search = False
-web_search_tools.valves.keep_results_in_context = False
-web_search_tools.valves.duckduckgo_only = True
-web_search_tools.valves.chunk_size = 400
-web_search_tools.valves.include_citations = False
-web_search_tools.valves.ensemble_weighting = 0.5
-web_search_tools.valves.keyword_retriever = "bm25"  # Use bm25 (lighter) instead of splade
-web_search_tools.valves.splade_batch_size = 8
-web_search_tools.valves.chunker = "character-based"  # Must be either 'character-based', 'semantic' or 'neural'.
-web_search_tools.valves.chunker_breakpoint_threshold_amount = 30
-web_search_tools.valves.similarity_score_threshold = 0.5
-web_search_tools.valves.client_timeout = 20
-web_search_tools.valves.searxng_url = "None"
-
-print(f"[Tools API] Web search configured:")
-print(f"  - Models directory: {MODELS_DIR}")
-print(f"  - CPU only mode: {web_search_tools.valves.cpu_only}")
-print(f"  - Keyword retriever: {web_search_tools.valves.keyword_retriever}")
-print(f"  - Chunker: {web_search_tools.valves.chunker}")
-# ============= END AUTO-CONFIGURATION =============
-
-# ============= CALCULATOR AND UNIT CONVERSION =============
-# Common unit conversions (from -> to)
-UNIT_CONVERSIONS = {
-    # Temperature
-    'fahrenheit_to_celsius': lambda f: (f - 32) * 5/9,
-    'celsius_to_fahrenheit': lambda c: (c * 9/5) + 32,
-    'f_to_c': lambda f: (f - 32) * 5/9,
-    'c_to_f': lambda c: (c * 9/5) + 32,
-    
-    # Length
-    'miles_to_kilometers': lambda m: m * 1.60934,
-    'kilometers_to_miles': lambda k: k / 1.60934,
-    'feet_to_meters': lambda f: f * 0.3048,
-    'meters_to_feet': lambda m: m / 0.3048,
-    'inches_to_centimeters': lambda i: i * 2.54,
-    'centimeters_to_inches': lambda c: c / 2.54,
-    'miles_to_km': lambda m: m * 1.60934,
-    'km_to_miles': lambda k: k / 1.60934,
-    'ft_to_m': lambda f: f * 0.3048,
-    'm_to_ft': lambda m: m / 0.3048,
-    
-    # Weight/Mass
-    'pounds_to_kilograms': lambda p: p * 0.453592,
-    'kilograms_to_pounds': lambda k: k / 0.453592,
-    'ounces_to_grams': lambda o: o * 28.3495,
-    'grams_to_ounces': lambda g: g / 28.3495,
-    'lbs_to_kg': lambda p: p * 0.453592,
-    'kg_to_lbs': lambda k: k / 0.453592,
-    
-    # Volume
-    'gallons_to_liters': lambda g: g * 3.78541,
-    'liters_to_gallons': lambda l: l / 3.78541,
-    'cups_to_milliliters': lambda c: c * 236.588,
-    'milliliters_to_cups': lambda m: m / 236.588,
-    'gal_to_l': lambda g: g * 3.78541,
-    'l_to_gal': lambda l: l / 3.78541,
-}
-
-def safe_calculate(expression):
-    """Safely evaluate a mathematical expression"""
-    # Remove any potentially dangerous characters
-    expression = expression.strip()
-    
-    # Allow only numbers, operators, parentheses, and math functions
-    allowed_chars = set('0123456789+-*/().%^ ')
-    allowed_words = {'sin', 'cos', 'tan', 'sqrt', 'log', 'ln', 'abs', 'pi', 'e'}
-    
-    # Replace common math terms
-    expression = expression.replace('^', '**')  # Power operator
-    expression = expression.replace('π', 'pi')
-    expression = expression.replace('√', 'sqrt')
-    
-    # Create safe math namespace
-    safe_dict = {
-        'sin': math.sin,
-        'cos': math.cos,
-        'tan': math.tan,
-        'sqrt': math.sqrt,
-        'log': math.log10,
-        'ln': math.log,
-        'abs': abs,
-        'pi': math.pi,
-        'e': math.e,
-        '__builtins__': {}
-    }
+def configure_web_search_tools(web_search_tools):
+    """Configure the web search tool"""
+    web_search_tools.valves.embedding_model_save_path = MODELS_DIR
+    web_search_tools.valves.num_results = 10
+    web_search_tools.valves.max_results = 8
+    web_search_tools.valves.cpu_only = False  # Set to True if you don't have a GPU
+    web_search_tools.valves.simple_search = False
+    web_search_tools.valves.keep_results_in_context = False
+    web_search_tools.valves.duckduckgo_only = True
+    web_search_tools.valves.chunk_size = 400
+    web_search_tools.valves.include_citations = False
+    web_search_tools.valves.ensemble_weighting = 0.5
+    web_search_tools.valves.keyword_retriever = "bm25"  # Use bm25 (lighter) instead of splade
+    web_search_tools.valves.splade_batch_size = 8
+    web_search_tools.valves.cascade_candidates = 0  # BM25 prefilter size before dense/SPLADE inference (0 = disabled)
+    web_search_tools.valves.chunker = "character-based"  # Must be either 'character-based', 'semantic' or 'neural'.
+    web_search_tools.valves.chunker_breakpoint_threshold_amount = 30
+    web_search_tools.valves.similarity_score_threshold = 0.5
+    web_search_tools.valves.max_result_tokens = 0  # Default result budget when the caller doesn't send one (0 = unlimited)
+    web_search_tools.valves.query_cache_size = 64  # Recent results re-used for rephrased queries (0 = disabled)
+    web_search_tools.valves.query_cache_ttl = 300  # Seconds
+    web_search_tools.valves.query_cache_similarity_threshold = 0.9
+    web_search_tools.valves.local_index_max_age = 600  # Seconds that retrieved chunks answer follow-up queries (0 = disabled)
+    web_search_tools.valves.local_index_max_mb = 64
+    web_search_tools.valves.local_index_confidence_threshold = 0.6
+    web_search_tools.valves.client_timeout = 20
+    web_search_tools.valves.searxng_url = "None"
     
-    try:
-        result = eval(expression, safe_dict)
-        return result
-    except Exception as e:
-        raise ValueError(f"Invalid mathematical expression: {str(e)}")
+    print(f"[Tools API] Web search configured:")
+    print(f"  - Models directory: {MODELS_DIR}")
+    print(f"  - CPU only mode: {web_search_tools.valves.cpu_only}")
+    print(f"  - Keyword retriever: {web_search_tools.valves.keyword_retriever}")
+    print(f"  - Chunker: {web_search_tools.valves.chunker}")
 
-def convert_units(value, conversion_type):
-    """Convert between units"""
-    conversion_key = conversion_type.lower().replace(' ', '_')
-    
-    if conversion_key in UNIT_CONVERSIONS:
-        result = UNIT_CONVERSIONS[conversion_key](value)
-        return result
-    else:
-        raise ValueError(f"Unknown conversion type: {conversion_type}")
-
-# ============= END CALCULATOR =============
-
-# ============= RPG DICE ROLLER =============
-def rpg_dice_roll(dice_expression: str) -> str:
-    """
-    Rolls a given number of dice with a given number of sides.
-    The expression should be in the format 'XdY' (e.g., '2d6', '1d20', '3d10').
-    X is the number of dice, Y is the number of sides per die.
-    """
-    # Regex to parse the dice expression
-    match = re.match(r"(\d+)[dD](\d+)", dice_expression.strip())
-    if not match:
-        return "Invalid dice expression. Please use the format 'XdY' (e.g., '2d6', '1d20')."
-
-    num_dice = int(match.group(1))
-    num_sides = int(match.group(2))
-
-    if num_dice <= 0 or num_sides <= 0:
-        return "The number of dice and sides must be greater than zero."
-    
-    if num_dice > 100:
-        return "Maximum 100 dice allowed per roll."
+# Admission control for searches (see SearchAdmission)
+MAX_CONCURRENT_SEARCHES = 2  # Searches that run model inference at the same time
+MAX_QUEUED_SEARCHES = 8  # Searches that may wait for a free slot before requests are rejected as busy
+TOOL_CALL_TIMEOUT = 60  # Default per-call timeout (seconds) for batched /tools/execute requests
+REFINED_RESULT_TTL = 300  # Seconds for which two-tier search handles can be used to fetch the refined result
+WARMUP_LOAD_MODELS = True  # Load the embedding models during warm-up instead of on the first search
+WARMUP_WAIT_TIMEOUT = 120  # Seconds a search request waits for the warm-up before it is rejected as busy
+CHARS_PER_TOKEN = 4  # Same estimate as llm_web_search.CHARS_PER_TOKEN (not imported, see WEB SEARCH WARM-UP)
+# ============= END AUTO-CONFIGURATION =============
 
-    results = [random.randint(1, num_sides) for _ in range(num_dice)]
-    total = sum(results)
-    
-    return f"Rolling {dice_expression}: {results}. Total: {total}"
-# ============= END DICE ROLLER =============
+def get_result_budget(parameters):
+    """Character budget for search results, from the optional 'max_chars' or 'max_tokens' parameter"""
+    if parameters.get('max_chars'):
+        return int(parameters['max_chars'])
+    if parameters.get('max_tokens'):
+        return int(parameters['max_tokens']) * CHARS_PER_TOKEN
+    return 0
 
 # Mock user and event emitter for the tools
 mock_user = {"id": "discord_bot"}
@@ -177,9 +93,301 @@ async def mock_event_emitter(event):
     else:
         print(f"[Event] {event_type}")
 
-@app.route('/health', methods=['GET'])
-def health():
-    return jsonify({
+# ============= TOOLS EVENT LOOP =============
+# Every tool coroutine runs on this single long-lived event loop, so that sessions,
+# caches and model executors are shared across requests instead of being tied to a
+# throwaway loop per request. The cheap tools are served from the same loop, so the
+# search pipeline must keep blocking work (model inference, HTML parsing) off it.
+tools_loop = asyncio.new_event_loop()
+tools_loop_thread = None
+tools_loop_lock = threading.Lock()
+
+def run_async(coro):
+    """Run a coroutine on the tools event loop from a (Flask) worker thread and wait for its result"""
+    global tools_loop_thread
+    with tools_loop_lock:
+        if tools_loop_thread is None and not tools_loop.is_running():
+            tools_loop_thread = threading.Thread(target=tools_loop.run_forever, name='tools-loop', daemon=True)
+            tools_loop_thread.start()
+    return asyncio.run_coroutine_threadsafe(coro, tools_loop).result()
+# ============= END TOOLS EVENT LOOP =============
+
+# ============= SEARCH ADMISSION CONTROL =============
+class ServerBusyError(Exception):
+    pass
+
+class SearchAdmission:
+    """
+    Bounded pool of search slots with a bounded wait queue. At most 'max_workers'
+    searches run at once and at most 'max_queue' wait for a slot; further searches
+    are rejected immediately with ServerBusyError instead of piling up.
+    Only used from the tools event loop, so the counters need no locking.
+    """
+
+    def __init__(self, max_workers, max_queue):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.semaphore = asyncio.Semaphore(max_workers)
+        self.running = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    @asynccontextmanager
+    async def slot(self):
+        if self.running >= self.max_workers and self.waiting >= self.max_queue:
+            self.rejected += 1
+            raise ServerBusyError("The tools server is busy, please try again shortly")
+
+        self.waiting += 1
+        start = time.perf_counter()
+        try:
+            await self.semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        wait = time.perf_counter() - start
+        self.admitted += 1
+        self.total_wait += wait
+        self.max_wait = max(self.max_wait, wait)
+
+        self.running += 1
+        try:
+            yield
+        finally:
+            self.running -= 1
+            self.semaphore.release()
+
+    def stats(self):
+        return {
+            'running': self.running,
+            'queued': self.waiting,
+            'max_workers': self.max_workers,
+            'max_queue': self.max_queue,
+            'admitted': self.admitted,
+            'rejected': self.rejected,
+            'avg_wait_ms': round(1000 * self.total_wait / self.admitted, 1) if self.admitted else 0.0,
+            'max_wait_ms': round(1000 * self.max_wait, 1)
+        }
+
+search_admission = SearchAdmission(MAX_CONCURRENT_SEARCHES, MAX_QUEUED_SEARCHES)
+
+def busy_response(error):
+    print(f"[Tools API] Rejected search: {str(error)}")
+    return {
+        'success': False,
+        'busy': True,
+        'error': str(error)
+    }, 503
+# ============= END SEARCH ADMISSION CONTROL =============
+
+# ============= WEB SEARCH WARM-UP =============
+# llm_web_search pulls in torch, transformers, sentence_transformers, sklearn and scipy,
+# which takes several seconds. It is imported by a background thread, so that the
+# cheap tools are served right after the process starts; search requests wait for it.
+web_search_module = None
+web_search_tools = None
+web_search_ready = threading.Event()  # Set once the import has finished or failed
+warmup_thread = None
+warmup_lock = threading.Lock()
+warmup_status = {
+    'import_seconds': None,
+    'models_seconds': None,
+    'error': None
+}
+
+class WebSearchUnavailableError(ServerBusyError):
+    """Raised when web search is still warming up, or failed to import"""
+
+def warm_up():
+    global web_search_module, web_search_tools
+    start = time.perf_counter()
+    try:
+        import llm_web_search
+        tools = llm_web_search.Tools()
+        configure_web_search_tools(tools)
+        web_search_module, web_search_tools = llm_web_search, tools
+        warmup_status['import_seconds'] = round(time.perf_counter() - start, 3)
+        print(f"[Tools API] Web search imported in {warmup_status['import_seconds']}s")
+    except Exception as e:
+        warmup_status['error'] = f"Web search failed to load: {e}"
+        print(f"[Tools API] {warmup_status['error']}")
+        return
+    finally:
+        web_search_ready.set()
+    
+    if not tools.valves.cpu_only:
+        try:
+            import torch
+            if torch.cuda.is_available():
+                print(f"[Tools API] GPU available: {torch.cuda.get_device_name(0)}")
+            else:
+                print("[Tools API] GPU: Not available (will use CPU)")
+        except:
+            print("[Tools API] GPU: PyTorch not installed or no GPU")
+    
+    if WARMUP_LOAD_MODELS:
+        start = time.perf_counter()
+        try:
+            run_async(load_search_models(tools))
+            warmup_status['models_seconds'] = round(time.perf_counter() - start, 3)
+            print(f"[Tools API] Search models loaded in {warmup_status['models_seconds']}s")
+        except Exception as e:
+            # Not fatal: the first search retries loading the models
+            print(f"[Tools API] Could not load search models during warm-up: {str(e)}")
+
+async def load_search_models(tools):
+    """Load the embedding models the same way the first search would"""
+    async with tools.models_lock:
+        retriever = tools.document_retriever
+        if retriever.embedding_model is None:
+            retriever.update_settings(tools.valves)
+            await retriever.aload_models(mock_event_emitter)
+
+def start_warmup():
+    """Start importing web search in the background (once)"""
+    global warmup_thread
+    with warmup_lock:
+        if warmup_thread is None:
+            warmup_thread = threading.Thread(target=warm_up, name='web-search-warmup', daemon=True)
+            warmup_thread.start()
+
+async def get_web_search_tools():
+    """The web search tool, waiting for the warm-up if it hasn't finished yet"""
+    start_warmup()
+    if not web_search_ready.is_set():
+        print("[Tools API] Waiting for web search warm-up...")
+        await asyncio.to_thread(web_search_ready.wait, WARMUP_WAIT_TIMEOUT)
+    if web_search_tools is None:
+        raise WebSearchUnavailableError(warmup_status['error'] or 'Web search is still starting up, try again shortly')
+    # Let the search pipeline report its stages to this request's recorder
+    web_search_module.metrics_recorder.set(current_request_metrics.get())
+    return web_search_tools
+# ============= END WEB SEARCH WARM-UP =============
+
+# ============= IN-FLIGHT REQUEST COALESCING =============
+class SingleFlight:
+    """
+    Coalesces identical in-flight calls: while a call for a key is running, later
+    callers with the same key await the first caller's result instead of repeating
+    the work. Results are not kept once the call finishes (that's the query cache's job).
+    """
+
+    def __init__(self):
+        self.in_flight = {}
+        self.coalesced = 0
+
+    async def do(self, key, coro_fn):
+        task = self.in_flight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(coro_fn())
+            self.in_flight[key] = task
+            task.add_done_callback(lambda _: self.in_flight.pop(key, None))
+        else:
+            self.coalesced += 1
+            print(f"[Tools API] Joining in-flight {key[0]} call")
+        # Shielded, so that one caller disconnecting doesn't cancel the others' result
+        return await asyncio.shield(task)
+
+search_flights = SingleFlight()
+
+def normalize_query(query):
+    return ' '.join(query.lower().split())
+
+async def run_search_web(query, max_chars):
+    """Run a web search, coalesced with identical in-flight searches and subject to admission control"""
+    async def search():
+        tools = await get_web_search_tools()
+        async with search_admission.slot():
+            return await tools.search_web(query, mock_user, mock_event_emitter, max_chars)
+    return await search_flights.do(('search_web', normalize_query(query), max_chars), search)
+
+async def run_search_webpage(query, webpage, max_chars):
+    """Run a webpage search, coalesced with identical in-flight searches and subject to admission control"""
+    async def search():
+        tools = await get_web_search_tools()
+        async with search_admission.slot():
+            return await tools.search_webpage(query, webpage, mock_user, mock_event_emitter, max_chars)
+    key = ('search_webpage', normalize_query(query), webpage.strip().lower(), max_chars)
+    return await search_flights.do(key, search)
+# ============= END IN-FLIGHT REQUEST COALESCING =============
+
+# ============= TWO-TIER SEARCH =============
+# handle -> (refined search task, creation time)
+refined_searches = {}
+
+def discard_task_result(task):
+    # Retrieving the exception keeps asyncio from logging "Task exception was never retrieved"
+    if not task.cancelled():
+        task.exception()
+
+def prune_refined_searches():
+    """Drop expired two-tier search handles"""
+    now = time.monotonic()
+    for expired in [h for h, (_, created) in refined_searches.items() if now - created > REFINED_RESULT_TTL]:
+        task, _ = refined_searches.pop(expired)
+        task.add_done_callback(discard_task_result)
+
+async def run_two_tier_search(query, webpage, max_chars):
+    """
+    Start a search and return as soon as the ranked search engine snippets are available.
+    The full webpage retrieval continues in the background; its result can be fetched
+    with the returned handle from /tools/search_result.
+    Returns (result, handle), where handle is None if the full result was ready first
+    (e.g. a cache hit).
+    """
+    snippets = asyncio.get_running_loop().create_future()
+    
+    async def on_snippets(snippet_result):
+        if not snippets.done():
+            snippets.set_result(snippet_result)
+    
+    async def search():
+        tools = await get_web_search_tools()
+        async with search_admission.slot():
+            if webpage:
+                return await tools.search_webpage(
+                    query, webpage, mock_user, mock_event_emitter, max_chars, __snippets_callback__=on_snippets
+                )
+            return await tools.search_web(
+                query, mock_user, mock_event_emitter, max_chars, __snippets_callback__=on_snippets
+            )
+    
+    task = asyncio.ensure_future(search())
+    await asyncio.wait([task, snippets], return_when=asyncio.FIRST_COMPLETED)
+    if task.done():
+        return task.result(), None
+    
+    prune_refined_searches()
+    handle = uuid.uuid4().hex
+    refined_searches[handle] = (task, time.monotonic())
+    return snippets.result(), handle
+
+def two_tier_response(result, handle):
+    if handle is None:
+        return {'success': True, 'tier': 'full', 'result': result}, 200
+    return {'success': True, 'tier': 'snippets', 'result': result, 'handle': handle}, 200
+# ============= END TWO-TIER SEARCH =============
+
+def get_date_time_result(desired_timezone="America/Phoenix"):
+    """Return (result text, date, time) for the given timezone"""
+    now_utc = datetime.now(timezone.utc)
+    tz = ZoneInfo(desired_timezone)
+    now_desired = now_utc.astimezone(tz)
+    
+    current_date = now_desired.strftime("%A, %B %d, %Y")
+    current_time = now_desired.strftime("%I:%M %p")
+    
+    result = f"Today's date is {current_date}. The current time is {current_time}."
+    return result, current_date, current_time
+
+# ============= ROUTE HANDLERS =============
+# Handlers take the request JSON (or None) and return (response dict, status code).
+# They are shared by the Flask server and the asyncio server (--async).
+
+async def handle_health(data):
+    return {
         'status': 'healthy',
         'available_tools': ['search_web', 'search_webpage', 'getDateTime', 'calculate', 'convert_units', 'roll_dice'],
         'models_directory': MODELS_DIR,
@@ -187,94 +395,157 @@ def health():
             'cpu_only': web_search_tools.valves.cpu_only,
             'keyword_retriever': web_search_tools.valves.keyword_retriever,
             'chunker': web_search_tools.valves.chunker
+        } if web_search_tools else None,
+        'web_search_ready': web_search_tools is not None,
+        'search_queue': search_admission.stats(),
+        'coalesced_searches': search_flights.coalesced
+    }, 200
+
+async def handle_ready(data):
+    """
+    Which capabilities can be served right now.
+    Returns 200 once web search is available, 503 while it is still warming up (or failed to load).
+    """
+    search_ready = web_search_tools is not None
+    models_loaded = search_ready and web_search_tools.document_retriever.embedding_model is not None
+    return {
+        'ready': search_ready,
+        'capabilities': {
+            'getDateTime': True,
+            'calculate': True,
+            'convert_units': True,
+            'roll_dice': True,
+            'search_web': search_ready,
+            'search_webpage': search_ready,
+            'search_models_loaded': models_loaded
+        },
+        'warmup': {
+            'started': warmup_thread is not None,
+            **warmup_status
         }
-    })
+    }, 200 if search_ready else 503
 
-@app.route('/tools/search_web', methods=['POST'])
-def search_web():
+async def handle_search_web(data):
     """
     Search the web for information
-    Expected JSON: { "query": "search query" }
+    Expected JSON: { "query": "search query", "max_tokens": 1000 (optional), "max_chars": 4000 (optional),
+                     "two_tier": true (optional) }
+    With "two_tier", the ranked search engine snippets are returned right away together with
+    a "handle" for fetching the refined full-page result from /tools/search_result.
     """
     try:
-        data = request.get_json()
-        
         if not data or 'query' not in data:
-            return jsonify({'error': 'Missing required parameter: query'}), 400
+            return {'error': 'Missing required parameter: query'}, 400
         
         query = data['query']
         print(f"\n[Tools API] Web search request: {query}")
         
-        # Run the async search_web function
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        try:
-            result = loop.run_until_complete(
-                web_search_tools.search_web(query, mock_user, mock_event_emitter)
-            )
-        finally:
-            loop.close()
+        if data.get('two_tier'):
+            return two_tier_response(*await run_two_tier_search(query, None, get_result_budget(data)))
+        
+        result = await run_search_web(query, get_result_budget(data))
         
         print(f"[Tools API] Search completed, result length: {len(result)} chars")
         
-        return jsonify({
+        return {
             'success': True,
             'result': result
-        })
+        }, 200
         
+    except ServerBusyError as e:
+        return busy_response(e)
     except Exception as e:
         print(f"[Tools API] Error in search_web: {str(e)}")
         import traceback
         traceback.print_exc()
-        return jsonify({
+        return {
             'success': False,
             'error': str(e)
-        }), 500
+        }, 500
 
-@app.route('/tools/search_webpage', methods=['POST'])
-def search_webpage():
+async def handle_search_webpage(data):
     """
     Search a specific webpage
-    Expected JSON: { "query": "search query", "webpage": "url or domain" }
+    Expected JSON: { "query": "search query", "webpage": "url or domain", "max_tokens": 1000 (optional),
+                     "two_tier": true (optional) }
     """
     try:
-        data = request.get_json()
-        
         if not data or 'query' not in data or 'webpage' not in data:
-            return jsonify({'error': 'Missing required parameters: query, webpage'}), 400
+            return {'error': 'Missing required parameters: query, webpage'}, 400
         
         query = data['query']
         webpage = data['webpage']
         print(f"\n[Tools API] Webpage search request: {query} on {webpage}")
         
-        # Run the async search_webpage function
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        try:
-            result = loop.run_until_complete(
-                web_search_tools.search_webpage(query, webpage, mock_user, mock_event_emitter)
-            )
-        finally:
-            loop.close()
+        if data.get('two_tier'):
+            return two_tier_response(*await run_two_tier_search(query, webpage, get_result_budget(data)))
+        
+        result = await run_search_webpage(query, webpage, get_result_budget(data))
         
         print(f"[Tools API] Webpage search completed")
         
-        return jsonify({
+        return {
             'success': True,
             'result': result
-        })
+        }, 200
         
+    except ServerBusyError as e:
+        return busy_response(e)
     except Exception as e:
         print(f"[Tools API] Error in search_webpage: {str(e)}")
         import traceback
         traceback.print_exc()
-        return jsonify({
+        return {
+            'success': False,
+            'error': str(e)
+        }, 500
+
+async def handle_search_result(data):
+    """
+    Fetch the refined result of a two-tier search
+    Expected JSON: { "handle": "...", "wait": 30 (optional, max. seconds to wait for the result) }
+    """
+    try:
+        if not data or 'handle' not in data:
+            return {'error': 'Missing required parameter: handle'}, 400
+        
+        try:
+            wait = float(data.get('wait', 30))
+        except (TypeError, ValueError):
+            wait = None
+        if wait is None or not 0 <= wait < float('inf'):
+            return {'error': 'Parameter wait must be a non-negative number of seconds'}, 400
+        
+        prune_refined_searches()
+        handle = data['handle']
+        if handle not in refined_searches:
+            return {'success': False, 'error': 'Unknown or expired handle'}, 404
+        
+        task, _ = refined_searches[handle]
+        done, _ = await asyncio.wait([task], timeout=wait)
+        if not done:
+            return {'success': True, 'pending': True, 'handle': handle}, 200
+        
+        print(f"[Tools API] Refined search result fetched")
+        
+        return {
+            'success': True,
+            'tier': 'full',
+            'result': task.result()
+        }, 200
+        
+    except ServerBusyError as e:
+        return busy_response(e)
+    except Exception as e:
+        print(f"[Tools API] Error in search_result: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        return {
             'success': False,
             'error': str(e)
-        }), 500
+        }, 500
 
-@app.route('/tools/getDateTime', methods=['POST', 'GET'])
-def get_date_time():
+async def handle_get_date_time(data):
     """
     Get current date and time
     No parameters required
@@ -282,150 +553,226 @@ def get_date_time():
     try:
         print("\n[Tools API] DateTime request")
         
-        # Using the same logic from getDateTime.py
         desired_timezone = "America/Phoenix"  # You can make this configurable
-        
-        now_utc = datetime.now(timezone.utc)
-        tz = ZoneInfo(desired_timezone)
-        now_desired = now_utc.astimezone(tz)
-        
-        current_date = now_desired.strftime("%A, %B %d, %Y")
-        current_time = now_desired.strftime("%I:%M %p")
-        
-        result = f"Today's date is {current_date}. The current time is {current_time}."
+        result, current_date, current_time = get_date_time_result(desired_timezone)
         
         print(f"[Tools API] DateTime result: {result}")
         
-        return jsonify({
+        return {
             'success': True,
             'result': result,
             'date': current_date,
             'time': current_time,
             'timezone': desired_timezone
-        })
+        }, 200
         
     except Exception as e:
         print(f"[Tools API] Error in getDateTime: {str(e)}")
         import traceback
         traceback.print_exc()
-        return jsonify({
+        return {
             'success': False,
             'error': str(e)
-        }), 500
+        }, 500
+
+def batch_calculation_text(results):
+    return '\n'.join(
+        f"The result of {r['expression']} is {r['value']}" if 'value' in r else f"{r['expression']}: {r['error']}"
+        for r in results
+    )
 
-@app.route('/tools/calculate', methods=['POST'])
-def calculate():
+async def handle_calculate(data):
     """
     Perform mathematical calculations
-    Expected JSON: { "expression": "2 + 2" }
+    Expected JSON: { "expression": "2 + 2" } or { "expressions": ["2 + 2", "sqrt(16)"] }
     """
     try:
-        data = request.get_json()
+        if data and isinstance(data.get('expressions'), list):
+            print(f"\n[Tools API] Batch calculate request: {len(data['expressions'])} expressions")
+            results = await asyncio.to_thread(calculate_batch, data['expressions'])
+            return {
+                'success': True,
+                'result': batch_calculation_text(results),
+                'results': results
+            }, 200
         
         if not data or 'expression' not in data:
-            return jsonify({'error': 'Missing required parameter: expression'}), 400
+            return {'error': 'Missing required parameter: expression'}, 400
         
         expression = data['expression']
         print(f"\n[Tools API] Calculate request: {expression}")
         
-        result = safe_calculate(expression)
+        result = await asyncio.to_thread(safe_calculate, expression)
         result_text = f"The result of {expression} is {result}"
         
         print(f"[Tools API] Calculation result: {result}")
         
-        return jsonify({
+        return {
             'success': True,
             'result': result_text,
             'value': result
-        })
+        }, 200
         
     except Exception as e:
         print(f"[Tools API] Error in calculate: {str(e)}")
-        return jsonify({
+        return {
             'success': False,
             'error': str(e)
-        }), 500
+        }, 500
 
-@app.route('/tools/convert_units', methods=['POST'])
-def convert_units_endpoint():
+def conversion_request(data):
+    """Read a value or list of values and the units from convert_units parameters"""
+    if 'values' in data and isinstance(data['values'], list):
+        values = [float(v) for v in data['values']]
+    elif 'value' in data:
+        values = float(data['value'])
+    else:
+        raise ValueError('Missing required parameter: value or values')
+    if not data.get('conversion') and not (data.get('from') and data.get('to')):
+        raise ValueError('Missing required parameters: conversion, or from and to')
+    return values, data.get('conversion'), data.get('from'), data.get('to')
+
+def conversion_text(values, results, source, target):
+    if isinstance(values, list):
+        pairs = ', '.join(f"{v:g} = {r:.6g}" for v, r in zip(values, results))
+        return f"{unit_label(source)} to {unit_label(target)}: {pairs}"
+    return f"{values:g} {unit_label(source)} equals {float(results):.6g} {unit_label(target)}"
+
+async def handle_convert_units(data):
     """
     Convert between units
     Expected JSON: { "value": 100, "conversion": "fahrenheit_to_celsius" }
+    or { "values": [32, 50, 100], "from": "fahrenheit", "to": "celsius" }
     """
     try:
-        data = request.get_json()
-        
-        if not data or 'value' not in data or 'conversion' not in data:
-            return jsonify({'error': 'Missing required parameters: value, conversion'}), 400
-        
-        value = float(data['value'])
-        conversion = data['conversion']
-        
-        print(f"\n[Tools API] Unit conversion request: {value} {conversion}")
+        if not data:
+            return {'error': 'Missing required parameters: value, conversion'}, 400
+        try:
+            values, conversion, from_unit, to_unit = conversion_request(data)
+        except (TypeError, ValueError) as e:
+            return {'error': str(e)}, 400
         
-        result = convert_units(value, conversion)
+        print(f"\n[Tools API] Unit conversion request: {values} {conversion or f'{from_unit} to {to_unit}'}")
         
-        # Parse conversion type for nice output
-        parts = conversion.replace('_to_', ' to ').replace('_', ' ')
-        result_text = f"{value} {parts.split(' to ')[0]} equals {result:.2f} {parts.split(' to ')[1]}"
+        try:
+            results, source, target = convert_units(values, conversion, from_unit, to_unit)
+        except ValueError as e:
+            return {'success': False, 'error': str(e)}, 400
+        result_text = conversion_text(values, results, source, target)
         
-        print(f"[Tools API] Conversion result: {result}")
+        print(f"[Tools API] Conversion result: {result_text}")
         
-        return jsonify({
+        response = {
             'success': True,
             'result': result_text,
-            'value': result
-        })
+            'from': source.name,
+            'to': target.name
+        }
+        if isinstance(values, list):
+            response['values'] = results.tolist()
+        else:
+            response['value'] = float(results)
+        return response, 200
         
     except Exception as e:
         print(f"[Tools API] Error in convert_units: {str(e)}")
-        return jsonify({
+        return {
             'success': False,
             'error': str(e)
-        }), 500
+        }, 500
 
-@app.route('/tools/roll_dice', methods=['POST'])
-def roll_dice():
+def dice_request(data):
+    """Roll dice, or describe the exact outcome distribution when 'distribution' is set"""
+    dice_expression = data['dice_expression']
+    if data.get('distribution') or data.get('at_least') is not None or data.get('at_most') is not None:
+        at_least = data.get('at_least')
+        at_most = data.get('at_most')
+        return describe_distribution(
+            dice_expression,
+            at_least=int(at_least) if at_least is not None else None,
+            at_most=int(at_most) if at_most is not None else None
+        )
+    return roll_dice(dice_expression)
+
+async def handle_roll_dice(data):
     """
     Roll RPG dice
-    Expected JSON: { "dice_expression": "2d6" }
+    Expected JSON: { "dice_expression": "4d6kh3+2" }
+    or { "dice_expression": "3d8+1d4", "distribution": true, "at_least": 15 }
     """
     try:
-        data = request.get_json()
-        
         if not data or 'dice_expression' not in data:
-            return jsonify({'error': 'Missing required parameter: dice_expression'}), 400
+            return {'error': 'Missing required parameter: dice_expression'}, 400
         
-        dice_expression = data['dice_expression']
-        print(f"\n[Tools API] Dice roll request: {dice_expression}")
+        print(f"\n[Tools API] Dice roll request: {data['dice_expression']}")
         
-        result = rpg_dice_roll(dice_expression)
+        try:
+            # Exact distributions are CPU-bound; keep them off the shared event loop
+            result = await asyncio.to_thread(dice_request, data)
+        except ValueError as e:
+            return {'success': False, 'error': str(e)}, 400
         
-        print(f"[Tools API] Dice roll result: {result}")
+        print(f"[Tools API] Dice roll result: {result['result']}")
         
-        return jsonify({
-            'success': True,
-            'result': result
-        })
+        return {'success': True, **result}, 200
         
     except Exception as e:
         print(f"[Tools API] Error in roll_dice: {str(e)}")
-        return jsonify({
+        return {
             'success': False,
             'error': str(e)
-        }), 500
+        }, 500
 
-@app.route('/tools/execute', methods=['POST'])
-def execute_tool():
+async def handle_execute(data):
     """
     Generic endpoint to execute any tool
     Expected JSON: { "tool": "tool_name", "parameters": {...} }
+    or a batch: { "calls": [{ "tool": "tool_name", "parameters": {...} }, ...], "timeout": 30 (optional) }
     """
+    if data and 'calls' in data:
+        try:
+            timeout_seconds = float(data.get('timeout', TOOL_CALL_TIMEOUT))
+        except (TypeError, ValueError):
+            timeout_seconds = None
+        if timeout_seconds is None or not 0 < timeout_seconds < float('inf'):
+            return {'error': 'Parameter timeout must be a positive number of seconds'}, 400
+        return await execute_tool_batch(data['calls'], timeout_seconds)
+    return await execute_tool_call(data)
+
+async def execute_tool_batch(calls, timeout_seconds):
+    """
+    Run a batch of tool calls concurrently, each with its own timeout.
+    Results are returned in request order, each with its own success/error.
+    """
+    if not isinstance(calls, list) or not calls:
+        return {'error': 'Parameter calls must be a non-empty list'}, 400
+    
+    print(f"\n[Tools API] Batch execute request: {len(calls)} calls")
+    
+    async def run_call(call):
+        if not isinstance(call, dict):
+            return {'success': False, 'tool': None, 'error': 'Each call must be an object'}
+        try:
+            payload, _ = await asyncio.wait_for(execute_tool_call(call), timeout_seconds)
+        except asyncio.TimeoutError:
+            print(f"[Tools API] {call.get('tool')} timed out after {timeout_seconds}s")
+            payload = {'error': f'Timed out after {timeout_seconds} seconds'}
+        payload.setdefault('success', False)
+        payload.setdefault('tool', call.get('tool'))
+        return payload
+    
+    results = await asyncio.gather(*(run_call(call) for call in calls))
+    
+    return {
+        'success': True,
+        'results': list(results)
+    }, 200
+
+async def execute_tool_call(data):
+    """Execute a single { "tool": "tool_name", "parameters": {...} } call"""
     try:
-        data = request.get_json()
-        
         if not data or 'tool' not in data:
-            return jsonify({'error': 'Missing required parameter: tool'}), 400
+            return {'error': 'Missing required parameter: tool'}, 400
         
         tool_name = data['tool']
         parameters = data.get('parameters', {})
@@ -434,110 +781,343 @@ def execute_tool():
         
         if tool_name == 'search_web':
             if 'query' not in parameters:
-                return jsonify({'error': 'Missing query parameter'}), 400
+                return {'error': 'Missing query parameter'}, 400
             
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            try:
-                result = loop.run_until_complete(
-                    web_search_tools.search_web(parameters['query'], mock_user, mock_event_emitter)
-                )
-            finally:
-                loop.close()
+            result = await run_search_web(parameters['query'], get_result_budget(parameters))
             
         elif tool_name == 'search_webpage':
             if 'query' not in parameters or 'webpage' not in parameters:
-                return jsonify({'error': 'Missing query or webpage parameter'}), 400
+                return {'error': 'Missing query or webpage parameter'}, 400
             
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            try:
-                result = loop.run_until_complete(
-                    web_search_tools.search_webpage(
-                        parameters['query'], 
-                        parameters['webpage'], 
-                        mock_user, 
-                        mock_event_emitter
-                    )
-                )
-            finally:
-                loop.close()
+            result = await run_search_webpage(
+                parameters['query'], parameters['webpage'], get_result_budget(parameters)
+            )
             
         elif tool_name == 'getDateTime':
-            desired_timezone = parameters.get('timezone', 'America/Phoenix')
-            now_utc = datetime.now(timezone.utc)
-            tz = ZoneInfo(desired_timezone)
-            now_desired = now_utc.astimezone(tz)
-            current_date = now_desired.strftime("%A, %B %d, %Y")
-            current_time = now_desired.strftime("%I:%M %p")
-            result = f"Today's date is {current_date}. The current time is {current_time}."
+            result, _, _ = get_date_time_result(parameters.get('timezone', 'America/Phoenix'))
             
         elif tool_name == 'calculate':
+            if isinstance(parameters.get('expressions'), list):
+                results = await asyncio.to_thread(calculate_batch, parameters['expressions'])
+                result = batch_calculation_text(results)
+                return {'success': True, 'tool': tool_name, 'result': result}, 200
             if 'expression' not in parameters:
-                return jsonify({'error': 'Missing expression parameter'}), 400
-            calc_result = safe_calculate(parameters['expression'])
+                return {'error': 'Missing expression parameter'}, 400
+            calc_result = await asyncio.to_thread(safe_calculate, parameters['expression'])
             result = f"The result of {parameters['expression']} is {calc_result}"
             
         elif tool_name == 'convert_units':
-            if 'value' not in parameters or 'conversion' not in parameters:
-                return jsonify({'error': 'Missing value or conversion parameter'}), 400
-            conv_result = convert_units(float(parameters['value']), parameters['conversion'])
-            parts = parameters['conversion'].replace('_to_', ' to ').replace('_', ' ')
-            result = f"{parameters['value']} {parts.split(' to ')[0]} equals {conv_result:.2f} {parts.split(' to ')[1]}"
+            try:
+                values, conversion, from_unit, to_unit = conversion_request(parameters)
+            except (TypeError, ValueError) as e:
+                return {'error': str(e)}, 400
+            try:
+                conv_results, source, target = convert_units(values, conversion, from_unit, to_unit)
+            except ValueError as e:
+                return {'success': False, 'error': str(e)}, 400
+            result = conversion_text(values, conv_results, source, target)
             
         elif tool_name == 'roll_dice':
             if 'dice_expression' not in parameters:
-                return jsonify({'error': 'Missing dice_expression parameter'}), 400
-            result = rpg_dice_roll(parameters['dice_expression'])
+                return {'error': 'Missing dice_expression parameter'}, 400
+            try:
+                result = (await asyncio.to_thread(dice_request, parameters))['result']
+            except ValueError as e:
+                return {'success': False, 'error': str(e)}, 400
             
         else:
-            return jsonify({'error': f'Unknown tool: {tool_name}'}), 400
+            return {'error': f'Unknown tool: {tool_name}'}, 400
         
-        return jsonify({
+        return {
             'success': True,
             'tool': tool_name,
             'result': result
-        })
+        }, 200
         
+    except ServerBusyError as e:
+        return busy_response(e)
     except Exception as e:
         print(f"[Tools API] Error executing tool: {str(e)}")
         import traceback
         traceback.print_exc()
-        return jsonify({
+        return {
             'success': False,
             'error': str(e)
-        }), 500
+        }, 500
+
+async def stream_search_web(data):
+    """
+    Search the web, streaming progress as JSON lines
+    Expected JSON: { "query": "search query", "webpage": "url or domain" (optional), "max_tokens": 1000 (optional),
+                     "two_tier": true (optional) }
+    Yields, in order:
+      { "type": "status", "description": "...", "done": false }      - for every status update
+      { "type": "search_results", "results": [{ "content", "source" }] } - engine snippets, as soon as they arrive
+      { "type": "snippet_result", "result": "..." }                  - with "two_tier": the ranked snippets
+      { "type": "result", "success": true, "result": "..." }          - the final ranked results
+    or a final { "type": "error", "success": false, "error": "..." }
+    """
+    if not data or 'query' not in data:
+        yield {'type': 'error', 'success': False, 'error': 'Missing required parameter: query'}
+        return
+    
+    query = data['query']
+    webpage = data.get('webpage')
+    print(f"\n[Tools API] Streaming search request: {query}" + (f" on {webpage}" if webpage else ""))
+    
+    events = asyncio.Queue()
+    
+    async def stream_event_emitter(event):
+        await mock_event_emitter(event)
+        events.put_nowait(event)
+    
+    async def on_snippets(snippet_result):
+        events.put_nowait({'type': 'snippet_result', 'data': {'result': snippet_result}})
+    
+    snippets_callback = on_snippets if data.get('two_tier') else None
+    
+    async def search():
+        tools = await get_web_search_tools()
+        async with search_admission.slot():
+            if webpage:
+                return await tools.search_webpage(
+                    query, webpage, mock_user, stream_event_emitter, get_result_budget(data), snippets_callback
+                )
+            return await tools.search_web(
+                query, mock_user, stream_event_emitter, get_result_budget(data), snippets_callback
+            )
+    
+    task = asyncio.ensure_future(search())
+    task.add_done_callback(lambda _: events.put_nowait(None))
+    try:
+        while (event := await events.get()) is not None:
+            event_data = event.get('data', {})
+            if event.get('type') == 'status':
+                yield {'type': 'status', 'description': event_data.get('description'), 'done': event_data.get('done', False)}
+            elif event.get('type') == 'search_results':
+                yield {'type': 'search_results', 'results': event_data.get('documents', [])}
+            elif event.get('type') == 'snippet_result':
+                yield {'type': 'snippet_result', 'result': event_data['result']}
+        
+        result = task.result()
+        print(f"[Tools API] Streaming search completed, result length: {len(result)} chars")
+        yield {'type': 'result', 'success': True, 'result': result}
+        
+    except ServerBusyError as e:
+        busy_payload, _ = busy_response(e)
+        yield {'type': 'error', **busy_payload}
+    except Exception as e:
+        print(f"[Tools API] Error in streaming search: {str(e)}")
+        yield {'type': 'error', 'success': False, 'error': str(e)}
+    finally:
+        # Client went away before the search finished
+        if not task.done():
+            task.cancel()
+
+# (path, methods, handler)
+ROUTES = [
+    ('/health', ['GET'], handle_health),
+    ('/ready', ['GET'], handle_ready),
+    ('/tools/search_web', ['POST'], handle_search_web),
+    ('/tools/search_webpage', ['POST'], handle_search_webpage),
+    ('/tools/search_result', ['POST'], handle_search_result),
+    ('/tools/getDateTime', ['POST', 'GET'], handle_get_date_time),
+    ('/tools/calculate', ['POST'], handle_calculate),
+    ('/tools/convert_units', ['POST'], handle_convert_units),
+    ('/tools/roll_dice', ['POST'], handle_roll_dice),
+    ('/tools/execute', ['POST'], handle_execute),
+]
+
+# (path, methods, async generator of JSON-serializable items), served as JSON lines
+STREAM_ROUTES = [
+    ('/tools/search_web/stream', ['POST'], stream_search_web),
+]
+# ============= END ROUTE HANDLERS =============
+
+# ============= METRICS =============
+# Every request gets a recorder for the search pipeline's stage timings and counters.
+# Pass "timings": true in the request JSON to get them back in the response.
+def wants_timings(data):
+    return isinstance(data, dict) and bool(data.get('timings'))
+
+async def run_handler(route, handler, data):
+    recorder = start_request_metrics()
+    payload, status = await handler(data)
+    elapsed = recorder.finish(route, status)
+    if wants_timings(data):
+        payload['timings'] = recorder.report(elapsed)
+    return payload, status
+
+async def run_stream_handler(route, stream_handler, data):
+    recorder = start_request_metrics()
+    items = stream_handler(data)
+    try:
+        async for item in items:
+            if item.get('type') in ('result', 'error') and wants_timings(data):
+                item['timings'] = recorder.report(time.perf_counter() - recorder.start)
+            yield item
+    finally:
+        await items.aclose()
+        recorder.finish(route, 200)
+
+METRICS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+# ============= END METRICS =============
+
+# ============= FLASK SERVER =============
+def make_flask_view(path, handler):
+    def view():
+        payload, status = run_async(run_handler(path, handler, request.get_json(silent=True)))
+        return jsonify(payload), status
+    view.__name__ = handler.__name__
+    return view
+
+def make_flask_stream_view(path, stream_handler):
+    def view():
+        items = run_stream_handler(path, stream_handler, request.get_json(silent=True))
+        
+        async def next_line():
+            try:
+                return json.dumps(await items.__anext__()) + '\n'
+            except StopAsyncIteration:
+                return None
+        
+        def generate():
+            try:
+                while (line := run_async(next_line())) is not None:
+                    yield line
+            finally:
+                run_async(items.aclose())
+        
+        return Response(generate(), mimetype='application/x-ndjson')
+    view.__name__ = stream_handler.__name__
+    return view
+
+for path, methods, handler in ROUTES:
+    app.add_url_rule(path, view_func=make_flask_view(path, handler), methods=methods)
+for path, methods, stream_handler in STREAM_ROUTES:
+    app.add_url_rule(path, view_func=make_flask_stream_view(path, stream_handler), methods=methods)
+
+@app.route('/metrics', methods=['GET'])
+def metrics_view():
+    return Response(render_metrics(), content_type=METRICS_CONTENT_TYPE)
+# ============= END FLASK SERVER =============
+
+# ============= ASYNCIO SERVER =============
+def create_async_app():
+    """aiohttp application serving the same JSON routes on the tools event loop"""
+    from aiohttp import web
+
+    def make_aiohttp_view(path, handler):
+        async def view(request):
+            try:
+                data = await request.json() if request.can_read_body else None
+            except ValueError:
+                data = None
+            payload, status = await run_handler(path, handler, data)
+            return web.json_response(payload, status=status)
+        return view
+
+    def make_aiohttp_stream_view(path, stream_handler):
+        async def view(request):
+            try:
+                data = await request.json() if request.can_read_body else None
+            except ValueError:
+                data = None
+            response = web.StreamResponse(headers={'Content-Type': 'application/x-ndjson'})
+            await response.prepare(request)
+            items = run_stream_handler(path, stream_handler, data)
+            try:
+                async for item in items:
+                    await response.write((json.dumps(item) + '\n').encode())
+            finally:
+                await items.aclose()
+            await response.write_eof()
+            return response
+        return view
+
+    async_app = web.Application()
+    for path, methods, handler in ROUTES:
+        for method in methods:
+            async_app.router.add_route(method, path, make_aiohttp_view(path, handler))
+    for path, methods, stream_handler in STREAM_ROUTES:
+        for method in methods:
+            async_app.router.add_route(method, path, make_aiohttp_stream_view(path, stream_handler))
+    
+    async def metrics_view(request):
+        return web.Response(body=render_metrics().encode(), headers={'Content-Type': METRICS_CONTENT_TYPE})
+    async_app.router.add_route('GET', '/metrics', metrics_view)
+    return async_app
+
+async def serve_async(host, port):
+    from aiohttp import web
+
+    runner = web.AppRunner(create_async_app())
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+# ============= END ASYNCIO SERVER =============
+
+def compile_models(overwrite=False):
+    """Write fast-loading snapshots of the search models into MODELS_DIR (see llm_web_search.compile_model_snapshots)"""
+    import llm_web_search
+    tools = llm_web_search.Tools()
+    configure_web_search_tools(tools)
+    device = "cpu" if tools.valves.cpu_only else "cuda"
+    print(f"[Tools API] Compiling model snapshots for {device} into {MODELS_DIR}...")
+    start = time.perf_counter()
+    written = llm_web_search.compile_model_snapshots(MODELS_DIR, device, overwrite=overwrite)
+    for path in written:
+        print(f"  - {path}")
+    if not written:
+        print("  All snapshots are up to date (pass --overwrite to rebuild them)")
+    print(f"[Tools API] Done in {time.perf_counter() - start:.1f}s")
 
 if __name__ == '__main__':
+    # Pass --compile-models once (e.g. after install or a model change) to write model snapshots and exit
+    if '--compile-models' in sys.argv[1:]:
+        compile_models(overwrite='--overwrite' in sys.argv[1:])
+        sys.exit(0)
+    
+    # Pass --async to serve the same routes with aiohttp directly on the tools event loop
+    async_mode = '--async' in sys.argv[1:]
+
     print("=" * 60)
-    print("Starting Tools API Server on port 5001...")
+    print(f"Starting Tools API Server on port 5001 ({'asyncio' if async_mode else 'Flask'})...")
     print("=" * 60)
     print("\nAvailable endpoints:")
     print("  POST /tools/search_web      - Search the web")
+    print("  POST /tools/search_web/stream - Search the web, streaming progress as JSON lines")
     print("  POST /tools/search_webpage  - Search a specific webpage")
+    print("  POST /tools/search_result   - Fetch the refined result of a two-tier search")
     print("  POST /tools/getDateTime     - Get current date/time")
     print("  POST /tools/calculate       - Perform math calculations")
     print("  POST /tools/convert_units   - Convert between units")
     print("  POST /tools/roll_dice       - Roll RPG dice")
     print("  POST /tools/execute         - Generic tool execution")
     print("  GET  /health                - Health check")
+    print("  GET  /ready                 - Which tools are available yet (web search warms up in the background)")
+    print("  GET  /metrics               - Prometheus metrics (per-route and per-stage latency)")
     print("\nConfiguration:")
     print(f"  Models directory: {MODELS_DIR}")
-    print(f"  CPU only: {web_search_tools.valves.cpu_only}")
-    print(f"  Keyword retriever: {web_search_tools.valves.keyword_retriever}")
-    
-    if not web_search_tools.valves.cpu_only:
-        try:
-            import torch
-            if torch.cuda.is_available():
-                print(f"  GPU available: {torch.cuda.get_device_name(0)}")
-            else:
-                print("  GPU: Not available (will use CPU)")
-        except:
-            print("  GPU: PyTorch not installed or no GPU")
+    print("  Web search loads in the background; GET /ready reports when it is available")
     
     print("=" * 60)
     print("\nFirst run will download embedding models (~100MB)")
-    print("This may take a few minutes...\n")
+    print("This may take a few minutes...")
+    print("Run 'python ToolServer.py --compile-models' once to make later starts load the models faster\n")
     
-    app.run(host='0.0.0.0', port=5001, debug=True)
\ No newline at end of file
+    # With the Flask debug reloader, only the child process (WERKZEUG_RUN_MAIN) serves requests
+    if async_mode or os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        start_warmup()
+    
+    if async_mode:
+        asyncio.set_event_loop(tools_loop)
+        try:
+            tools_loop.run_until_complete(serve_async('0.0.0.0', 5001))
+        except KeyboardInterrupt:
+            pass
+    else:
+        app.run(host='0.0.0.0', port=5001, debug=True)
\ No newline at end of file
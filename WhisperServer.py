@@ -1,14 +1,297 @@
 from flask import Flask, request, jsonify
+import difflib
+import re
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+import numpy as np
 import whisper
-import tempfile
-import os
+from audio import (
+    SAMPLE_FORMATS, SAMPLE_RATE, AudioDecodeError, check_pcm_format, decode_audio, decode_pcm, pcm_to_float32, resample
+)
+from vad import VadSettings, apply_vad, frame_energies_db, vad_report
+from whisper_inference import (
+    apply_thread_settings, is_confident, is_silence, load_cpu_settings, prepare_model, segments_avg_logprob,
+    transcribe_short_batch, warm_up, window_bucket
+)
 
 app = Flask(__name__)
-model = whisper.load_model("base")
+
+# ============= MODELS =============
+# Whisper sizes to load, smallest first. Per request, 'quality' (form field or
+# X-Quality header) picks the route: 'fast' uses the smallest model, 'best' the
+# largest, and 'auto' gives short clips a first pass on the smallest model that is
+# escalated to the next size when it isn't confident. Longer clips go to the largest.
+MODEL_SIZES = ['tiny', 'base']
+QUALITY_TIERS = ('auto', 'fast', 'best')
+FIRST_PASS_MAX_SECONDS = 3.0
+ESCALATE_BELOW_AVG_LOGPROB = -0.6
+
+# CPU settings (int8 quantization, torch thread counts, batch size) come from
+# whisper_cpu.json when benchmarks/whisper_autotune.py has written one
+cpu_settings = load_cpu_settings()
+apply_thread_settings(cpu_settings)
+print(f"CPU settings: {cpu_settings}")
+
+models = {size: prepare_model(whisper.load_model(size), cpu_settings) for size in MODEL_SIZES}
+# One decode at a time per model: decoding installs KV cache hooks on the model's
+# shared attention modules, so concurrent decodes would mix up each other's caches
+model_locks = {size: threading.Lock() for size in MODEL_SIZES}
+for size in MODEL_SIZES:
+    start = time.perf_counter()
+    warm_up(models[size])
+    print(f"Warmed up {size} in {time.perf_counter() - start:.2f}s")
+
+model_stats = {size: {'requests': 0, 'escalations': 0, 'seconds': 0.0} for size in MODEL_SIZES}
+model_stats_lock = threading.Lock()
+
+def record_model(size, seconds, escalated):
+    with model_stats_lock:
+        stats = model_stats[size]
+        stats['requests'] += 1
+        stats['escalations'] += 1 if escalated else 0
+        stats['seconds'] += seconds
+
+def model_report():
+    with model_stats_lock:
+        return {
+            size: {
+                'requests': stats['requests'],
+                'escalations': stats['escalations'],
+                'total_seconds': round(stats['seconds'], 3),
+                'mean_seconds': round(stats['seconds'] / stats['requests'], 3) if stats['requests'] else 0.0,
+            }
+            for size, stats in model_stats.items()
+        }
+
+def quality_tier():
+    quality = (request.form.get('quality') or request.headers.get('X-Quality') or 'auto').lower()
+    if quality not in QUALITY_TIERS:
+        raise AudioDecodeError(f"Invalid quality: {quality} (use one of {', '.join(QUALITY_TIERS)})")
+    return quality
+
+def model_route(quality, seconds):
+    """Model sizes to try in order; all but the last are escalated from when not confident"""
+    if quality == 'fast':
+        return MODEL_SIZES[:1]
+    if quality == 'best' or seconds > FIRST_PASS_MAX_SECONDS:
+        return MODEL_SIZES[-1:]
+    return MODEL_SIZES
+
+# Defaults for raw PCM uploads: the format of the Discord receiver's decoded Opus
+PCM_DEFAULTS = {'sample_rate': 48000, 'channels': 1, 'sample_format': 's16le'}
+
+def pcm_parameter(name, cast):
+    """Read a raw PCM parameter from the form fields, then the X-Sample-Rate style headers"""
+    header = 'X-' + name.replace('_', ' ').title().replace(' ', '-')
+    value = request.form.get(name) or request.headers.get(header)
+    if value is None:
+        return PCM_DEFAULTS[name]
+    try:
+        return cast(value)
+    except ValueError:
+        raise AudioDecodeError(f"Invalid {name}: {value}")
+
+# ============= VOICE ACTIVITY DETECTION =============
+# Trim silence and skip the model for clips without enough voiced audio.
+# Per request, 'vad' (form field or X-Vad header) turns it off with 'false', and
+# form fields named vad_<setting> (e.g. vad_min_speech_seconds) override VAD_SETTINGS.
+VAD_ENABLED = True
+VAD_SETTINGS = VadSettings()
+
+vad_totals = {'clips': 0, 'rejected': 0, 'input_seconds': 0.0, 'cut_seconds': 0.0}
+vad_totals_lock = threading.Lock()
+
+def vad_settings():
+    """VAD settings for the current request, or None when VAD is off"""
+    enabled = request.form.get('vad') or request.headers.get('X-Vad')
+    if enabled is None and not VAD_ENABLED or enabled is not None and enabled.lower() in ('false', '0', 'off'):
+        return None
+    overrides = {}
+    for field in VadSettings._fields:
+        value = request.form.get('vad_' + field)
+        if value is not None:
+            try:
+                overrides[field] = float(value)
+            except ValueError:
+                raise AudioDecodeError(f"Invalid vad_{field}: {value}")
+    return VAD_SETTINGS._replace(**overrides)
+
+def record_vad(report):
+    with vad_totals_lock:
+        vad_totals['clips'] += 1
+        vad_totals['rejected'] += 0 if report['speech'] else 1
+        vad_totals['input_seconds'] += report['input_seconds']
+        vad_totals['cut_seconds'] += report['cut_seconds']
+
+# ============= SHORT UTTERANCE FAST PATH =============
+# Clips that fit a short encoder window skip the 30 second padding; results that
+# aren't confident (see whisper_inference) are redone with model.transcribe.
+SHORT_PATH_ENABLED = True
+
+path_totals = {'short': 0, 'fallback': 0, 'standard': 0}
+path_totals_lock = threading.Lock()
+
+def count_path(path):
+    with path_totals_lock:
+        path_totals[path] += 1
+
+# ============= BATCHING =============
+# Short-path clips for the same model that arrive within BATCH_WINDOW_SECONDS of each
+# other (or while the previous batch is running) are padded to one window and run
+# through the encoder and greedy decoder as a single batch of up to BATCH_MAX_SIZE.
+BATCH_WINDOW_SECONDS = 0.03
+BATCH_MAX_SIZE = cpu_settings['batch_max_size']
+
+class ShortBatcher:
+    """Request queue for one model's short path, drained by a worker thread"""
+
+    def __init__(self, model, lock):
+        self.model = model
+        self.lock = lock
+        self.pending = []  # (audio, Future)
+        self.condition = threading.Condition()
+        self.batches = 0
+        self.clips = 0
+        threading.Thread(target=self.run, daemon=True).start()
+
+    def transcribe(self, audio):
+        """Queue a clip and wait for its ShortTranscription"""
+        future = Future()
+        with self.condition:
+            self.pending.append((audio, future))
+            self.condition.notify()
+        return future.result()
+
+    def next_batch(self):
+        with self.condition:
+            while not self.pending:
+                self.condition.wait()
+            deadline = time.monotonic() + BATCH_WINDOW_SECONDS
+            while len(self.pending) < BATCH_MAX_SIZE:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self.condition.wait(remaining)
+            batch, self.pending = self.pending[:BATCH_MAX_SIZE], self.pending[BATCH_MAX_SIZE:]
+            return batch
+
+    def run(self):
+        while True:
+            batch = self.next_batch()
+            try:
+                with self.lock:
+                    results = transcribe_short_batch(self.model, [audio for audio, _ in batch])
+            except Exception as e:
+                print(f"Batch transcription error: {str(e)}")
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            self.batches += 1
+            self.clips += len(batch)
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
+
+    def report(self):
+        return {
+            'batches': self.batches,
+            'clips': self.clips,
+            'mean_batch_size': round(self.clips / self.batches, 2) if self.batches else 0.0,
+        }
+
+batchers = {size: ShortBatcher(models[size], model_locks[size]) for size in MODEL_SIZES}
+
+def transcribe_full_window(size, audio):
+    """model.transcribe on one model, waiting for its other decodes (and batches) to finish"""
+    with model_locks[size]:
+        return models[size].transcribe(audio)
+
+def transcribe_with_model(size, audio, can_escalate=False):
+    """
+    Transcribe on one model. Returns (text, path taken, whether to escalate).
+    With can_escalate (a larger model comes next in the route), a short path result
+    that isn't confident is escalated right away instead of being redone with the
+    full window first.
+    """
+    if SHORT_PATH_ENABLED and window_bucket(len(audio) / SAMPLE_RATE) is not None:
+        short = batchers[size].transcribe(audio)
+        if is_silence(short):
+            count_path('short')
+            return '', 'short', False  # Confidently nothing, no reason to escalate
+        if is_confident(short):
+            count_path('short')
+            return short.text, 'short', can_escalate and short.avg_logprob < ESCALATE_BELOW_AVG_LOGPROB
+        print(f"Short path not confident (avg_logprob {short.avg_logprob:.2f}, "
+              f"compression {short.compression_ratio:.2f}), "
+              f"{'escalating' if can_escalate else 'falling back to the full window'}")
+        if can_escalate:
+            count_path('short')
+            return short.text, 'short', True
+        count_path('fallback')
+        result = transcribe_full_window(size, audio)
+        return result['text'], 'fallback', False
+    count_path('standard')
+    result = transcribe_full_window(size, audio)
+    return result['text'], 'standard', can_escalate and segments_avg_logprob(result) < ESCALATE_BELOW_AVG_LOGPROB
+
+def transcribe_audio(audio, quality='auto'):
+    """Transcribe a float32 16 kHz array. Returns (text, path taken, model size)"""
+    sizes = model_route(quality, len(audio) / SAMPLE_RATE)
+    for i, size in enumerate(sizes):
+        start = time.perf_counter()
+        text, path, escalate = transcribe_with_model(size, audio, can_escalate=i < len(sizes) - 1)
+        record_model(size, time.perf_counter() - start, escalate)
+        if not escalate:
+            return text, path, size
+        print(f"Model {size} not confident, escalating to {sizes[i + 1]}")
+
+def request_pcm_audio():
+    """Decode the raw PCM of the current request ('file' form field or request body)"""
+    if 'file' in request.files:
+        pcm = request.files['file'].read()
+    else:
+        pcm = request.get_data()
+    return decode_pcm(
+        pcm,
+        sample_rate=pcm_parameter('sample_rate', int),
+        channels=pcm_parameter('channels', int),
+        sample_format=pcm_parameter('sample_format', str.lower),
+    )
+
+def transcription_response(audio):
+    """Transcribe a float32 16 kHz array and return it in the format expected by the bot"""
+    settings = vad_settings()
+    quality = quality_tier()
+    if settings is None:
+        text, path, size = transcribe_audio(audio, quality)
+        return jsonify({
+            'text': text,
+            'path': path,
+            'model': size
+        })
+
+    vad = apply_vad(audio, settings)
+    report = vad_report(vad)
+    record_vad(report)
+    if not vad.speech:
+        print(f"VAD: no speech in {report['input_seconds']}s clip ({report['voiced_seconds']}s voiced), skipping")
+        return jsonify({
+            'text': '',
+            'vad': report
+        })
+
+    print(f"VAD: kept {report['kept_seconds']}s of {report['input_seconds']}s")
+    text, path, size = transcribe_audio(vad.audio, quality)
+    return jsonify({
+        'text': text,
+        'path': path,
+        'model': size,
+        'vad': report
+    })
 
 @app.route('/v1/audio/transcriptions', methods=['POST'])
 def transcribe():
-    tmp_file_path = None
     try:
         if 'file' not in request.files:
             return jsonify({'error': 'No file provided'}), 400
@@ -18,35 +301,306 @@ def transcribe():
         if audio_file.filename == '':
             return jsonify({'error': 'No file selected'}), 400
         
-        # Save the uploaded file temporarily
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.mp3') as tmp_file:
-            tmp_file_path = tmp_file.name
-            audio_file.save(tmp_file_path)
+        # Decode the upload in memory to a float32 16 kHz array
+        audio = decode_audio(audio_file.read())
         
-        # Transcribe the audio (file is now closed)
-        result = model.transcribe(tmp_file_path)
+        return transcription_response(audio)
         
-        # Return in the format expected by the bot
-        return jsonify({
-            'text': result['text']
-        })
+    except AudioDecodeError as e:
+        print(f"Audio decoding error: {str(e)}")
+        return jsonify({'error': str(e)}), 400
         
     except Exception as e:
         print(f"Transcription error: {str(e)}")
         return jsonify({'error': str(e)}), 500
+
+@app.route('/v1/audio/transcriptions/pcm', methods=['POST'])
+def transcribe_pcm():
+    """
+    Transcribe raw interleaved PCM, sent either as the 'file' form field or as the
+    request body. sample_rate, channels and sample_format (u8, s16le, s24le, s32le,
+    f32le) are read from form fields or X-Sample-Rate, X-Channels and X-Sample-Format
+    headers, defaulting to 48 kHz mono s16le. sample_rate must be one of
+    audio.SUPPORTED_SAMPLE_RATES.
+    """
+    try:
+        return transcription_response(request_pcm_audio())
         
-    finally:
-        # Clean up the temporary file in the finally block
-        if tmp_file_path and os.path.exists(tmp_file_path):
-            try:
-                os.unlink(tmp_file_path)
-            except Exception as cleanup_error:
-                print(f"Warning: Could not delete temp file {tmp_file_path}: {cleanup_error}")
+    except AudioDecodeError as e:
+        print(f"Audio decoding error: {str(e)}")
+        return jsonify({'error': str(e)}), 400
+        
+    except Exception as e:
+        print(f"Transcription error: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+# ============= TRIGGER SPOTTING =============
+# Cheap check whether a clip addresses the bot: the smallest model decodes the first
+# and last TRIGGER_WINDOW_SECONDS (where names are usually said) with the trigger
+# names as prompt, and the result is fuzzy matched against the names.
+TRIGGER_WINDOW_SECONDS = 2.0
+TRIGGER_THRESHOLD = 0.75
+# Prompting with the names catches misheard names, at the cost of occasional false positives
+TRIGGER_PROMPT = True
+
+def normalize_words(text):
+    return re.sub(r"[^\w\s']", ' ', text.lower()).split()
+
+def trigger_score(text, triggers):
+    """Best similarity (0-1) between a trigger and any run of as many words in text"""
+    words = normalize_words(text)
+    best_score, best_trigger = 0.0, None
+    for trigger in triggers:
+        trigger_words = normalize_words(trigger)
+        if not trigger_words:
+            continue
+        target = ' '.join(trigger_words)
+        for i in range(max(1, len(words) - len(trigger_words) + 1)):
+            candidate = ' '.join(words[i:i + len(trigger_words)])
+            score = difflib.SequenceMatcher(None, target, candidate).ratio()
+            if score > best_score:
+                best_score, best_trigger = score, trigger
+    return best_score, best_trigger
+
+def trigger_windows(audio):
+    window = int(TRIGGER_WINDOW_SECONDS * SAMPLE_RATE)
+    if len(audio) <= 2 * window:
+        return [audio]
+    return [audio[:window], audio[-window:]]
+
+@app.route('/v1/audio/triggers', methods=['POST'])
+def spot_triggers():
+    """
+    Check whether raw PCM (same format parameters as /v1/audio/transcriptions/pcm)
+    likely contains one of the trigger names, given as a comma-separated 'triggers'
+    form field or X-Triggers header.
+    """
+    try:
+        start = time.perf_counter()
+        triggers = [name.strip() for name in (request.form.get('triggers') or request.headers.get('X-Triggers') or '').split(',') if name.strip()]
+        if not triggers:
+            return jsonify({'error': 'No triggers provided'}), 400
+        audio = request_pcm_audio()
+
+        vad = apply_vad(audio, VAD_SETTINGS)
+        if not vad.speech:
+            return jsonify({'trigger': False, 'score': 0.0, 'match': None, 'text': '', 'seconds': round(time.perf_counter() - start, 3)})
+
+        size = MODEL_SIZES[0]
+        prompt = ', '.join(triggers) if TRIGGER_PROMPT else None
+        # The prompt differs per request, so the windows don't join the model's batches
+        # and take its lock instead
+        with model_locks[size]:
+            results = transcribe_short_batch(models[size], trigger_windows(vad.audio), prompt=prompt)
+        text = ' ... '.join(result.text for result in results if not is_silence(result))
+        score, match = trigger_score(text, triggers)
+        return jsonify({
+            'trigger': score >= TRIGGER_THRESHOLD,
+            'score': round(score, 3),
+            'match': match,
+            'text': text,
+            'model': size,
+            'seconds': round(time.perf_counter() - start, 3)
+        })
+
+    except AudioDecodeError as e:
+        print(f"Audio decoding error: {str(e)}")
+        return jsonify({'error': str(e)}), 400
+
+    except Exception as e:
+        print(f"Trigger spotting error: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+# ============= STREAMING =============
+# A client opens a session, pushes PCM chunks as the speaker talks and finishes the
+# stream when they stop. Every PARTIAL_INTERVAL_SECONDS of new audio the rolling buffer
+# is transcribed in the background, and each push returns the latest partial, so
+# finishing only has to cover the audio since the last partial. Once the buffer is
+# longer than ROLLING_BUFFER_SECONDS its start is cut at the quietest point of the
+# middle part, transcribed once and committed.
+PARTIAL_INTERVAL_SECONDS = 1.0
+ROLLING_BUFFER_SECONDS = 10.0
+STREAM_SESSION_TIMEOUT = 60.0
+STREAM_WORKERS = 4
+
+stream_executor = ThreadPoolExecutor(max_workers=STREAM_WORKERS)
+streams = {}
+streams_lock = threading.Lock()
+
+def transcribe_text(audio, settings, quality):
+    """Text for a float32 16 kHz buffer, '' when the VAD finds no speech in it"""
+    if settings is not None:
+        vad = apply_vad(audio, settings)
+        if not vad.speech:
+            return ''
+        audio = vad.audio
+    return transcribe_audio(audio, quality)[0].strip()
+
+def quietest_cut(audio, settings):
+    """Sample index of the quietest frame between half the rolling buffer and 1 s from its end"""
+    frame_length = int((settings or VAD_SETTINGS).frame_seconds * SAMPLE_RATE)
+    energies = frame_energies_db(audio, frame_length)
+    first = int(ROLLING_BUFFER_SECONDS / 2 * SAMPLE_RATE) // frame_length
+    last = max(first + 1, (len(audio) - SAMPLE_RATE) // frame_length)
+    return (first + int(np.argmin(energies[first:last]))) * frame_length
+
+class StreamSession:
+    def __init__(self, sample_rate, channels, sample_format, quality, settings):
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.sample_format = sample_format
+        self.quality = quality
+        self.settings = settings
+        self.frame_bytes = SAMPLE_FORMATS[sample_format] * channels
+        self.remainder = b''  # Partial frame left over from the last push
+        self.chunks = []  # Uncommitted audio, float32 mono at sample_rate
+        self.buffered = 0  # Samples in chunks
+        self.transcribed = 0  # Samples in chunks covered by the current partial
+        self.committed = []
+        self.partial = ''
+        self.pending = None  # Future of the running partial update
+        self.lock = threading.Lock()
+        self.last_activity = time.monotonic()
+
+    def text(self):
+        return ' '.join(text for text in self.committed + [self.partial] if text)
+
+    def push(self, pcm):
+        with self.lock:
+            self.last_activity = time.monotonic()
+            data = self.remainder + pcm
+            usable = len(data) - len(data) % self.frame_bytes
+            self.remainder = data[usable:]
+            if usable:
+                samples = pcm_to_float32(data[:usable], self.sample_format, self.channels)
+                self.chunks.append(samples)
+                self.buffered += len(samples)
+            due = self.buffered - self.transcribed >= PARTIAL_INTERVAL_SECONDS * self.sample_rate
+            if due and self.pending is None:
+                self.pending = stream_executor.submit(self.update_partial)
+            return self.text()
+
+    def update_partial(self):
+        """Transcribe the rolling buffer, committing its start when it has grown too long"""
+        try:
+            with self.lock:
+                chunk_count = len(self.chunks)
+                buffer = np.concatenate(self.chunks) if self.chunks else np.zeros(0, dtype=np.float32)
+            audio = resample(buffer, self.sample_rate)
+
+            cut = 0
+            if len(audio) > ROLLING_BUFFER_SECONDS * SAMPLE_RATE:
+                cut_16k = quietest_cut(audio, self.settings)
+                committed = transcribe_text(audio[:cut_16k], self.settings, self.quality)
+                audio = audio[cut_16k:]
+                cut = min(len(buffer), round(cut_16k * self.sample_rate / SAMPLE_RATE))
+            partial = transcribe_text(audio, self.settings, self.quality) if len(audio) else ''
+
+            with self.lock:
+                if cut:
+                    self.committed.append(committed)
+                    self.chunks = [buffer[cut:]] + self.chunks[chunk_count:]
+                    self.buffered -= cut
+                self.partial = partial
+                self.transcribed = len(buffer) - cut
+        except Exception as e:
+            print(f"Streaming transcription error: {str(e)}")
+        finally:
+            with self.lock:
+                self.pending = None
+
+    def finish(self):
+        """Wait for the running update, transcribe whatever came after it and return the full text"""
+        pending = self.pending
+        if pending is not None:
+            pending.result()
+        if self.transcribed < self.buffered:
+            self.update_partial()
+        return self.text()
+
+def expire_streams():
+    now = time.monotonic()
+    with streams_lock:
+        for session_id in [sid for sid, session in streams.items() if now - session.last_activity > STREAM_SESSION_TIMEOUT]:
+            del streams[session_id]
+
+def stream_session(session_id):
+    with streams_lock:
+        return streams.get(session_id)
+
+@app.route('/v1/audio/streams', methods=['POST'])
+def open_stream():
+    """
+    Open a streaming session. Takes the same sample_rate, channels, sample_format,
+    quality and VAD parameters as /v1/audio/transcriptions/pcm.
+    """
+    try:
+        expire_streams()
+        sample_rate = pcm_parameter('sample_rate', int)
+        channels = pcm_parameter('channels', int)
+        sample_format = pcm_parameter('sample_format', str.lower)
+        check_pcm_format(sample_rate, channels, sample_format)
+        session = StreamSession(sample_rate, channels, sample_format, quality_tier(), vad_settings())
+        session_id = uuid.uuid4().hex
+        with streams_lock:
+            streams[session_id] = session
+        return jsonify({'session_id': session_id})
+
+    except AudioDecodeError as e:
+        return jsonify({'error': str(e)}), 400
+
+@app.route('/v1/audio/streams/<session_id>', methods=['POST'])
+def push_stream(session_id):
+    """Append a raw PCM chunk (request body). Returns the latest partial transcription"""
+    session = stream_session(session_id)
+    if session is None:
+        return jsonify({'error': 'Unknown or expired session'}), 404
+    partial = session.push(request.get_data())
+    return jsonify({
+        'partial': partial,
+        'seconds': round(session.buffered / session.sample_rate, 3)
+    })
+
+@app.route('/v1/audio/streams/<session_id>/finish', methods=['POST'])
+def finish_stream(session_id):
+    """Push an optional last chunk, close the session and return the final transcription"""
+    with streams_lock:
+        session = streams.pop(session_id, None)
+    if session is None:
+        return jsonify({'error': 'Unknown or expired session'}), 404
+    try:
+        start = time.perf_counter()
+        last_chunk = request.get_data()
+        if last_chunk:
+            session.push(last_chunk)
+        text = session.finish()
+        return jsonify({
+            'text': text,
+            'finish_seconds': round(time.perf_counter() - start, 3)
+        })
+
+    except Exception as e:
+        print(f"Transcription error: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/v1/audio/streams/<session_id>', methods=['DELETE'])
+def close_stream(session_id):
+    with streams_lock:
+        session = streams.pop(session_id, None)
+    if session is None:
+        return jsonify({'error': 'Unknown or expired session'}), 404
+    return jsonify({'status': 'closed'})
 
 @app.route('/health', methods=['GET'])
 def health():
-    return jsonify({'status': 'healthy'})
+    with vad_totals_lock:
+        vad = {name: round(value, 3) for name, value in vad_totals.items()}
+    with path_totals_lock:
+        paths = dict(path_totals)
+    batching = {size: batcher.report() for size, batcher in batchers.items()}
+    return jsonify({'status': 'healthy', 'vad': vad, 'paths': paths, 'models': model_report(), 'batching': batching})
 
 if __name__ == '__main__':
     print("Starting Whisper transcription server on port 8001...")
-    app.run(host='0.0.0.0', port=8001, debug=True)
+    # No reloader: it would run this file twice, loading every model and batch worker twice
+    app.run(host='0.0.0.0', port=8001, debug=True, use_reloader=False, threaded=True)
@@ -0,0 +1,192 @@
+"""
+In-memory audio decoding for WhisperServer.
+
+Uploads are decoded straight into the float32, 16 kHz mono array that Whisper takes
+as input, without touching the disk: raw PCM and PCM WAV files are decoded natively and
+resampled with a polyphase FIR filter, anything else is piped through ffmpeg over
+stdin/stdout.
+"""
+
+import io
+import math
+import subprocess
+import wave
+from functools import lru_cache
+
+import numpy as np
+
+SAMPLE_RATE = 16000  # Whisper's input sample rate
+
+# Raw PCM sample formats (ffmpeg names) -> bytes per sample
+SAMPLE_FORMATS = {
+    'u8': 1,
+    's16le': 2,
+    's24le': 3,
+    's32le': 4,
+    'f32le': 4,
+}
+WAV_SAMPLE_FORMATS = {1: 'u8', 2: 's16le', 3: 's24le', 4: 's32le'}
+
+# Rates the polyphase resampler accepts. An arbitrary rate can reduce to a huge up/down
+# factor (383999 Hz needs a filter with millions of taps), so other WAV rates go to ffmpeg
+SUPPORTED_SAMPLE_RATES = (8000, 11025, 16000, 22050, 24000, 32000, 44100, 48000, 96000)
+MAX_CHANNELS = 8
+
+# Resampling filter: Kaiser-windowed sinc, 10 zero crossings per side (as scipy's resample_poly)
+RESAMPLE_HALF_WIDTH = 10
+RESAMPLE_KAISER_BETA = 5.0
+
+
+class AudioDecodeError(ValueError):
+    pass
+
+
+def is_wav(data):
+    return len(data) >= 12 and data[:4] == b'RIFF' and data[8:12] == b'WAVE'
+
+
+def pcm_to_float32(pcm, sample_format='s16le', channels=1):
+    """Convert interleaved little-endian PCM bytes to a float32 mono array in [-1, 1]"""
+    sample_width = SAMPLE_FORMATS.get(sample_format)
+    if sample_width is None:
+        raise AudioDecodeError(f"Unsupported sample format: {sample_format} (use one of {', '.join(SAMPLE_FORMATS)})")
+    if not 1 <= channels <= MAX_CHANNELS:
+        raise AudioDecodeError(f"Channels must be between 1 and {MAX_CHANNELS}")
+    # Drop a trailing partial frame
+    pcm = pcm[:len(pcm) - len(pcm) % (sample_width * channels)]
+
+    if sample_format == 'u8':
+        samples = (np.frombuffer(pcm, dtype=np.uint8).astype(np.float32) - 128.0) / 128.0
+    elif sample_format == 's16le':
+        samples = np.frombuffer(pcm, dtype='<i2').astype(np.float32) / 32768.0
+    elif sample_format == 's24le':
+        raw = np.frombuffer(pcm, dtype=np.uint8).reshape(-1, 3).astype(np.int32)
+        values = raw[:, 0] | (raw[:, 1] << 8) | (raw[:, 2] << 16)
+        values = np.where(values & 0x800000, values - 0x1000000, values)
+        samples = values.astype(np.float32) / 8388608.0
+    elif sample_format == 's32le':
+        samples = (np.frombuffer(pcm, dtype='<i4') / 2147483648.0).astype(np.float32)
+    else:
+        samples = np.nan_to_num(np.frombuffer(pcm, dtype='<f4'), nan=0.0, posinf=1.0, neginf=-1.0)
+
+    if channels > 1:
+        samples = samples.reshape(-1, channels).mean(axis=1, dtype=np.float32)
+    return samples
+
+
+@lru_cache(maxsize=16)
+def resample_filter(up, down):
+    """Low-pass FIR for resampling by up/down, scaled by up to keep the signal level"""
+    max_rate = max(up, down)
+    half_length = RESAMPLE_HALF_WIDTH * max_rate
+    n = np.arange(-half_length, half_length + 1, dtype=np.float64)
+    cutoff = 1.0 / max_rate  # Fraction of the upsampled Nyquist frequency
+    taps = cutoff * np.sinc(cutoff * n) * np.kaiser(len(n), RESAMPLE_KAISER_BETA)
+    return (taps * (up / taps.sum())).astype(np.float32)
+
+
+def resample_poly(samples, up, down):
+    """
+    Resample by the rational factor up/down with a polyphase FIR filter.
+    Equivalent to upsampling with zeros, low-pass filtering and keeping every down-th
+    sample, but each output sample only costs len(taps) / up multiplications.
+    """
+    divisor = math.gcd(up, down)
+    up, down = up // divisor, down // divisor
+    samples = np.asarray(samples, dtype=np.float32)
+    if up == down:
+        return samples.copy()
+
+    taps = resample_filter(up, down)
+    delay = (len(taps) - 1) // 2  # Group delay of the filter, in upsampled samples
+    output_length = -(-len(samples) * up // down)
+    phase_length = -(-len(taps) // up)
+    padded = np.pad(samples, (phase_length, phase_length + 1))
+    output = np.zeros(output_length, dtype=np.float32)
+    step = pow(down, -1, up) if up > 1 else 0
+
+    # Output m is upsampled sample n = m * down + delay. Only every up-th tap hits a
+    # non-zero upsampled sample, so outputs with the same phase n % up share one sub-filter.
+    for phase in range(up):
+        first = ((phase - delay) * step) % up
+        if first >= output_length:
+            continue
+        count = len(range(first, output_length, up))
+        base = phase_length + (first * down + delay) // up
+        stop = (count - 1) * down + 1
+        accumulator = np.zeros(count, dtype=np.float32)
+        for j, tap in enumerate(taps[phase::up]):
+            accumulator += tap * padded[base - j:base - j + stop:down]
+        output[first::up] = accumulator
+    return output
+
+
+def resample(samples, sample_rate, target_rate=SAMPLE_RATE):
+    if sample_rate == target_rate:
+        return samples
+    if sample_rate not in SUPPORTED_SAMPLE_RATES:
+        raise AudioDecodeError(f"Unsupported sample rate: {sample_rate} Hz")
+    return resample_poly(samples, target_rate, sample_rate)
+
+
+def check_pcm_format(sample_rate, channels, sample_format):
+    if sample_rate not in SUPPORTED_SAMPLE_RATES:
+        rates = ', '.join(str(rate) for rate in SUPPORTED_SAMPLE_RATES)
+        raise AudioDecodeError(f"Unsupported sample rate: {sample_rate} Hz (use one of {rates})")
+    if not 1 <= channels <= MAX_CHANNELS:
+        raise AudioDecodeError(f"Channels must be between 1 and {MAX_CHANNELS}")
+    if sample_format not in SAMPLE_FORMATS:
+        raise AudioDecodeError(f"Unsupported sample format: {sample_format} (use one of {', '.join(SAMPLE_FORMATS)})")
+
+
+def decode_pcm(pcm, sample_rate, channels=1, sample_format='s16le'):
+    """Decode raw interleaved PCM to the float32 16 kHz mono array Whisper expects"""
+    if not pcm:
+        raise AudioDecodeError("Empty audio data")
+    check_pcm_format(sample_rate, channels, sample_format)
+    return resample(pcm_to_float32(pcm, sample_format, channels), sample_rate)
+
+
+def decode_wav(data):
+    """Decode a PCM WAV file. Returns (float32 mono samples, sample rate)"""
+    try:
+        with wave.open(io.BytesIO(data), 'rb') as wav:
+            channels = wav.getnchannels()
+            sample_width = wav.getsampwidth()
+            sample_rate = wav.getframerate()
+            pcm = wav.readframes(wav.getnframes())
+    except (wave.Error, EOFError) as e:
+        raise AudioDecodeError(f"Invalid WAV file: {e}")
+    if sample_width not in WAV_SAMPLE_FORMATS:
+        raise AudioDecodeError(f"Unsupported WAV sample width: {sample_width} bytes")
+    return pcm_to_float32(pcm, WAV_SAMPLE_FORMATS[sample_width], channels), sample_rate
+
+
+def decode_with_ffmpeg(data, sample_rate=SAMPLE_RATE):
+    """Decode any format ffmpeg can read from a pipe to float32 mono samples at sample_rate"""
+    command = [
+        'ffmpeg', '-hide_banner', '-loglevel', 'error', '-threads', '0',
+        '-i', 'pipe:0',
+        '-f', 's16le', '-ac', '1', '-acodec', 'pcm_s16le', '-ar', str(sample_rate),
+        'pipe:1',
+    ]
+    try:
+        result = subprocess.run(command, input=data, capture_output=True, check=True)
+    except FileNotFoundError:
+        raise AudioDecodeError("ffmpeg is not installed")
+    except subprocess.CalledProcessError as e:
+        raise AudioDecodeError(f"Failed to decode audio: {e.stderr.decode(errors='ignore').strip()}")
+    return pcm_to_float32(result.stdout)
+
+
+def decode_audio(data):
+    """Decode uploaded audio bytes to the float32 16 kHz mono array Whisper expects"""
+    if not data:
+        raise AudioDecodeError("Empty audio file")
+    if is_wav(data):
+        try:
+            samples, sample_rate = decode_wav(data)
+            return resample(samples, sample_rate)
+        except AudioDecodeError:
+            pass  # e.g. float or compressed WAV, or an unusual rate, which ffmpeg can still read
+    return decode_with_ffmpeg(data)
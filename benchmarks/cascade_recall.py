@@ -0,0 +1,114 @@
+"""
+Benchmark for the two-stage retrieval cascade (cascade_candidates valve).
+
+Downloads and chunks the search results for each query once, then ranks the
+chunks with the full pipeline and with the BM25 prefilter at several candidate
+counts M. Reports retrieval time and recall of the cascaded top results
+relative to the full pipeline.
+
+Usage:
+    python benchmarks/cascade_recall.py --keyword-retriever splade --candidates 25 50 100
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from llm_web_search import (
+    AsyncDDGS,
+    RecursiveCharacterTextSplitter,
+    Tools,
+    async_fetch_chunk_websites,
+)
+
+DEFAULT_QUERIES = [
+    "weather in Phoenix today",
+    "how do black holes form",
+    "python asyncio event loop tutorial",
+    "best hiking trails in Arizona",
+    "who won the last world cup",
+]
+
+
+async def fetch_chunks(retriever, query: str):
+    with AsyncDDGS(proxy=retriever.proxy) as ddgs:
+        results = await ddgs.aduckduckgo(query, retriever.num_results, 30)
+    text_splitter = RecursiveCharacterTextSplitter(
+        chunk_size=retriever.chunk_size,
+        chunk_overlap=10,
+        separators=["\n\n", "\n", ".", ", ", " ", ""],
+    )
+    return await async_fetch_chunk_websites(
+        [result["href"] for result in results],
+        text_splitter,
+        retriever.client_timeout,
+        retriever.proxy,
+        retriever.proxy_except_domains,
+    )
+
+
+async def rank(retriever, query: str, split_docs, cascade_candidates: int):
+    retriever.cascade_candidates = cascade_candidates
+    start = time.perf_counter()
+    docs = await retriever.aretrieve_from_chunks(query, list(split_docs), None)
+    return docs, time.perf_counter() - start
+
+
+async def main(args):
+    tools = Tools()
+    tools.valves.embedding_model_save_path = args.models_dir
+    tools.valves.cpu_only = args.cpu_only
+    tools.valves.keyword_retriever = args.keyword_retriever
+    tools.valves.chunker = "character-based"
+    retriever = tools.document_retriever
+    retriever.update_settings(tools.valves)
+    await retriever.aload_models(None)
+
+    totals = {m: [0.0, 0.0] for m in args.candidates}
+    full_total = 0.0
+    n = 0
+    for query in args.queries:
+        split_docs = await fetch_chunks(retriever, query)
+        if not split_docs:
+            print(f"{query!r}: no chunks fetched, skipping")
+            continue
+        full_docs, full_time = await rank(retriever, query, split_docs, 0)
+        full_total += full_time
+        n += 1
+        reference = {doc.page_content for doc in full_docs}
+        print(f"\n{query!r}: {len(split_docs)} chunks, full pipeline {full_time:.3f}s")
+        for m in args.candidates:
+            docs, elapsed = await rank(retriever, query, split_docs, m)
+            recall = (
+                len(reference & {doc.page_content for doc in docs}) / len(reference)
+                if reference
+                else 1.0
+            )
+            totals[m][0] += elapsed
+            totals[m][1] += recall
+            print(f"  M={m:<5} {elapsed:.3f}s  recall={recall:.2f}")
+
+    if not n:
+        return
+    print("\nSummary (mean over queries)")
+    print(f"  full    {full_total / n:.3f}s  recall=1.00")
+    for m, (elapsed, recall) in totals.items():
+        print(f"  M={m:<5} {elapsed / n:.3f}s  recall={recall / n:.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--queries", nargs="+", default=DEFAULT_QUERIES)
+    parser.add_argument("--candidates", nargs="+", type=int, default=[25, 50, 100, 200])
+    parser.add_argument("--keyword-retriever", default="splade", choices=["bm25", "splade"])
+    parser.add_argument(
+        "--models-dir",
+        default=os.path.join(
+            os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "models"
+        ),
+    )
+    parser.add_argument("--cpu-only", action="store_true")
+    asyncio.run(main(parser.parse_args()))
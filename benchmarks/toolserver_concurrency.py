@@ -0,0 +1,77 @@
+"""
+Concurrency benchmark for the Tools API server.
+
+Sends the same JSON request from many concurrent clients and reports throughput and
+latency percentiles. Start the server in each mode and point the benchmark at it:
+
+    python ToolServer.py            # Flask
+    python ToolServer.py --async    # asyncio
+    python benchmarks/toolserver_concurrency.py --concurrency 1 8 32 --route /tools/search_web --json '{"query": "weather in Phoenix"}'
+"""
+
+import argparse
+import asyncio
+import json
+import time
+
+import aiohttp
+import numpy as np
+
+
+async def run_level(session, url: str, payload: dict, concurrency: int, requests: int):
+    latencies = []
+    errors = 0
+    queue = asyncio.Queue()
+    for _ in range(requests):
+        queue.put_nowait(None)
+
+    async def client():
+        nonlocal errors
+        while not queue.empty():
+            queue.get_nowait()
+            start = time.perf_counter()
+            try:
+                async with session.post(url, json=payload) as resp:
+                    await resp.read()
+                    if resp.status != 200:
+                        errors += 1
+            except aiohttp.ClientError:
+                errors += 1
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    return np.array(latencies), elapsed, errors
+
+
+async def main(args):
+    payload = json.loads(args.json)
+    url = args.url.rstrip("/") + args.route
+    timeout = aiohttp.ClientTimeout(total=args.timeout)
+    connector = aiohttp.TCPConnector(limit=0)
+    async with aiohttp.ClientSession(timeout=timeout, connector=connector) as session:
+        # Warm-up request, so that model loading is not part of the measurement
+        await run_level(session, url, payload, 1, 1)
+        print(f"{url} {payload}")
+        print(f"{'clients':>8} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'max ms':>9} {'errors':>7}")
+        for concurrency in args.concurrency:
+            requests = max(args.requests, concurrency)
+            latencies, elapsed, errors = await run_level(
+                session, url, payload, concurrency, requests
+            )
+            p50, p95, p_max = np.percentile(latencies * 1000, [50, 95, 100])
+            print(
+                f"{concurrency:>8} {requests / elapsed:>8.1f} {p50:>9.1f} {p95:>9.1f} {p_max:>9.1f} {errors:>7}"
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--url", default="http://localhost:5001")
+    parser.add_argument("--route", default="/tools/calculate")
+    parser.add_argument("--json", default='{"expression": "2 + 2"}')
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[1, 4, 16, 64])
+    parser.add_argument("--requests", type=int, default=200, help="Requests per concurrency level")
+    parser.add_argument("--timeout", type=float, default=120)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,112 @@
+"""
+Startup benchmark for the Tools API server.
+
+Measures the import time of the server's heavy dependencies (each in a fresh
+interpreter), then starts the server and reports how long it takes until a cheap tool
+(/tools/calculate) answers and until /ready reports web search as available.
+
+Usage:
+    python benchmarks/toolserver_startup.py
+    python benchmarks/toolserver_startup.py --async --runs 3
+"""
+
+import argparse
+import json
+import os
+import signal
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODULES = [
+    "flask",
+    "numpy",
+    "scipy",
+    "sklearn",
+    "torch",
+    "transformers",
+    "sentence_transformers",
+    "llm_web_search",
+    "ToolServer",
+]
+
+IMPORT_SNIPPET = (
+    "import sys, time; sys.path.insert(0, {root!r}); "
+    "start = time.perf_counter(); import {module}; print(time.perf_counter() - start)"
+)
+
+
+def import_time(module: str):
+    result = subprocess.run(
+        [sys.executable, "-c", IMPORT_SNIPPET.format(root=ROOT, module=module)],
+        capture_output=True,
+        text=True,
+        cwd=ROOT,
+    )
+    if result.returncode != 0:
+        return None
+    return float(result.stdout.strip().splitlines()[-1])
+
+
+def request_ok(url: str, payload=None):
+    data = json.dumps(payload).encode() if payload is not None else None
+    req = urllib.request.Request(url, data=data, headers={"Content-Type": "application/json"})
+    try:
+        with urllib.request.urlopen(req, timeout=2) as resp:
+            return resp.status == 200
+    except (urllib.error.URLError, ConnectionError, TimeoutError):
+        return False
+
+
+def measure_startup(args):
+    """Start the server; return (seconds until /tools/calculate answers, seconds until /ready is 200)"""
+    command = [sys.executable, os.path.join(ROOT, "ToolServer.py")]
+    if args.async_mode:
+        command.append("--async")
+    start = time.perf_counter()
+    # Own process group, so that the Flask reloader's child process is stopped too
+    server = subprocess.Popen(
+        command, cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True
+    )
+    first_tool = ready = None
+    try:
+        while time.perf_counter() - start < args.timeout:
+            if first_tool is None and request_ok(args.url + "/tools/calculate", {"expression": "2 + 2"}):
+                first_tool = time.perf_counter() - start
+            if first_tool is not None and request_ok(args.url + "/ready"):
+                ready = time.perf_counter() - start
+                break
+            time.sleep(0.01)
+    finally:
+        os.killpg(server.pid, signal.SIGTERM)
+        server.wait()
+    return first_tool, ready
+
+
+def main(args):
+    print("Import times (fresh interpreter each)")
+    for module in MODULES:
+        seconds = import_time(module)
+        print(f"  {module:<24} {'not installed' if seconds is None else f'{seconds:.3f}s'}")
+
+    print(f"\nServer startup ({'asyncio' if args.async_mode else 'Flask'})")
+    print(f"{'run':>5} {'first tool':>12} {'ready':>10}")
+    for run in range(1, args.runs + 1):
+        first_tool, ready = measure_startup(args)
+        print(
+            f"{run:>5} {'-' if first_tool is None else f'{first_tool:.3f}s':>12} "
+            f"{'-' if ready is None else f'{ready:.3f}s':>10}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--url", default="http://localhost:5001")
+    parser.add_argument("--async", dest="async_mode", action="store_true")
+    parser.add_argument("--runs", type=int, default=1)
+    parser.add_argument("--timeout", type=float, default=300, help="Seconds to wait for /ready")
+    main(parser.parse_args())
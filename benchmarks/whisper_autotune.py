@@ -0,0 +1,144 @@
+"""
+Autotune WhisperServer's CPU settings on this host.
+
+Every combination of the --quantize settings, intra-op threads and inter-op threads runs in
+its own process (torch's inter-op pool can only be sized once per process), loads the
+model and times short-path batches of several sizes. The configuration with the
+highest throughput (audio seconds transcribed per wall second) whose batch latency
+stays under --max-latency is written to whisper_cpu.json, which WhisperServer reads
+at startup.
+
+int8 quantization is only tried when asked for with --quantize true false, since this
+script measures speed, not accuracy. Compare the word error rate first, with
+benchmarks/whisper_short_utterances.py with and without --quantize.
+
+Usage:
+    python benchmarks/whisper_autotune.py --clip path/to/utterance.wav
+    python benchmarks/whisper_autotune.py --clip path/to/utterance.wav --quantize true false
+    python benchmarks/whisper_autotune.py --model tiny --threads 2 4 8 --batch-sizes 1 4 8 --dry-run
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import torch  # noqa: E402
+import whisper  # noqa: E402
+
+from audio import SAMPLE_RATE, decode_audio, decode_pcm  # noqa: E402
+from whisper_inference import (  # noqa: E402
+    CPU_SETTINGS_PATH, DEFAULT_CPU_SETTINGS, apply_thread_settings, prepare_model, transcribe_short_batch, warm_up
+)
+from whisper_ingest import RECORDING_RATE, synthetic_speech  # noqa: E402
+
+
+def load_clip(path):
+    if path is None:
+        return decode_pcm(synthetic_speech(3), RECORDING_RATE)
+    with open(path, 'rb') as f:
+        return decode_audio(f.read())
+
+
+def run_worker(args):
+    """Time every batch size for one configuration; prints one JSON line per batch size"""
+    settings = dict(DEFAULT_CPU_SETTINGS, **json.loads(args.worker))
+    apply_thread_settings(settings)
+    model = prepare_model(whisper.load_model(args.model, device='cpu'), settings)
+    warm_up(model)
+    clip = load_clip(args.clip)
+    language = 'en'  # Skip language detection, it isn't what's being tuned
+    with torch.no_grad():
+        for batch_size in args.batch_sizes:
+            batch = [clip] * batch_size
+            transcribe_short_batch(model, batch, language=language)
+            timings = []
+            for _ in range(args.runs):
+                start = time.perf_counter()
+                transcribe_short_batch(model, batch, language=language)
+                timings.append(time.perf_counter() - start)
+            latency = statistics.median(timings)
+            print(json.dumps({
+                'batch_size': batch_size,
+                'latency': latency,
+                'throughput': batch_size * len(clip) / SAMPLE_RATE / latency,
+            }), flush=True)
+
+
+def configurations(args):
+    for quantize in args.quantize:
+        for intra in args.threads:
+            for inter in args.inter_threads:
+                yield {'quantize': quantize, 'intra_op_threads': intra, 'inter_op_threads': inter}
+
+
+def measure(args, settings):
+    command = [sys.executable, os.path.abspath(__file__), '--worker', json.dumps(settings), '--model', args.model,
+               '--runs', str(args.runs), '--batch-sizes', *map(str, args.batch_sizes)]
+    if args.clip:
+        command += ['--clip', args.clip]
+    result = subprocess.run(command, capture_output=True, text=True, cwd=ROOT)
+    if result.returncode != 0:
+        print(f"  failed: {result.stderr.strip().splitlines()[-1] if result.stderr.strip() else result.returncode}")
+        return []
+    return [json.loads(line) for line in result.stdout.splitlines() if line.startswith('{')]
+
+
+def main(args):
+    clip_seconds = len(load_clip(args.clip)) / SAMPLE_RATE
+    print(f"Model {args.model}, {clip_seconds:.1f}s clip, {os.cpu_count()} CPUs")
+    print(f"{'quantize':>8} {'intra':>5} {'inter':>5} {'batch':>5} {'latency':>9} {'x realtime':>11}")
+
+    best = None
+    for settings in configurations(args):
+        for row in measure(args, settings):
+            within_budget = row['latency'] <= args.max_latency
+            print(
+                f"{str(settings['quantize']):>8} {settings['intra_op_threads']:>5} {settings['inter_op_threads']:>5} "
+                f"{row['batch_size']:>5} {row['latency'] * 1000:>7.0f}ms {row['throughput']:>10.1f}x"
+                f"{'' if within_budget else '  (over latency budget)'}"
+            )
+            if within_budget and (best is None or row['throughput'] > best[1]['throughput']):
+                best = (settings, row)
+
+    if best is None:
+        print(f"\nNo configuration stayed under {args.max_latency}s per batch")
+        return
+    settings, row = best
+    chosen = dict(settings, batch_max_size=row['batch_size'])
+    print(f"\nBest: {chosen} ({row['throughput']:.1f}x realtime, {row['latency'] * 1000:.0f}ms per batch)")
+    if args.dry_run:
+        return
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(chosen, f, indent=2)
+        f.write('\n')
+    print(f"Wrote {args.output}")
+
+
+if __name__ == '__main__':
+    cpu_count = os.cpu_count() or 1
+    default_threads = sorted({1, 2, 4, 8, cpu_count} & set(range(1, cpu_count + 1)))
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument('--model', default='base')
+    parser.add_argument('--clip', help="Speech clip to transcribe (default: 3 s of synthetic audio)")
+    parser.add_argument('--threads', type=int, nargs='+', default=default_threads, help="Intra-op thread counts")
+    parser.add_argument('--inter-threads', type=int, nargs='+', default=[1, 2], help="Inter-op thread counts")
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--quantize', type=lambda value: value.lower() == 'true', nargs='+', default=[False],
+                        help="Quantization settings to try (true/false)")
+    parser.add_argument('--max-latency', type=float, default=2.0, help="Largest acceptable seconds per batch")
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--output', default=CPU_SETTINGS_PATH)
+    parser.add_argument('--dry-run', action='store_true', help="Print the best settings without writing them")
+    parser.add_argument('--worker', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.worker:
+        run_worker(args)
+    else:
+        main(args)
@@ -0,0 +1,141 @@
+"""
+Latency benchmark for WhisperServer's two ingest paths.
+
+The MP3 path is what bot.js does by default: encode the receiver's 48 kHz s16le PCM to
+MP3 with ffmpeg, upload it, and decode it again with ffmpeg on the server. The PCM
+path uploads the receiver's PCM as is and resamples it to 16 kHz in numpy.
+
+Without --url only the audio handling is timed (encode + decode vs. decode + resample,
+in process). With --url the clips are posted to a running WhisperServer, so the
+timings include upload and transcription.
+
+Usage:
+    python benchmarks/whisper_ingest.py
+    python benchmarks/whisper_ingest.py --input recordings/1234.pcm --runs 10
+    python benchmarks/whisper_ingest.py --url http://localhost:8001
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+import uuid
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from audio import AudioDecodeError, decode_audio, decode_pcm  # noqa: E402
+
+RECORDING_RATE = 48000  # Discord receiver: Opus decoded to 48 kHz mono s16le
+
+
+def synthetic_speech(seconds, sample_rate=RECORDING_RATE, seed=0):
+    """Voiced-speech-like test signal: harmonics of a wandering pitch, syllable envelope, noise"""
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    pitch = 140 + 30 * np.sin(2 * np.pi * 0.7 * t)
+    phase = 2 * np.pi * np.cumsum(pitch) / sample_rate
+    voice = sum(np.sin(k * phase) / k for k in range(1, 12))
+    envelope = np.clip(np.sin(2 * np.pi * 3 * t), 0, None)
+    signal = 0.3 * voice * envelope + 0.01 * rng.standard_normal(len(t))
+    return (np.clip(signal, -1, 1) * 32767).astype('<i2').tobytes()
+
+
+def encode_mp3(pcm):
+    """Encode receiver PCM to MP3 the way bot.js does (fluent-ffmpeg defaults)"""
+    command = [
+        'ffmpeg', '-hide_banner', '-loglevel', 'error',
+        '-f', 's16le', '-ar', str(RECORDING_RATE), '-ac', '1', '-i', 'pipe:0',
+        '-f', 'mp3', 'pipe:1',
+    ]
+    return subprocess.run(command, input=pcm, capture_output=True, check=True).stdout
+
+
+def multipart_body(fields, file_name, file_data):
+    boundary = uuid.uuid4().hex
+    parts = []
+    for name, value in fields.items():
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode())
+    parts.append(
+        f'--{boundary}\r\nContent-Disposition: form-data; name="file"; filename="{file_name}"\r\n'
+        f'Content-Type: application/octet-stream\r\n\r\n'.encode() + file_data + b'\r\n'
+    )
+    parts.append(f'--{boundary}--\r\n'.encode())
+    return b''.join(parts), f'multipart/form-data; boundary={boundary}'
+
+
+def post(url, body, content_type, headers=None):
+    request = urllib.request.Request(url, data=body, headers={'Content-Type': content_type, **(headers or {})})
+    with urllib.request.urlopen(request, timeout=300) as response:
+        response.read()
+
+
+def mp3_local(pcm):
+    decode_audio(encode_mp3(pcm))
+
+
+def pcm_local(pcm):
+    decode_pcm(pcm, RECORDING_RATE)
+
+
+def mp3_remote(url):
+    def run(pcm):
+        body, content_type = multipart_body({'model': 'whisper-1'}, 'audio.mp3', encode_mp3(pcm))
+        post(url + '/v1/audio/transcriptions', body, content_type)
+    return run
+
+
+def pcm_remote(url):
+    def run(pcm):
+        headers = {'X-Sample-Rate': str(RECORDING_RATE), 'X-Channels': '1', 'X-Sample-Format': 's16le'}
+        post(url + '/v1/audio/transcriptions/pcm', pcm, 'application/octet-stream', headers)
+    return run
+
+
+def time_path(path, pcm, runs):
+    path(pcm)  # Warm-up
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        path(pcm)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings), min(timings)
+
+
+def main(args):
+    if args.input:
+        with open(args.input, 'rb') as f:
+            clips = [(f"{os.path.basename(args.input)}", f.read())]
+    else:
+        clips = [(f"synthetic {seconds:g}s", synthetic_speech(seconds)) for seconds in args.seconds]
+
+    if args.url:
+        paths = [('mp3', mp3_remote(args.url)), ('pcm', pcm_remote(args.url))]
+        print(f"End to end against {args.url} (median / best of {args.runs})")
+    else:
+        paths = [('mp3', mp3_local), ('pcm', pcm_local)]
+        print(f"Audio handling only, in process (median / best of {args.runs})")
+
+    print(f"{'clip':<20} {'path':<5} {'median':>10} {'best':>10}")
+    for name, pcm in clips:
+        for path_name, path in paths:
+            try:
+                median, best = time_path(path, pcm, args.runs)
+            except (FileNotFoundError, subprocess.CalledProcessError, AudioDecodeError) as e:
+                print(f"{name:<20} {path_name:<5} failed: {e}")
+                continue
+            print(f"{name:<20} {path_name:<5} {median * 1000:>8.1f}ms {best * 1000:>8.1f}ms")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument('--url', help="WhisperServer URL, e.g. http://localhost:8001")
+    parser.add_argument('--input', help="Raw 48 kHz mono s16le recording (as written by bot.js)")
+    parser.add_argument('--seconds', type=float, nargs='+', default=[1, 3, 10], help="Synthetic clip lengths")
+    parser.add_argument('--runs', type=int, default=5)
+    main(parser.parse_args())
@@ -0,0 +1,142 @@
+"""
+Accuracy and latency benchmark for WhisperServer's short-utterance path.
+
+Every clip in --clips (any format audio.decode_audio reads, e.g. WAV or MP3) is
+transcribed with model.transcribe and with the shortened encoder window. Accuracy is
+the word error rate against a reference transcript next to the clip (clip.wav ->
+clip.txt), or against the standard path's output when there is none. The "short +
+fallback" column is what the server returns: the short result when it is confident,
+else the standard result at the cost of both passes.
+
+Usage:
+    python benchmarks/whisper_short_utterances.py --clips path/to/clips
+    python benchmarks/whisper_short_utterances.py --clips path/to/clips --model tiny --runs 3
+    python benchmarks/whisper_short_utterances.py --clips path/to/clips --device cpu --quantize
+"""
+
+import argparse
+import os
+import re
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import whisper  # noqa: E402
+
+from audio import SAMPLE_RATE, AudioDecodeError, decode_audio  # noqa: E402
+from whisper_inference import (  # noqa: E402
+    DEFAULT_CPU_SETTINGS, SHORT_WINDOW_BUCKETS, is_confident, is_silence, prepare_model, transcribe_short
+)
+
+
+def normalize_words(text):
+    return re.sub(r"[^\w\s']", ' ', text.lower()).split()
+
+
+def word_error_rate(reference, hypothesis):
+    """Word-level edit distance divided by the reference length"""
+    reference, hypothesis = normalize_words(reference), normalize_words(hypothesis)
+    if not reference:
+        return 0.0 if not hypothesis else 1.0
+    previous = list(range(len(hypothesis) + 1))
+    for i, ref_word in enumerate(reference, 1):
+        current = [i]
+        for j, hyp_word in enumerate(hypothesis, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ref_word != hyp_word)))
+        previous = current
+    return previous[-1] / len(reference)
+
+
+def timed(function, runs):
+    """(last result, median seconds) over runs calls, after one warm-up call"""
+    result = function()
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = function()
+        timings.append(time.perf_counter() - start)
+    return result, statistics.median(timings)
+
+
+def load_clips(directory):
+    clips = []
+    for name in sorted(os.listdir(directory)):
+        path = os.path.join(directory, name)
+        if name.endswith('.txt') or not os.path.isfile(path):
+            continue
+        try:
+            with open(path, 'rb') as f:
+                audio = decode_audio(f.read())
+        except AudioDecodeError as e:
+            print(f"Skipping {name}: {e}")
+            continue
+        reference_path = os.path.splitext(path)[0] + '.txt'
+        reference = None
+        if os.path.exists(reference_path):
+            with open(reference_path, encoding='utf-8') as f:
+                reference = f.read().strip()
+        clips.append((name, audio, reference))
+    return clips
+
+
+def main(args):
+    model = whisper.load_model(args.model, device=args.device)
+    model = prepare_model(model, dict(DEFAULT_CPU_SETTINGS, quantize=args.quantize))
+    fp16 = model.device.type == 'cuda'
+    clips = [clip for clip in load_clips(args.clips) if len(clip[1]) / SAMPLE_RATE <= SHORT_WINDOW_BUCKETS[-1]]
+    if not clips:
+        print(f"No clips of at most {SHORT_WINDOW_BUCKETS[-1]}s in {args.clips}")
+        return
+
+    print(f"{'clip':<28} {'sec':>5} {'window':>6} {'standard':>9} {'short':>9} {'conf':>5} {'WER std':>8} {'WER short':>9}")
+    rows = []
+    for name, audio, reference in clips:
+        standard, standard_seconds = timed(lambda: model.transcribe(audio, fp16=fp16)['text'].strip(), args.runs)
+        short, short_seconds = timed(lambda: transcribe_short(model, audio), args.runs)
+        short_text = '' if is_silence(short) else short.text
+        accepted = is_silence(short) or is_confident(short)
+        reference_text = reference if reference is not None else standard
+
+        row = {
+            'standard_seconds': standard_seconds,
+            'short_seconds': short_seconds,
+            'served_seconds': short_seconds if accepted else short_seconds + standard_seconds,
+            'accepted': accepted,
+            'wer_standard': word_error_rate(reference_text, standard),
+            'wer_short': word_error_rate(reference_text, short_text),
+            'wer_served': word_error_rate(reference_text, short_text if accepted else standard),
+        }
+        rows.append(row)
+        print(
+            f"{name[:28]:<28} {len(audio) / SAMPLE_RATE:>5.1f} {short.window_seconds:>5}s "
+            f"{standard_seconds * 1000:>7.0f}ms {short_seconds * 1000:>7.0f}ms {'yes' if accepted else 'no':>5} "
+            f"{row['wer_standard']:>8.3f} {row['wer_short']:>9.3f}"
+        )
+
+    with_references = sum(reference is not None for _, _, reference in clips)
+    print(f"\n{len(rows)} clips, {with_references} with reference transcripts "
+          f"(WER of the others is measured against the standard path)")
+    print(f"{'':<20} {'median latency':>15} {'mean WER':>10}")
+    for label, seconds_key, wer_key in (
+        ('standard', 'standard_seconds', 'wer_standard'),
+        ('short only', 'short_seconds', 'wer_short'),
+        ('short + fallback', 'served_seconds', 'wer_served'),
+    ):
+        median = statistics.median(row[seconds_key] for row in rows)
+        mean_wer = statistics.mean(row[wer_key] for row in rows)
+        print(f"{label:<20} {median * 1000:>13.0f}ms {mean_wer:>10.3f}")
+    fallback_rate = 1 - statistics.mean(row['accepted'] for row in rows)
+    print(f"Fallback rate: {fallback_rate:.1%}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument('--clips', required=True, help="Directory of short audio clips (+ optional .txt references)")
+    parser.add_argument('--model', default='base')
+    parser.add_argument('--device', default=None)
+    parser.add_argument('--runs', type=int, default=1)
+    parser.add_argument('--quantize', action='store_true', help="Use dynamic int8 quantization (CPU only)")
+    main(parser.parse_args())
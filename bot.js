@@ -154,7 +154,7 @@ const AVAILABLE_TOOLS = [
     type: "function",
     function: {
       name: "convert_units",
-      description: "Convert between different units of measurement. Supports temperature (fahrenheit/celsius), length (miles/km, feet/meters, inches/cm), weight (pounds/kg, ounces/grams), and volume (gallons/liters, cups/ml). Use underscores and 'to' format like 'fahrenheit_to_celsius' or shorthand like 'f_to_c', 'miles_to_km', 'lbs_to_kg'.",
+      description: "Convert between different units of measurement. Supports any pair of compatible units for temperature, length, area, volume, weight, time, speed, energy, power and pressure. Use underscores and 'to' format like 'fahrenheit_to_celsius' or shorthand like 'f_to_c', 'miles_to_km', 'lbs_to_kg'. To convert several numbers at once, pass them all in 'values' in a single call.",
       parameters: {
         type: "object",
         properties: {
@@ -162,12 +162,17 @@ const AVAILABLE_TOOLS = [
             type: "number",
             description: "The numerical value to convert"
           },
+          values: {
+            type: "array",
+            items: { type: "number" },
+            description: "Several numerical values to convert with the same conversion (use instead of 'value')"
+          },
           conversion: {
             type: "string",
-            description: "The conversion type in format 'from_to_to'. Examples: 'fahrenheit_to_celsius', 'miles_to_kilometers', 'pounds_to_kilograms', or shorthand: 'f_to_c', 'miles_to_km', 'lbs_to_kg'"
+            description: "The conversion type in format 'from_to_to'. Examples: 'fahrenheit_to_celsius', 'miles_to_kilometers', 'pounds_to_kilograms', 'mph_to_kph', or shorthand: 'f_to_c', 'miles_to_km', 'lbs_to_kg'"
           }
         },
-        required: ["value", "conversion"]
+        required: ["conversion"]
       }
     }
   },
@@ -175,13 +180,21 @@ const AVAILABLE_TOOLS = [
     type: "function",
     function: {
       name: "roll_dice",
-      description: "Roll virtual RPG dice. Use standard dice notation like '2d6' (roll 2 six-sided dice), '1d20' (roll 1 twenty-sided die), '3d10' (roll 3 ten-sided dice). Common dice: d4, d6, d8, d10, d12, d20, d100.",
+      description: "Roll virtual RPG dice, or work out the exact odds of a roll. Use standard dice notation like '2d6' (roll 2 six-sided dice), '1d20+5' (d20 plus a modifier), '4d6kh3' (roll 4d6, keep the highest 3), '2d6!' (exploding dice), '1d20adv' / '1d20dis' (advantage / disadvantage). Common dice: d4, d6, d8, d10, d12, d20, d100. For questions about odds, set 'distribution' and optionally 'at_least' instead of rolling.",
       parameters: {
         type: "object",
         properties: {
           dice_expression: {
             type: "string",
-            description: "The dice expression in XdY format, where X is the number of dice and Y is the number of sides. Examples: '2d6', '1d20', '4d8'"
+            description: "The dice expression: terms like XdY (X dice with Y sides) joined with + and -, with optional modifiers kh/kl (keep highest/lowest), dh/dl (drop highest/lowest), ! (explode), adv/dis. Examples: '2d6', '1d20+5', '4d6kh3', '3d8+1d4'"
+          },
+          distribution: {
+            type: "boolean",
+            description: "Return the exact probability distribution (mean, range, odds) instead of rolling"
+          },
+          at_least: {
+            type: "number",
+            description: "With distribution: also return the chance that the total is at least this value"
           }
         },
         required: ["dice_expression"]
@@ -190,8 +203,26 @@ const AVAILABLE_TOOLS = [
   }
 ];
 
+// Send recordings to WhisperServer as raw PCM instead of MP3 (not OpenAI compatible)
+const STT_RAW_PCM = process.env.STT_RAW_PCM === 'true';
+// Format of the recordings: Opus decoded by prism-media
+const RECORDING_FORMAT = { sample_rate: 48000, channels: 1, sample_format: 's16le' };
+// Stream audio to WhisperServer while the user speaks instead of uploading it afterwards
+const STT_STREAMING = process.env.STT_STREAMING === 'true';
+const STREAM_PUSH_INTERVAL = 250; // ms between PCM pushes
+// In trigger mode, ask WhisperServer whether a recording mentions a bot trigger before
+// transcribing it fully (needs STT_RAW_PCM). Recordings without one are dropped, so they
+// are not part of the conversation context either.
+const STT_TRIGGER_SPOTTING = process.env.STT_TRIGGER_SPOTTING === 'true';
+
 // Tools API endpoint
 const TOOLS_API_ENDPOINT = process.env.TOOLS_ENDPOINT || 'http://localhost:5001';
+// Token budget for web search results put into the LLM prompt (0 = unlimited)
+const TOOL_RESULT_MAX_TOKENS = parseInt(process.env.TOOL_RESULT_MAX_TOKENS || '0', 10);
+// Batched tool calls: the server times out each call before the HTTP request itself times out,
+// so a slow call comes back as a per-call error instead of failing the whole batch
+const TOOL_BATCH_REQUEST_TIMEOUT = 60000; // ms
+const TOOL_BATCH_CALL_TIMEOUT = 50; // seconds
 
 // ============= TOOL EXECUTION FUNCTIONS =============
 
@@ -200,7 +231,8 @@ async function executeSearchWeb(query) {
     logToConsole(`> [TOOL] Web Search: "${query}"`, 'info', 1);
     
     const response = await axios.post(`${TOOLS_API_ENDPOINT}/tools/search_web`, {
-      query: query
+      query: query,
+      max_tokens: TOOL_RESULT_MAX_TOKENS
     }, {
       timeout: 60000 // 60 second timeout for web searches
     });
@@ -219,6 +251,9 @@ async function executeSearchWeb(query) {
     if (error.code === 'ECONNREFUSED') {
       return `Error: Tools API server is not running. Please start it with: python ToolsAPI.py`;
     }
+    if (error.response && error.response.data && error.response.data.busy) {
+      return `Web search unavailable: ${error.response.data.error}`;
+    }
     return `Error performing web search: ${error.message}`;
   }
 }
@@ -229,7 +264,8 @@ async function executeSearchWebpage(query, webpage) {
     
     const response = await axios.post(`${TOOLS_API_ENDPOINT}/tools/search_webpage`, {
       query: query,
-      webpage: webpage
+      webpage: webpage,
+      max_tokens: TOOL_RESULT_MAX_TOKENS
     }, {
       timeout: 60000
     });
@@ -248,6 +284,9 @@ async function executeSearchWebpage(query, webpage) {
     if (error.code === 'ECONNREFUSED') {
       return `Error: Tools API server is not running. Please start it with: python ToolsAPI.py`;
     }
+    if (error.response && error.response.data && error.response.data.busy) {
+      return `Webpage search unavailable: ${error.response.data.error}`;
+    }
     return `Error searching webpage: ${error.message}`;
   }
 }
@@ -317,14 +356,12 @@ async function executeCalculate(expression) {
   }
 }
 
-async function executeConvertUnits(value, conversion) {
+async function executeConvertUnits(value, conversion, values) {
   try {
-    logToConsole(`> [TOOL] Convert: ${value} ${conversion}`, 'info', 1);
+    const body = Array.isArray(values) ? { values: values, conversion: conversion } : { value: value, conversion: conversion };
+    logToConsole(`> [TOOL] Convert: ${Array.isArray(values) ? values.join(', ') : value} ${conversion}`, 'info', 1);
     
-    const response = await axios.post(`${TOOLS_API_ENDPOINT}/tools/convert_units`, {
-      value: value,
-      conversion: conversion
-    }, {
+    const response = await axios.post(`${TOOLS_API_ENDPOINT}/tools/convert_units`, body, {
       timeout: 5000
     });
     
@@ -346,12 +383,14 @@ async function executeConvertUnits(value, conversion) {
   }
 }
 
-async function executeRollDice(diceExpression) {
+async function executeRollDice(diceExpression, distribution, atLeast) {
   try {
-    logToConsole(`> [TOOL] Roll Dice: "${diceExpression}"`, 'info', 1);
+    logToConsole(`> [TOOL] Roll Dice: "${diceExpression}"${distribution ? ' (distribution)' : ''}`, 'info', 1);
     
     const response = await axios.post(`${TOOLS_API_ENDPOINT}/tools/roll_dice`, {
-      dice_expression: diceExpression
+      dice_expression: diceExpression,
+      distribution: Boolean(distribution),
+      at_least: atLeast
     }, {
       timeout: 5000
     });
@@ -367,6 +406,9 @@ async function executeRollDice(diceExpression) {
     
   } catch (error) {
     logToConsole(`X [TOOL] Dice roll error: ${error.message}`, 'error', 1);
+    if (error.response && error.response.data && error.response.data.error) {
+      return `Dice roll error: ${error.response.data.error}`;
+    }
     if (error.code === 'ECONNREFUSED') {
       return `Error: Tools API server is not running. Please start it with: python ToolsAPI.py`;
     }
@@ -399,11 +441,11 @@ async function executeTool(toolName, argsString) {
         break;
       
       case 'convert_units':
-        result = await executeConvertUnits(args.value, args.conversion);
+        result = await executeConvertUnits(args.value, args.conversion, args.values);
         break;
       
       case 'roll_dice':
-        result = await executeRollDice(args.dice_expression);
+        result = await executeRollDice(args.dice_expression, args.distribution, args.at_least);
         break;
       
       default:
@@ -419,6 +461,49 @@ async function executeTool(toolName, argsString) {
   }
 }
 
+// Run several tool calls from one LLM turn concurrently in a single request.
+// Returns the result strings in the same order as toolCalls.
+async function executeToolBatch(toolCalls) {
+  try {
+    const calls = toolCalls.map(toolCall => {
+      const parameters = toolCall.function.arguments ? JSON.parse(toolCall.function.arguments) : {};
+      if (toolCall.function.name === 'search_web' || toolCall.function.name === 'search_webpage') {
+        parameters.max_tokens = TOOL_RESULT_MAX_TOKENS;
+      }
+      return { tool: toolCall.function.name, parameters: parameters };
+    });
+    logToConsole(`> [TOOL] Executing batch: ${calls.map(call => call.tool).join(', ')}`, 'info', 1);
+    
+    const response = await axios.post(`${TOOLS_API_ENDPOINT}/tools/execute`, {
+      calls: calls,
+      timeout: TOOL_BATCH_CALL_TIMEOUT
+    }, {
+      timeout: TOOL_BATCH_REQUEST_TIMEOUT
+    });
+    
+    return response.data.results.map(callResult => {
+      if (callResult.success) {
+        return callResult.result;
+      }
+      logToConsole(`X [TOOL] ${callResult.tool} failed: ${callResult.error}`, 'error', 1);
+      return `Tool error (${callResult.tool}): ${callResult.error}`;
+    });
+    
+  } catch (error) {
+    if (error.code === 'ECONNABORTED' || error.code === 'ETIMEDOUT') {
+      // Running the same calls again one by one would only take longer
+      logToConsole(`X [TOOL] Batch execution timed out: ${error.message}`, 'error', 1);
+      return toolCalls.map(toolCall => `Tool error (${toolCall.function.name}): timed out`);
+    }
+    logToConsole(`X [TOOL] Batch execution error: ${error.message}, running tools one by one`, 'error', 1);
+    const results = [];
+    for (const toolCall of toolCalls) {
+      results.push(await executeTool(toolCall.function.name, toolCall.function.arguments));
+    }
+    return results;
+  }
+}
+
 // ============= END TOOL DEFINITIONS =============
 
 client.on('clientReady', async () => {
@@ -1074,7 +1159,6 @@ function handleRecording(connection, channel) {
 
 function setupUserListener(userId, receiver, connection, channel) {
   const filePath = `./recordings/${userId}.pcm`;
-  const writeStream = fs.createWriteStream(filePath);
   
   const listenStream = receiver.subscribe(userId, {
     end: {
@@ -1089,6 +1173,12 @@ function setupUserListener(userId, receiver, connection, channel) {
     rate: 48000,
   });
 
+  if (STT_STREAMING) {
+    streamAudioToAPI(listenStream.pipe(opusDecoder), userId, connection, channel);
+    return;
+  }
+
+  const writeStream = fs.createWriteStream(filePath);
   listenStream.pipe(opusDecoder).pipe(writeStream);
 
   writeStream.on('finish', () => {
@@ -1101,7 +1191,6 @@ function handleRecordingForUser(userID, connection, channel) {
   const receiver = connection.receiver;
 
   const filePath = `./recordings/${userID}.pcm`;
-  const writeStream = fs.createWriteStream(filePath);
   const listenStream = receiver.subscribe(userID, {
     end: {
       behavior: EndBehaviorType.AfterSilence,
@@ -1115,6 +1204,12 @@ function handleRecordingForUser(userID, connection, channel) {
     rate: 48000,
   });
 
+  if (STT_STREAMING) {
+    streamAudioToAPI(listenStream.pipe(opusDecoder), userID, connection, channel);
+    return;
+  }
+
+  const writeStream = fs.createWriteStream(filePath);
   listenStream.pipe(opusDecoder).pipe(writeStream);
 
   writeStream.on('finish', () => {
@@ -1124,6 +1219,12 @@ function handleRecordingForUser(userID, connection, channel) {
 }
 
 function convertAndHandleFile(filePath, userId, connection, channel) {
+  // WhisperServer accepts the receiver's PCM as is, skipping the MP3 round trip
+  if (STT_RAW_PCM) {
+    sendAudioToAPI(filePath, userId, connection, channel);
+    return;
+  }
+
   const mp3Path = filePath.replace('.pcm', '.mp3');
   
   ffmpeg(filePath)
@@ -1232,75 +1333,51 @@ function clearConversationBuffer() {
   }
 }
 
+function cleanupRecording(fileName) {
+  const pcmPath = fileName.replace('.mp3', '.pcm');
+  for (const filePath of new Set([fileName, pcmPath])) {
+    try {
+      fs.unlinkSync(filePath);
+    } catch (cleanupError) {
+      // Silent fail on cleanup
+    }
+  }
+}
+
 async function sendAudioToAPI(fileName, userId, connection, channel) {
   // Check if bot is currently thinking
   if (currentlythinking) {
     logToConsole('> Bot is currently thinking, skipping this audio input...', 'info', 2);
     // Cleanup files
-    try {
-      fs.unlinkSync(fileName);
-      const pcmPath = fileName.replace('.mp3', '.pcm');
-      fs.unlinkSync(pcmPath);
-    } catch (cleanupError) {
-      // Silent fail on cleanup
-    }
+    cleanupRecording(fileName);
     restartListening(userId, connection, channel);
     return;
   }
 
+  const rawPcm = fileName.endsWith('.pcm');
   const formData = new FormData();
   formData.append('model', process.env.STT_MODEL);
+  if (rawPcm) {
+    for (const [name, value] of Object.entries(RECORDING_FORMAT)) {
+      formData.append(name, String(value));
+    }
+  }
   formData.append('file', fs.createReadStream(fileName));
 
   try {
-    const response = await axios.post(
-      process.env.STT_ENDPOINT + '/v1/audio/transcriptions',
-      formData,
-      { headers: { ...formData.getHeaders() } }
-    );
-    
-    let transcription = cleanTranscription(response.data.text);
-    
-    // Ignore background noise triggers
-    const ignoreTriggers = ['Thank you.', 'Bye.'];
-    if (ignoreTriggers.some(trigger => transcription.includes(trigger))) {
-      logToConsole('> Ignoring background/keyboard sounds.', 'info', 2);
+    if (rawPcm && STT_TRIGGER_SPOTTING && !allowwithouttrigger && !transcribemode && !(await mentionsTrigger(fileName, userId))) {
+      logToConsole(`> No trigger in audio from ${userId}, skipping transcription`, 'info', 2);
       restartListening(userId, connection, channel);
       return;
     }
 
-    logToConsole(`> Transcription for ${userId}: "${transcription}"`, 'info', 1);
-    
-    // Add to conversation buffer
-    const displayName = getDisplayName(userId, channel);
-    conversationBuffer.messages.push({
-      userId,
-      displayName,
-      transcription,
-      timestamp: Date.now(),
-    });
-    conversationBuffer.participants.add(userId);
-    conversationBuffer.lastActivity = Date.now();
-    
-    // Clear existing silence timer
-    if (conversationBuffer.silenceTimer) {
-      clearTimeout(conversationBuffer.silenceTimer);
-    }
-    
-    // Check if we should process immediately or wait for more messages
-    const shouldProcessNow = await shouldProcessConversationBuffer();
-    
-    if (shouldProcessNow) {
-      await processConversationBuffer(connection, channel);
-    } else {
-      // Set new silence timer
-      conversationBuffer.silenceTimer = setTimeout(() => {
-        processConversationBuffer(connection, channel);
-      }, CONVERSATION_CONFIG.groupSilenceDuration);
-    }
+    const response = await axios.post(
+      process.env.STT_ENDPOINT + (rawPcm ? '/v1/audio/transcriptions/pcm' : '/v1/audio/transcriptions'),
+      formData,
+      { headers: { ...formData.getHeaders() } }
+    );
     
-    // Restart listening for this user
-    restartListening(userId, connection, channel);
+    await handleTranscription(response.data.text, userId, connection, channel);
     
   } catch (error) {
     currentlythinking = false;
@@ -1308,14 +1385,138 @@ async function sendAudioToAPI(fileName, userId, connection, channel) {
     restartListening(userId, connection, channel);
   } finally {
     // Cleanup files
+    cleanupRecording(fileName);
+  }
+}
+
+// Cheap server-side check whether a raw PCM recording mentions one of the bot triggers
+async function mentionsTrigger(fileName, userId) {
+  try {
+    const response = await axios.post(
+      process.env.STT_ENDPOINT + '/v1/audio/triggers',
+      fs.readFileSync(fileName),
+      {
+        headers: {
+          'Content-Type': 'application/octet-stream',
+          'X-Sample-Rate': String(RECORDING_FORMAT.sample_rate),
+          'X-Channels': String(RECORDING_FORMAT.channels),
+          'X-Sample-Format': RECORDING_FORMAT.sample_format,
+          'X-Triggers': botnames.join(','),
+        },
+      }
+    );
+    logToConsole(`> Trigger check for ${userId}: ${response.data.trigger} (score ${response.data.score})`, 'info', 3);
+    return response.data.trigger;
+  } catch (error) {
+    // Transcribe fully rather than miss a trigger
+    logToConsole(`X Trigger check failed: ${error.message}`, 'error', 1);
+    return true;
+  }
+}
+
+// Push PCM to a WhisperServer streaming session while the user speaks, then finish it
+async function streamAudioToAPI(pcmStream, userId, connection, channel) {
+  const streamsUrl = process.env.STT_ENDPOINT + '/v1/audio/streams';
+  const formatHeaders = {
+    'X-Sample-Rate': String(RECORDING_FORMAT.sample_rate),
+    'X-Channels': String(RECORDING_FORMAT.channels),
+    'X-Sample-Format': RECORDING_FORMAT.sample_format,
+  };
+  const pcmHeaders = { 'Content-Type': 'application/octet-stream' };
+  let chunks = [];
+  let pushing = Promise.resolve();
+  let sessionId = null;
+
+  const takeChunks = () => {
+    const data = Buffer.concat(chunks);
+    chunks = [];
+    return data;
+  };
+
+  const opened = axios.post(streamsUrl, null, { headers: formatHeaders })
+    .then(response => { sessionId = response.data.session_id; });
+  opened.catch(() => {}); // Reported when the recording ends
+
+  pcmStream.on('data', chunk => chunks.push(chunk));
+  const pushTimer = setInterval(() => {
+    if (!sessionId || chunks.length === 0) return;
+    const data = takeChunks();
+    // Pushes are sent one after another so that the audio stays in order
+    pushing = pushing
+      .then(() => axios.post(`${streamsUrl}/${sessionId}`, data, { headers: pcmHeaders }))
+      .then(response => logToConsole(`> Partial for ${userId}: "${response.data.partial}"`, 'info', 3))
+      .catch(error => logToConsole(`X Failed to stream audio: ${error.message}`, 'error', 1));
+  }, STREAM_PUSH_INTERVAL);
+
+  pcmStream.on('end', async () => {
+    clearInterval(pushTimer);
+    logToConsole(`> Audio recorded for ${userId}`, 'info', 2);
     try {
-      fs.unlinkSync(fileName);
-      const pcmPath = fileName.replace('.mp3', '.pcm');
-      fs.unlinkSync(pcmPath);
-    } catch (cleanupError) {
-      // Silent fail on cleanup
+      await opened;
+      await pushing;
+
+      // Check if bot is currently thinking
+      if (currentlythinking) {
+        logToConsole('> Bot is currently thinking, skipping this audio input...', 'info', 2);
+        await axios.delete(`${streamsUrl}/${sessionId}`).catch(() => {});
+        restartListening(userId, connection, channel);
+        return;
+      }
+
+      const response = await axios.post(`${streamsUrl}/${sessionId}/finish`, takeChunks(), { headers: pcmHeaders });
+      await handleTranscription(response.data.text, userId, connection, channel);
+    } catch (error) {
+      currentlythinking = false;
+      logToConsole(`X Failed to transcribe audio: ${error.message}`, 'error', 1);
+      restartListening(userId, connection, channel);
     }
+  });
+}
+
+// Add a transcription to the conversation buffer and keep listening to the user
+async function handleTranscription(text, userId, connection, channel) {
+  let transcription = cleanTranscription(text);
+  
+  // Ignore background noise triggers (WhisperServer's VAD returns empty text for clips without speech)
+  const ignoreTriggers = ['Thank you.', 'Bye.'];
+  if (!transcription.trim() || ignoreTriggers.some(trigger => transcription.includes(trigger))) {
+    logToConsole('> Ignoring background/keyboard sounds.', 'info', 2);
+    restartListening(userId, connection, channel);
+    return;
+  }
+
+  logToConsole(`> Transcription for ${userId}: "${transcription}"`, 'info', 1);
+  
+  // Add to conversation buffer
+  const displayName = getDisplayName(userId, channel);
+  conversationBuffer.messages.push({
+    userId,
+    displayName,
+    transcription,
+    timestamp: Date.now(),
+  });
+  conversationBuffer.participants.add(userId);
+  conversationBuffer.lastActivity = Date.now();
+  
+  // Clear existing silence timer
+  if (conversationBuffer.silenceTimer) {
+    clearTimeout(conversationBuffer.silenceTimer);
   }
+  
+  // Check if we should process immediately or wait for more messages
+  const shouldProcessNow = await shouldProcessConversationBuffer();
+  
+  if (shouldProcessNow) {
+    await processConversationBuffer(connection, channel);
+  } else {
+    // Set new silence timer
+    conversationBuffer.silenceTimer = setTimeout(() => {
+      processConversationBuffer(connection, channel);
+    }, CONVERSATION_CONFIG.groupSilenceDuration);
+  }
+  
+  // Restart listening for this user
+  restartListening(userId, connection, channel);
 }
 
 function estimateTokenCount(text) {
@@ -1538,12 +1739,16 @@ async function sendToLLM(conversationText, primaryUserId, allParticipants, conne
           tool_calls: responseMessage.tool_calls
         });
         
-        for (const toolCall of responseMessage.tool_calls) {
+        // Several tool calls in one turn run concurrently on the tools server
+        const toolResults = responseMessage.tool_calls.length > 1
+          ? await executeToolBatch(responseMessage.tool_calls)
+          : [await executeTool(responseMessage.tool_calls[0].function.name, responseMessage.tool_calls[0].function.arguments)];
+        
+        for (const [index, toolCall] of responseMessage.tool_calls.entries()) {
           const toolName = toolCall.function.name;
-          const toolArgs = toolCall.function.arguments;
+          const toolResult = toolResults[index];
           
-          logToConsole(`> Calling tool: ${toolName}`, 'info', 1);
-          const toolResult = await executeTool(toolName, toolArgs);
+          logToConsole(`> Called tool: ${toolName}`, 'info', 1);
           
           messages.push({
             role: 'tool',
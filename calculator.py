@@ -0,0 +1,198 @@
+"""
+Safe expression engine for the calculate tool.
+
+Expressions are parsed to an AST once, checked against a whitelist of nodes,
+functions and constants, compiled, and kept in an LRU cache. Evaluation is bounded:
+exponents and intermediate results are limited in size and every evaluation has a
+time budget, so a runaway expression like 9**9**9 fails fast instead of pinning a
+server thread.
+"""
+
+import ast
+import math
+import operator
+import time
+from functools import lru_cache
+
+MAX_EXPRESSION_LENGTH = 500  # Characters
+MAX_EXPONENT = 10000  # Largest allowed integer exponent
+MAX_RESULT_DIGITS = 1000  # Largest allowed integer result, in decimal digits
+MAX_EVALUATION_TIME = 0.1  # Seconds per expression
+
+
+def _checked_round(number, ndigits=None):
+    # round(7, -10**7) computes 10**10**7 before returning, so the time budget can't stop it
+    if ndigits is not None and abs(ndigits) > MAX_RESULT_DIGITS:
+        raise ValueError(f"round() digits must be at most {MAX_RESULT_DIGITS}")
+    return round(number, ndigits)
+
+
+FUNCTIONS = {
+    'sin': math.sin,
+    'cos': math.cos,
+    'tan': math.tan,
+    'asin': math.asin,
+    'acos': math.acos,
+    'atan': math.atan,
+    'sqrt': math.sqrt,
+    'log': math.log10,
+    'ln': math.log,
+    'log2': math.log2,
+    'exp': math.exp,
+    'abs': abs,
+    'floor': math.floor,
+    'ceil': math.ceil,
+    'round': _checked_round,
+}
+
+CONSTANTS = {
+    'pi': math.pi,
+    'e': math.e,
+}
+
+BINARY_OPERATORS = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+    ast.FloorDiv: operator.floordiv,
+    ast.Mod: operator.mod,
+    ast.Pow: operator.pow,
+}
+
+UNARY_OPERATORS = (ast.UAdd, ast.USub)
+
+MAX_RESULT_BITS = int(MAX_RESULT_DIGITS * math.log2(10)) + 1
+
+
+class _Evaluation:
+    """Guards for a single evaluation. The compiled expression calls these for every
+    binary operation and function call."""
+
+    def __init__(self):
+        self.deadline = time.perf_counter() + MAX_EVALUATION_TIME
+
+    def check(self, value):
+        if time.perf_counter() > self.deadline:
+            raise ValueError(f"Evaluation took longer than {MAX_EVALUATION_TIME} seconds")
+        if isinstance(value, int) and value.bit_length() > MAX_RESULT_BITS:
+            raise ValueError(f"Result has more than {MAX_RESULT_DIGITS} digits")
+        if isinstance(value, float) and not math.isfinite(value):
+            raise ValueError("Result is too large")
+        if isinstance(value, complex):
+            raise ValueError("Result is not a real number")
+        return value
+
+    def binop(self, op, left, right):
+        if op is operator.pow:
+            if isinstance(right, int) and abs(right) > MAX_EXPONENT:
+                raise ValueError(f"Exponent {right} is larger than {MAX_EXPONENT}")
+            if isinstance(left, int) and isinstance(right, int) and right > 0 and left not in (-1, 0, 1):
+                # Estimate the result size before computing it
+                if right * math.log2(abs(left)) > MAX_RESULT_BITS:
+                    raise ValueError(f"Result has more than {MAX_RESULT_DIGITS} digits")
+        return self.check(op(left, right))
+
+    def call(self, function, *args):
+        return self.check(function(*args))
+
+
+class _Compiler(ast.NodeTransformer):
+    """Checks the AST against the whitelist and routes every operation through the guards"""
+
+    def visit_Expression(self, node):
+        node.body = self.visit(node.body)
+        return node
+
+    def visit_Constant(self, node):
+        if type(node.value) not in (int, float):
+            raise ValueError(f"Unsupported value: {node.value!r}")
+        return node
+
+    def visit_Name(self, node):
+        if node.id not in CONSTANTS:
+            raise ValueError(f"Unknown name: {node.id}")
+        return node
+
+    def visit_UnaryOp(self, node):
+        if not isinstance(node.op, UNARY_OPERATORS):
+            raise ValueError(f"Unsupported operator: {type(node.op).__name__}")
+        node.operand = self.visit(node.operand)
+        return node
+
+    def visit_BinOp(self, node):
+        op = BINARY_OPERATORS.get(type(node.op))
+        if op is None:
+            raise ValueError(f"Unsupported operator: {type(node.op).__name__}")
+        return ast.Call(
+            func=ast.Attribute(value=ast.Name(id='_evaluation', ctx=ast.Load()), attr='binop', ctx=ast.Load()),
+            args=[ast.Name(id=f'_op_{type(node.op).__name__}', ctx=ast.Load()), self.visit(node.left), self.visit(node.right)],
+            keywords=[],
+        )
+
+    def visit_Call(self, node):
+        if not isinstance(node.func, ast.Name) or node.func.id not in FUNCTIONS or node.keywords:
+            raise ValueError(f"Unsupported function call: {ast.unparse(node.func)}")
+        return ast.Call(
+            func=ast.Attribute(value=ast.Name(id='_evaluation', ctx=ast.Load()), attr='call', ctx=ast.Load()),
+            args=[ast.Name(id=node.func.id, ctx=ast.Load())] + [self.visit(arg) for arg in node.args],
+            keywords=[],
+        )
+
+    def generic_visit(self, node):
+        raise ValueError(f"Unsupported syntax: {type(node).__name__}")
+
+
+NAMESPACE = {
+    **FUNCTIONS,
+    **CONSTANTS,
+    **{f'_op_{node_type.__name__}': op for node_type, op in BINARY_OPERATORS.items()},
+    '__builtins__': {},
+}
+
+
+def normalize_expression(expression):
+    expression = expression.strip()
+    expression = expression.replace('^', '**')  # Power operator
+    expression = expression.replace('π', 'pi')
+    expression = expression.replace('√', 'sqrt')
+    expression = expression.replace('×', '*')
+    expression = expression.replace('÷', '/')
+    return expression
+
+
+@lru_cache(maxsize=512)
+def compile_expression(expression):
+    """Parse, check and compile a normalized expression (cached)"""
+    if len(expression) > MAX_EXPRESSION_LENGTH:
+        raise ValueError(f"Expression is longer than {MAX_EXPRESSION_LENGTH} characters")
+    try:
+        tree = ast.parse(expression, mode='eval')
+    except SyntaxError as e:
+        raise ValueError(f"Invalid syntax: {e.msg}")
+    tree = ast.fix_missing_locations(_Compiler().visit(tree))
+    return compile(tree, '<calculate>', 'eval')
+
+
+def safe_calculate(expression):
+    """Safely evaluate a mathematical expression"""
+    try:
+        code = compile_expression(normalize_expression(expression))
+        evaluation = _Evaluation()
+        return evaluation.check(eval(code, dict(NAMESPACE, _evaluation=evaluation)))
+    except (ValueError, ArithmeticError, TypeError) as e:
+        raise ValueError(f"Invalid mathematical expression: {str(e)}")
+
+
+def calculate_batch(expressions):
+    """
+    Evaluate several expressions in one call.
+    Returns a list of { "expression", "value" } or { "expression", "error" } in input order.
+    """
+    results = []
+    for expression in expressions:
+        try:
+            results.append({'expression': expression, 'value': safe_calculate(expression)})
+        except ValueError as e:
+            results.append({'expression': expression, 'error': str(e)})
+    return results
@@ -0,0 +1,337 @@
+"""
+Dice-notation engine for the roll_dice tool.
+
+Supported notation (terms joined with + and -):
+    NdS        N dice with S sides (d% is a d100, N defaults to 1)
+    NdS!       exploding dice: a die showing S is rolled again and added
+    NdSkhK     keep the highest K dice (also kK); klK keeps the lowest K
+    NdSdhK     drop the highest K dice; dlK (also dK) drops the lowest K
+    NdSadv     roll the group twice and keep the higher total (dis: the lower)
+    C          a constant modifier
+
+Rolling is vectorized with numpy, so large dice pools cost one call. Exact outcome
+distributions are built from per-group probability mass functions combined by
+convolution (FFT for large supports) rather than by simulation.
+"""
+
+import math
+import re
+from collections import namedtuple
+
+import numpy as np
+
+MAX_DICE = 10000  # Dice per group
+MAX_SIDES = 10000
+MAX_TERMS = 20
+MAX_EXPLOSIONS = 50  # Re-rolls per exploding die
+MAX_DISTRIBUTION_SIZE = 1_000_000  # Outcomes in an exact distribution
+MAX_KEEP_DISTRIBUTION_WORK = 50_000_000  # Array updates for all exact keep/drop distributions in an expression
+MAX_LISTED_ROLLS = 50  # Individual dice shown per group in the result text
+MAX_REPORTED_OUTCOMES = 500  # Outcomes listed in a distribution response
+
+DiceGroup = namedtuple('DiceGroup', ['text', 'sign', 'count', 'sides', 'explode', 'keep', 'keep_count', 'advantage'])
+Distribution = namedtuple('Distribution', ['offset', 'pmf'])  # P(total = offset + i) = pmf[i]
+
+TERM_REGEX = re.compile(
+    r"(?P<sign>[+-])?(?:"
+    r"(?P<count>\d*)d(?P<sides>\d+|%)(?P<explode>!)?"
+    r"(?:(?P<keep>kh|kl|dh|dl|k|d)(?P<keep_count>\d+))?"
+    r"(?P<advantage>adv|dis)?"
+    r"|(?P<constant>\d+))"
+)
+
+
+def normalize_dice_expression(expression):
+    expression = expression.lower()
+    expression = re.sub(r"(with\s+)?disadvantage", "dis", expression)
+    expression = re.sub(r"(with\s+)?advantage", "adv", expression)
+    # Spaces are allowed around operators and before adv/dis, nowhere else
+    expression = re.sub(r"\s*([+-])\s*", r"\1", expression.strip())
+    return re.sub(r"\s+(adv|dis)\b", r"\1", expression)
+
+
+def parse_dice_expression(expression):
+    """Parse an expression into (dice groups, constant modifier). Raises ValueError."""
+    text = normalize_dice_expression(expression)
+    if not text:
+        raise ValueError("Empty dice expression")
+    groups, modifier, position, terms = [], 0, 0, 0
+    while position < len(text):
+        match = TERM_REGEX.match(text, position)
+        if not match or (terms and not match.group('sign')):
+            raise ValueError(f"Invalid dice expression near '{text[position:]}'. Use notation like '2d6+3' or '4d6kh3'")
+        position = match.end()
+        terms += 1
+        if terms > MAX_TERMS:
+            raise ValueError(f"Maximum {MAX_TERMS} terms allowed per expression")
+        sign = -1 if match.group('sign') == '-' else 1
+        if match.group('constant') is not None:
+            modifier += sign * int(match.group('constant'))
+            continue
+
+        count = int(match.group('count') or 1)
+        sides = 100 if match.group('sides') == '%' else int(match.group('sides'))
+        if count <= 0 or sides <= 0:
+            raise ValueError("The number of dice and sides must be greater than zero.")
+        if count > MAX_DICE:
+            raise ValueError(f"Maximum {MAX_DICE} dice allowed per group.")
+        if sides > MAX_SIDES:
+            raise ValueError(f"Maximum {MAX_SIDES} sides allowed per die.")
+        explode = bool(match.group('explode'))
+        if explode and sides == 1:
+            raise ValueError("A one-sided die cannot explode.")
+
+        # Normalize keep/drop to keeping the highest or lowest dice
+        keep, keep_count = None, count
+        if match.group('keep'):
+            n = int(match.group('keep_count'))
+            keep = 'highest' if match.group('keep') in ('kh', 'k', 'dl', 'd') else 'lowest'
+            keep_count = n if match.group('keep') in ('kh', 'k', 'kl') else count - n
+            if keep_count <= 0:
+                raise ValueError(f"'{match.group(0).lstrip('+-')}' keeps no dice.")
+            if keep_count >= count:
+                keep, keep_count = None, count
+
+        groups.append(DiceGroup(
+            match.group(0).lstrip('+-'), sign, count, sides, explode, keep, keep_count, match.group('advantage')
+        ))
+    return groups, modifier
+
+
+# ============= ROLLING =============
+def _roll_dice(group, rng):
+    """Roll one set of dice for a group. Returns (per-die values, kept mask)."""
+    values = rng.integers(1, group.sides + 1, size=group.count)
+    if group.explode:
+        exploding = np.flatnonzero(values == group.sides)
+        for _ in range(MAX_EXPLOSIONS):
+            if not exploding.size:
+                break
+            extra = rng.integers(1, group.sides + 1, size=exploding.size)
+            values[exploding] += extra
+            exploding = exploding[extra == group.sides]
+    kept = np.ones(group.count, dtype=bool)
+    if group.keep:
+        order = np.argsort(-values if group.keep == 'highest' else values, kind='stable')
+        kept[order[group.keep_count:]] = False
+    return values, kept
+
+
+def _format_rolls(values, kept):
+    if values.size > MAX_LISTED_ROLLS:
+        return f"[{values.size} dice]"
+    return '[' + ', '.join(str(v) if k else f"~~{v}~~" for v, k in zip(values.tolist(), kept.tolist())) + ']'
+
+
+def roll_group(group, rng):
+    """Roll a group, applying advantage. Returns (signed total, description)."""
+    values, kept = _roll_dice(group, rng)
+    total = int(values[kept].sum())
+    description = _format_rolls(values, kept)
+    if group.advantage:
+        other_values, other_kept = _roll_dice(group, rng)
+        other_total = int(other_values[other_kept].sum())
+        if (other_total > total) == (group.advantage == 'adv') and other_total != total:
+            total = other_total
+            description = f"{_format_rolls(other_values, other_kept)} over {description}"
+        else:
+            description = f"{description} over {_format_rolls(other_values, other_kept)}"
+    return group.sign * total, description
+
+
+def roll_dice(expression, rng=None):
+    """
+    Roll a dice expression.
+    Returns { "total", "rolls": [{ "dice", "total", "rolls" (text) }], "modifier", "result" (text) }.
+    """
+    rng = rng or np.random.default_rng()
+    groups, modifier = parse_dice_expression(expression)
+    rolls = []
+    text = ''
+    for group in groups:
+        total, description = roll_group(group, rng)
+        rolls.append({'dice': group.text, 'total': total, 'rolls': description})
+        text += f"{' - ' if group.sign < 0 else ' + ' if text else ''}{group.text} {description}"
+    if modifier:
+        text += f" {'-' if modifier < 0 else '+'} {abs(modifier)}"
+    total = sum(r['total'] for r in rolls) + modifier
+
+    return {
+        'total': total,
+        'rolls': rolls,
+        'modifier': modifier,
+        'result': f"Rolling {expression}: {text.lstrip(' +')}. Total: {total}",
+    }
+
+
+# ============= EXACT DISTRIBUTIONS =============
+def _check_size(size):
+    if size > MAX_DISTRIBUTION_SIZE:
+        raise ValueError(f"Distribution has more than {MAX_DISTRIBUTION_SIZE} possible outcomes")
+
+
+def _fft_length(size):
+    return 1 << max(size - 1, 1).bit_length()
+
+
+def convolve(a, b):
+    """Distribution of the sum of two independent totals"""
+    size = len(a.pmf) + len(b.pmf) - 1
+    _check_size(size)
+    if len(a.pmf) * len(b.pmf) <= 100_000:
+        pmf = np.convolve(a.pmf, b.pmf)
+    else:
+        n = _fft_length(size)
+        pmf = np.fft.irfft(np.fft.rfft(a.pmf, n) * np.fft.rfft(b.pmf, n), n)[:size]
+    return Distribution(a.offset + b.offset, np.clip(pmf, 0, None))
+
+
+def power(distribution, count):
+    """Distribution of the sum of count independent copies"""
+    size = count * (len(distribution.pmf) - 1) + 1
+    _check_size(size)
+    if count == 1:
+        return distribution
+    n = _fft_length(size)
+    pmf = np.fft.irfft(np.fft.rfft(distribution.pmf, n) ** count, n)[:size]
+    pmf = np.clip(pmf, 0, None)
+    return Distribution(distribution.offset * count, pmf / pmf.sum())
+
+
+def die_distribution(sides, explode=False):
+    if not explode:
+        return Distribution(1, np.full(sides, 1 / sides))
+    # Explosions past this depth have a combined probability below 1e-12
+    depth = min(MAX_EXPLOSIONS, math.ceil(12 / math.log10(sides)))
+    _check_size(sides * (depth + 1))
+    pmf = np.zeros(sides * (depth + 1))
+    for level in range(depth + 1):
+        # level explosions, then a face that does not explode (any face on the last level)
+        faces = sides if level == depth else sides - 1
+        start = level * sides
+        pmf[start:start + faces] = sides ** -(level + 1)
+    return Distribution(1, pmf)
+
+
+def keep_distribution_work(group):
+    """Array updates keep_highest_distribution needs for a keep/drop group (0 otherwise)"""
+    if not group.keep:
+        return 0
+    return group.sides * (group.count + 1) * (group.count + 2) // 2 * (group.keep_count * group.sides + 1)
+
+
+def binomial_pmf(n, p):
+    """P(j successes in n trials) for j = 0..n, computed in log space so large n cannot overflow"""
+    if p == 1:
+        pmf = np.zeros(n + 1)
+        pmf[n] = 1.0
+        return pmf
+    j = np.arange(n + 1)
+    log_comb = np.concatenate(([0.0], np.cumsum(np.log(np.arange(n, 0, -1) / np.arange(1, n + 1)))))
+    return np.exp(log_comb + j * math.log(p) + (n - j) * math.log1p(-p))
+
+
+def keep_highest_distribution(count, sides, keep_count):
+    """
+    Exact distribution of the sum of the keep_count highest of count dice.
+    Faces are processed from high to low; given that the remaining dice all show at
+    most v, the number showing exactly v is binomial with p = 1/v.
+    """
+    max_sum = keep_count * sides
+    state = np.zeros((count + 1, max_sum + 1))  # [dice assigned, kept sum]
+    state[0, 0] = 1.0
+    for v in range(sides, 0, -1):
+        p = 1 / v
+        next_state = np.zeros_like(state)
+        for assigned in range(count + 1):
+            row = state[assigned]
+            if not row.any():
+                continue
+            remaining = count - assigned
+            room = max(keep_count - assigned, 0)
+            probabilities = binomial_pmf(remaining, p)
+            # Below room every extra v is kept, so each j shifts the row differently
+            for k in range(min(room, remaining + 1)):
+                shift = k * v
+                next_state[assigned + k, shift:] += probabilities[k] * row[:max_sum + 1 - shift]
+            # From room on the kept sum grows by room * v whatever j is: one outer product
+            if room <= remaining:
+                shift = room * v
+                next_state[assigned + room:, shift:] += np.outer(probabilities[room:], row[:max_sum + 1 - shift])
+        state = next_state
+    pmf = state[count]
+    return Distribution(0, pmf)
+
+
+def group_distribution(group):
+    if group.keep and group.explode:
+        raise ValueError("Exact distributions are not supported for exploding dice with keep/drop")
+    if group.keep == 'highest':
+        distribution = keep_highest_distribution(group.count, group.sides, group.keep_count)
+    elif group.keep == 'lowest':
+        # The lowest dice of d(sides) are the highest dice of the mirrored faces sides + 1 - v
+        highest = keep_highest_distribution(group.count, group.sides, group.keep_count)
+        distribution = Distribution(
+            group.keep_count * (group.sides + 1) - (highest.offset + len(highest.pmf) - 1),
+            highest.pmf[::-1],
+        )
+    else:
+        distribution = power(die_distribution(group.sides, group.explode), group.count)
+
+    if group.advantage:
+        cdf = np.clip(np.cumsum(distribution.pmf), 0, 1)
+        if group.advantage == 'adv':
+            cdf = cdf ** 2
+        else:
+            cdf = 1 - (1 - cdf) ** 2
+        distribution = Distribution(distribution.offset, np.diff(cdf, prepend=0.0))
+
+    if group.sign < 0:
+        distribution = Distribution(-(distribution.offset + len(distribution.pmf) - 1), distribution.pmf[::-1])
+    return distribution
+
+
+def dice_distribution(expression):
+    """
+    Exact distribution of the total of a dice expression. Outcomes with a probability
+    below 1e-15 (FFT noise, extreme sums of large pools) are trimmed from both ends.
+    """
+    groups, modifier = parse_dice_expression(expression)
+    if sum(keep_distribution_work(group) for group in groups) > MAX_KEEP_DISTRIBUTION_WORK:
+        raise ValueError("Too many dice for an exact keep/drop distribution")
+    total = Distribution(modifier, np.ones(1))
+    for group in groups:
+        total = convolve(total, group_distribution(group))
+    # Trim impossible outcomes at both ends
+    nonzero = np.flatnonzero(total.pmf > 1e-15)
+    pmf = total.pmf[nonzero[0]:nonzero[-1] + 1]
+    return Distribution(total.offset + int(nonzero[0]), pmf / pmf.sum())
+
+
+def describe_distribution(expression, at_least=None, at_most=None):
+    """
+    Summarize the exact distribution of a dice expression.
+    Returns { "mean", "std", "min", "max", optional "p_at_least" / "p_at_most",
+    "probabilities" (when small enough), "result" (text) }.
+    """
+    distribution = dice_distribution(expression)
+    outcomes = distribution.offset + np.arange(len(distribution.pmf))
+    mean = float(np.dot(outcomes, distribution.pmf))
+    std = float(math.sqrt(max(np.dot((outcomes - mean) ** 2, distribution.pmf), 0.0)))
+    summary = {
+        'mean': mean,
+        'std': std,
+        'min': int(outcomes[0]),
+        'max': int(outcomes[-1]),
+    }
+    text = f"{expression}: mean {mean:.2f}, standard deviation {std:.2f}, range {summary['min']} to {summary['max']}"
+    if at_least is not None:
+        summary['p_at_least'] = float(distribution.pmf[outcomes >= at_least].sum())
+        text += f". Chance of {at_least} or more: {summary['p_at_least']:.2%}"
+    if at_most is not None:
+        summary['p_at_most'] = float(distribution.pmf[outcomes <= at_most].sum())
+        text += f". Chance of {at_most} or less: {summary['p_at_most']:.2%}"
+    if len(outcomes) <= MAX_REPORTED_OUTCOMES:
+        summary['probabilities'] = {int(o): float(p) for o, p in zip(outcomes, distribution.pmf)}
+    summary['result'] = text
+    return summary
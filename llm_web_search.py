@@ -42,13 +42,18 @@ import warnings
 import copy
 import math
 from abc import abstractmethod
-from collections import defaultdict
+from collections import defaultdict, OrderedDict
 from itertools import chain
 import asyncio
 import concurrent.futures
+import contextvars
+from contextlib import contextmanager
 import logging
 import html
+import json
 import os
+import threading
+import time
 from pydantic import BaseModel, Field
 import aiohttp
 import numpy as np
@@ -61,12 +66,19 @@ import torch
 from torch import Tensor
 from sentence_transformers import SentenceTransformer, quantize_embeddings
 from sentence_transformers.util import batch_to_device, truncate_embeddings
+import transformers
 from transformers import (
+    AutoConfig,
     AutoTokenizer,
     AutoModelForMaskedLM,
     AutoModelForTokenClassification,
 )
 
+try:
+    from transformers.modeling_utils import no_init_weights
+except ImportError:
+    from contextlib import nullcontext as no_init_weights
+
 try:
     from ddgs import DDGS
     from ddgs.utils import json_loads
@@ -87,6 +99,36 @@ except ImportError:
 
 logger = logging.getLogger(__name__)
 
+# Rough token estimate used for result budgets, avoids loading the LLM's tokenizer
+CHARS_PER_TOKEN = 4
+
+# Search operators that restrict a query to a specific website
+search_operators_regex = re.compile(r"\b(?:domain|url|site):\S+")
+
+# Optional recorder for per-stage timings and counters. A host application sets an
+# object with observe(stage, seconds) and count(name, value) methods for the current
+# context; without one, the hooks below do nothing.
+metrics_recorder = contextvars.ContextVar("metrics_recorder", default=None)
+
+
+@contextmanager
+def timed_stage(stage: str):
+    recorder = metrics_recorder.get()
+    if recorder is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        recorder.observe(stage, time.perf_counter() - start)
+
+
+def count_metric(name: str, value: float = 1):
+    recorder = metrics_recorder.get()
+    if recorder is not None:
+        recorder.count(name, value)
+
 
 class AsyncDDGS(DDGS):
     def __init__(
@@ -236,6 +278,23 @@ async def emit_message(event_emitter, content: str):
         )
 
 
+async def emit_search_results(event_emitter, query: str, documents: List["Document"]):
+    """Emit the search engine's result snippets as soon as they arrive, before any page is processed"""
+    if event_emitter:
+        await event_emitter(
+            {
+                "type": "search_results",
+                "data": {
+                    "query": query,
+                    "documents": [
+                        {"content": doc.page_content, "source": doc.metadata["source"]}
+                        for doc in documents
+                    ],
+                },
+            }
+        )
+
+
 class Tools:
     class Valves(BaseModel):
         embedding_model_save_path: str = Field(
@@ -294,6 +353,13 @@ class Tools:
             description="Keyword retriever. Must be either 'bm25' or 'splade'.",
             pattern=r"^(bm25|splade)$",
         )
+        cascade_candidates: int = Field(
+            default=0,
+            description="Cascade retrieval. Number of candidate chunks that a fast BM25 pass keeps "
+            "before dense embedding and SPLADE inference. Smaller values = Faster retrieval "
+            "(but lower recall), 0 = Disabled.",
+            ge=0,
+        )
         splade_batch_size: int = Field(
             default=8,
             description="SPLADE batch size. Smaller values = Slower retrieval (but lower VRAM usage), "
@@ -322,6 +388,13 @@ class Tools:
             ge=0.0,
             le=1.0,
         )
+        max_result_tokens: int = Field(
+            default=0,
+            description="Max. size of the returned search results, in tokens "
+            f"(estimated at {CHARS_PER_TOKEN} characters per token). When exceeded, the lowest-ranked "
+            "results are dropped first. 0 = No limit",
+            ge=0,
+        )
         client_timeout: int = Field(
             default=10,
             description="Client timeout (in seconds)."
@@ -330,6 +403,45 @@ class Tools:
             ge=0,
             le=1000,
         )
+        query_cache_size: int = Field(
+            default=0,
+            description="Max. number of recent search results to cache. "
+            "Rephrased queries that are similar enough to a cached one are answered from the cache. "
+            "0 = Disabled",
+            ge=0,
+        )
+        query_cache_ttl: int = Field(
+            default=300,
+            description="Time (in seconds) for which cached search results are re-used",
+            ge=1,
+        )
+        query_cache_similarity_threshold: float = Field(
+            default=0.9,
+            description="Min. cosine similarity between a query and a cached query "
+            "for the cached results to be re-used",
+            ge=0.0,
+            le=1.0,
+        )
+        local_index_max_age: int = Field(
+            default=0,
+            description="Time (in seconds) for which retrieved webpage chunks are kept in a local index. "
+            "Follow-up queries are answered from the local index first and only search the web "
+            "if it does not contain anything relevant enough. 0 = Disabled",
+            ge=0,
+        )
+        local_index_max_mb: int = Field(
+            default=64,
+            description="Max. memory used by the local index (in MB). "
+            "When exceeded, the least recently retrieved webpages are evicted first.",
+            ge=1,
+        )
+        local_index_confidence_threshold: float = Field(
+            default=0.6,
+            description="Min. similarity between a query and the best chunk in the local index "
+            "for the query to be answered without searching the web",
+            ge=0.0,
+            le=1.0,
+        )
         searxng_url: str = Field(
             default="None",
             description='SearXNG server URL. If not equal to "None", '
@@ -339,6 +451,8 @@ class Tools:
     def __init__(self):
         self.valves = self.Valves()
         self.document_retriever = DocumentRetriever()
+        self.query_cache = SemanticQueryCache()
+        self.models_lock = asyncio.Lock()
 
     @staticmethod
     def reuse_existing_web_search_results(__user__: dict, __event_emitter__=None):
@@ -355,7 +469,13 @@ class Tools:
         return ""
 
     async def search_webpage(
-        self, query: str, webpage: str, __user__: dict, __event_emitter__=None
+        self,
+        query: str,
+        webpage: str,
+        __user__: dict,
+        __event_emitter__=None,
+        __max_chars__: int = 0,
+        __snippets_callback__=None,
     ) -> str:
         """
         Search a specific webpage for the provided query. Provide the whole URL if possible, otherwise provide
@@ -370,17 +490,29 @@ class Tools:
             else:  # ddgs: v9.0.0 limits search engine to bing only, change this once ddgs version changes
                 new_query = f"site:{webpage} {query}"
 
-        return await self.search_web(new_query, __user__, __event_emitter__)
+        return await self.search_web(
+            new_query,
+            __user__,
+            __event_emitter__,
+            __max_chars__,
+            __snippets_callback__,
+        )
 
     async def search_web(
-        self, query: str, __user__: dict, __event_emitter__=None
+        self,
+        query: str,
+        __user__: dict,
+        __event_emitter__=None,
+        __max_chars__: int = 0,
+        __snippets_callback__=None,
     ) -> str:
         """
         The search tool will search the web and return the results. You must formulate your own search query based on the user's message.
         """
-        self.document_retriever.update_settings(self.valves)
+        # Snapshot the settings, so that concurrent searches don't interfere with each other
+        settings = self.valves.model_copy(deep=True)
 
-        if self.valves.embedding_model_save_path == "":
+        if settings.embedding_model_save_path == "":
             await emit_status(
                 __event_emitter__,
                 "Error: Please configure the embedding model save path",
@@ -396,29 +528,92 @@ class Tools:
             return error_message
 
         try:
-            if (
-                self.document_retriever.splade_doc_model is None
-                or self.document_retriever.splade_query_model is None
-                or self.document_retriever.embedding_model is None
-            ):
-                await self.document_retriever.aload_models(__event_emitter__)
+            with timed_stage("load_models"):
+                async with self.models_lock:
+                    if (
+                        self.document_retriever.splade_doc_model is None
+                        or self.document_retriever.splade_query_model is None
+                        or self.document_retriever.embedding_model is None
+                    ):
+                        self.document_retriever.update_settings(settings)
+                        await self.document_retriever.aload_models(__event_emitter__)
 
-            if (
-                self.valves.chunker == "neural"
-                and self.document_retriever.token_classification_chunker is None
-            ):
-                await self.document_retriever.aload_token_classification_chunker(
-                    __event_emitter__
-                )
+                    if (
+                        settings.chunker == "neural"
+                        and self.document_retriever.token_classification_chunker is None
+                    ):
+                        self.document_retriever.update_settings(settings)
+                        await self.document_retriever.aload_token_classification_chunker(
+                            __event_emitter__
+                        )
+            document_retriever = self.document_retriever.with_settings(settings)
 
-            if self.valves.searxng_url != "None":
-                result_docs = await self.document_retriever.aretrieve_from_searxng(
-                    query, self.valves.simple_search, __event_emitter__
-                )
-            else:
-                result_docs = await self.document_retriever.aretrieve_from_duckduckgo(
-                    query, self.valves.simple_search, __event_emitter__
-                )
+            max_chars = __max_chars__ or (
+                settings.max_result_tokens * CHARS_PER_TOKEN
+            )
+            query_embedding = None
+            if settings.query_cache_size > 0:
+                with timed_stage("query_cache"):
+                    query_embedding = await asyncio.to_thread(
+                        document_retriever.embedding_model.encode, query
+                    )
+                    cache_hit = self.query_cache.get(
+                        query,
+                        query_embedding,
+                        max_chars,
+                        settings.query_cache_ttl,
+                        settings.query_cache_similarity_threshold,
+                    )
+                count_metric("query_cache_misses" if cache_hit is None else "query_cache_hits")
+                if cache_hit is not None:
+                    cached_query, pretty_docs_string, similarity = cache_hit
+                    await emit_status(
+                        __event_emitter__,
+                        f'Re-using cached results for "{cached_query}" (similarity: {similarity:.2f})',
+                        True,
+                    )
+                    if settings.keep_results_in_context:
+                        escaped_docs_string = katex_escape_str(pretty_docs_string)
+                        await emit_message(
+                            __event_emitter__, f"\\[ % {escaped_docs_string}\n \\] "
+                        )
+                    return pretty_docs_string
+
+            snippets_callback = None
+            if __snippets_callback__ is not None:
+
+                async def snippets_callback(snippet_docs: List[Document]):
+                    await __snippets_callback__(
+                        pack_docs_to_str(snippet_docs, max_chars)
+                    )
+
+            result_docs = []
+            if not settings.simple_search:
+                with timed_stage("local_index"):
+                    result_docs = await document_retriever.aretrieve_from_index(
+                        query, __event_emitter__
+                    )
+                if result_docs:
+                    count_metric("local_index_hits")
+            if not result_docs:
+                if settings.searxng_url != "None":
+                    result_docs = (
+                        await document_retriever.aretrieve_from_searxng(
+                            query,
+                            settings.simple_search,
+                            __event_emitter__,
+                            snippets_callback,
+                        )
+                    )
+                else:
+                    result_docs = (
+                        await document_retriever.aretrieve_from_duckduckgo(
+                            query,
+                            settings.simple_search,
+                            __event_emitter__,
+                            snippets_callback,
+                        )
+                    )
             if not result_docs:
                 await __event_emitter__(
                     {
@@ -449,7 +644,7 @@ class Tools:
                     }
                 )
 
-            if self.valves.include_citations and __event_emitter__:
+            if settings.include_citations and __event_emitter__:
                 for result_doc in result_docs:
                     source = result_doc.metadata["source"]
                     if source != "SearXNG instant answer":
@@ -465,8 +660,17 @@ class Tools:
                         }
                     )
 
-            pretty_docs_string = docs_to_pretty_str(result_docs)
-            if self.valves.keep_results_in_context:
+            with timed_stage("packing"):
+                pretty_docs_string = pack_docs_to_str(result_docs, max_chars)
+            if query_embedding is not None:
+                self.query_cache.put(
+                    query,
+                    query_embedding,
+                    max_chars,
+                    pretty_docs_string,
+                    settings.query_cache_size,
+                )
+            if settings.keep_results_in_context:
                 escaped_docs_string = katex_escape_str(pretty_docs_string)
                 await emit_message(
                     __event_emitter__, f"\\[ % {escaped_docs_string}\n \\] "
@@ -482,6 +686,73 @@ class Tools:
             return f"The search tool encountered an error: {exception_message}"
 
 
+class SemanticQueryCache:
+    """
+    Bounded LRU cache of final search results, looked up by query embedding.
+    A query hits the cache if it is similar enough to a cached query, has the same
+    search operators (e.g. 'domain:', 'url:', 'site:') and result budget, and the
+    cached entry is not older than the TTL. The TTL, similarity threshold and size
+    limit are passed per call, so that searches with different settings can share
+    one cache.
+    """
+
+    def __init__(self):
+        # query -> (scope, query embedding, timestamp, result)
+        self.entries: OrderedDict[str, Tuple[tuple, np.ndarray, float, str]] = (
+            OrderedDict()
+        )
+        self.lock = threading.Lock()
+
+    def _scope(self, query: str, max_chars: int) -> tuple:
+        return tuple(sorted(search_operators_regex.findall(query))), max_chars
+
+    def get(
+        self,
+        query: str,
+        query_embedding: np.ndarray,
+        max_chars: int,
+        ttl: int,
+        threshold: float,
+    ) -> Optional[Tuple[str, str, float]]:
+        """Return (cached query, cached result, similarity) of the most similar entry, or None."""
+        scope = self._scope(query, max_chars)
+        now = time.monotonic()
+        with self.lock:
+            for key in [k for k, v in self.entries.items() if now - v[2] > ttl]:
+                del self.entries[key]
+            candidates = [k for k, v in self.entries.items() if v[0] == scope]
+            if not candidates:
+                return None
+            similarity = cosine_similarity(
+                [query_embedding], [self.entries[k][1] for k in candidates]
+            )[0]
+            best = int(np.argmax(similarity))
+            if similarity[best] < threshold:
+                return None
+            cached_query = candidates[best]
+            self.entries.move_to_end(cached_query)
+            return cached_query, self.entries[cached_query][3], float(similarity[best])
+
+    def put(
+        self,
+        query: str,
+        query_embedding: np.ndarray,
+        max_chars: int,
+        result: str,
+        max_entries: int,
+    ):
+        with self.lock:
+            self.entries[query] = (
+                self._scope(query, max_chars),
+                query_embedding,
+                time.monotonic(),
+                result,
+            )
+            self.entries.move_to_end(query)
+            while len(self.entries) > max_entries:
+                self.entries.popitem(last=False)
+
+
 def katex_escape_str(string: str) -> str:
     return (
         string.replace("\n", "\\n")
@@ -491,10 +762,134 @@ def katex_escape_str(string: str) -> str:
     )
 
 
-def load_splade_model(repo_id: str, cache_dir: str, device: str):
+EMBEDDING_MODEL_ID = "all-MiniLM-L6-v2"
+SPLADE_DOC_MODEL_ID = "naver/efficient-splade-VI-BT-large-doc"
+SPLADE_QUERY_MODEL_ID = "naver/efficient-splade-VI-BT-large-query"
+
+# Model snapshots are ready-to-run copies of the models in the dtype used on the target
+# device, written once by compile_model_snapshots() to <models dir>/snapshots. SPLADE
+# weights are stored as a plain state dict that is memory-mapped on load, so loading
+# needs no network access, no deserialization copy and no dtype conversion, and
+# processes that load the same snapshot share its weight pages.
+SNAPSHOT_DIR_NAME = "snapshots"
+SNAPSHOT_MANIFEST = "snapshot.json"
+SNAPSHOT_WEIGHTS = "weights.pt"
+
+
+def model_dtype(device: str) -> torch.dtype:
+    return torch.float32 if device == "cpu" else torch.float16
+
+
+def snapshot_path(cache_dir: str, repo_id: str, device: str) -> str:
+    dtype_name = str(model_dtype(device)).replace("torch.", "")
+    return os.path.join(
+        cache_dir, SNAPSHOT_DIR_NAME, repo_id.replace("/", "--"), dtype_name
+    )
+
+
+def has_snapshot(path: str) -> bool:
+    # The manifest is written last, so a partially written snapshot is ignored
+    return os.path.isfile(os.path.join(path, SNAPSHOT_MANIFEST))
+
+
+def write_snapshot_manifest(path: str, repo_id: str, device: str):
+    manifest = {
+        "repo_id": repo_id,
+        "dtype": str(model_dtype(device)),
+        "torch": torch.__version__,
+        "transformers": transformers.__version__,
+        "created": time.time(),
+    }
+    with open(os.path.join(path, SNAPSHOT_MANIFEST), "w") as f:
+        json.dump(manifest, f, indent=2)
+
+
+def save_splade_snapshot(tokenizer, model, path: str, repo_id: str, device: str):
+    os.makedirs(path, exist_ok=True)
+    tokenizer.save_pretrained(path)
+    model.config.save_pretrained(path)
+    dtype = model_dtype(device)
+    state_dict = {
+        name: tensor.to("cpu", dtype) if tensor.is_floating_point() else tensor.cpu()
+        for name, tensor in model.state_dict().items()
+    }
+    weights_path = os.path.join(path, SNAPSHOT_WEIGHTS)
+    torch.save(state_dict, weights_path + ".tmp")
+    os.replace(weights_path + ".tmp", weights_path)
+    write_snapshot_manifest(path, repo_id, device)
+
+
+def load_splade_snapshot(path: str, device: str):
+    config = AutoConfig.from_pretrained(path)
+    with no_init_weights():
+        model = AutoModelForMaskedLM.from_config(
+            config, torch_dtype=model_dtype(device), attn_implementation="eager"
+        )
+    state_dict = torch.load(
+        os.path.join(path, SNAPSHOT_WEIGHTS), mmap=True, weights_only=True
+    )
+    # assign=True keeps the memory-mapped tensors instead of copying them into the parameters
+    model.load_state_dict(state_dict, assign=True)
+    model.tie_weights()
+    model.eval()
+    return AutoTokenizer.from_pretrained(path), model
+
+
+def save_embedding_snapshot(model, path: str, repo_id: str, device: str):
+    os.makedirs(path, exist_ok=True)
+    # Sentence-transformers directory layout; the weights are saved as safetensors in the
+    # model's dtype, which are memory-mapped on load as well
+    model.save(path)
+    write_snapshot_manifest(path, repo_id, device)
+
+
+def load_embedding_snapshot(path: str, device: str):
+    return MySentenceTransformer(
+        path,
+        device=device,
+        local_files_only=True,
+        model_kwargs={"torch_dtype": model_dtype(device)},
+    )
+
+
+def compile_model_snapshots(
+    cache_dir: str, device: str, overwrite: bool = False
+) -> List[str]:
+    """
+    Write snapshots of the embedding and SPLADE models for 'device' into cache_dir,
+    downloading the models first if necessary. Returns the paths of the written snapshots.
+    """
+    written = []
+    path = snapshot_path(cache_dir, EMBEDDING_MODEL_ID, device)
+    if overwrite or not has_snapshot(path):
+        model = load_embedding_model(
+            EMBEDDING_MODEL_ID, cache_dir, device, use_snapshot=False
+        )
+        save_embedding_snapshot(model, path, EMBEDDING_MODEL_ID, device)
+        written.append(path)
+    for repo_id in (SPLADE_DOC_MODEL_ID, SPLADE_QUERY_MODEL_ID):
+        path = snapshot_path(cache_dir, repo_id, device)
+        if overwrite or not has_snapshot(path):
+            tokenizer, model = load_splade_model(
+                repo_id, cache_dir, device, use_snapshot=False
+            )
+            save_splade_snapshot(tokenizer, model, path, repo_id, device)
+            written.append(path)
+    return written
+
+
+def load_splade_model(
+    repo_id: str, cache_dir: str, device: str, use_snapshot: bool = True
+):
+    snapshot = snapshot_path(cache_dir, repo_id, device)
+    if use_snapshot and has_snapshot(snapshot):
+        try:
+            return load_splade_snapshot(snapshot, device)
+        except Exception as exc:
+            logger.warning(f"Could not load snapshot {snapshot}, loading {repo_id} instead: {exc}")
     kwargs = {
         "cache_dir": cache_dir,
-        "torch_dtype": torch.float32 if device == "cpu" else torch.float16,
+        "torch_dtype": model_dtype(device),
         "attn_implementation": "eager",
     }
     try:
@@ -509,14 +904,20 @@ def load_splade_model(repo_id: str, cache_dir: str, device: str):
         ), AutoModelForMaskedLM.from_pretrained(repo_id, **kwargs)
 
 
-def load_embedding_model(repo_id: str, cache_dir: str, device: str):
+def load_embedding_model(
+    repo_id: str, cache_dir: str, device: str, use_snapshot: bool = True
+):
+    snapshot = snapshot_path(cache_dir, repo_id, device)
+    if use_snapshot and has_snapshot(snapshot):
+        try:
+            return load_embedding_snapshot(snapshot, device)
+        except Exception as exc:
+            logger.warning(f"Could not load snapshot {snapshot}, loading {repo_id} instead: {exc}")
     return MySentenceTransformer(
         repo_id,
         cache_folder=cache_dir,
         device=device,
-        model_kwargs={
-            "torch_dtype": torch.float32 if device == "cpu" else torch.float16
-        },
+        model_kwargs={"torch_dtype": model_dtype(device)},
     )
 
 
@@ -537,6 +938,156 @@ class Document:
     metadata: Dict
 
 
+@dataclass
+class IndexedPage:
+    timestamp: float
+    chunks: List[Document]
+    embeddings: np.ndarray
+    term_freqs: List[Dict[str, int]]
+    lengths: List[int]
+    size: int
+
+
+class ChunkIndex:
+    """
+    Persistent index of recently retrieved webpage chunks and their dense embeddings,
+    keyed by URL. Pages are added incrementally, replacing older chunks of the same URL,
+    and are evicted once they are older than 'max_age' seconds or, least recently
+    retrieved first, once the index uses more than 'max_bytes'. The limits are passed
+    per call, so that retrievers with different settings can share one index.
+
+    The BM25 statistics (document frequencies and chunk lengths) are updated as pages
+    are added and evicted, so keyword search only scores the chunks that contain a
+    query term instead of re-indexing every chunk per query. Term weights use the
+    non-negative BM25 idf, log(1 + (N - n + 0.5) / (n + 0.5)).
+    """
+
+    def __init__(
+        self,
+        tokenize: Optional[Callable[[str], List[str]]] = None,
+        k1: float = 1.5,
+        b: float = 0.75,
+    ):
+        self.tokenize = tokenize or default_preprocessing_func
+        self.k1 = k1
+        self.b = b
+        self.pages: OrderedDict[str, IndexedPage] = OrderedDict()
+        self.num_bytes = 0
+        # term -> {(url, chunk number): term frequency}
+        self.postings: Dict[str, Dict[Tuple[str, int], int]] = defaultdict(dict)
+        self.num_chunks = 0
+        self.total_length = 0
+        self.lock = threading.Lock()
+
+    def add_documents(
+        self,
+        documents: List[Document],
+        embeddings: np.ndarray,
+        max_age: int,
+        max_bytes: int,
+    ):
+        chunks_by_url: Dict[str, List[int]] = defaultdict(list)
+        for i, doc in enumerate(documents):
+            chunks_by_url[doc.metadata["source"]].append(i)
+
+        pages = {}
+        for url, idxs in chunks_by_url.items():
+            page_embeddings = np.asarray(embeddings[idxs], dtype=np.float32)
+            page_docs = [documents[i] for i in idxs]
+            term_freqs = []
+            for doc in page_docs:
+                freqs = defaultdict(int)
+                for term in self.tokenize(doc.page_content):
+                    freqs[term] += 1
+                term_freqs.append(dict(freqs))
+            size = page_embeddings.nbytes + sum(
+                len(doc.page_content) for doc in page_docs
+            )
+            lengths = [sum(freqs.values()) for freqs in term_freqs]
+            pages[url] = (page_docs, page_embeddings, term_freqs, lengths, size)
+
+        now = time.monotonic()
+        with self.lock:
+            for url, page_data in pages.items():
+                if url in self.pages:
+                    self._remove(url)
+                page = IndexedPage(now, *page_data)
+                self.pages[url] = page
+                self.num_bytes += page.size
+                for i, freqs in enumerate(page.term_freqs):
+                    for term, freq in freqs.items():
+                        self.postings[term][(url, i)] = freq
+                self.total_length += sum(page.lengths)
+                self.num_chunks += len(page.lengths)
+            self._evict(now, max_age, max_bytes)
+
+    def _remove(self, url: str):
+        page = self.pages.pop(url)
+        self.num_bytes -= page.size
+        for i, freqs in enumerate(page.term_freqs):
+            for term in freqs:
+                postings = self.postings[term]
+                del postings[(url, i)]
+                if not postings:
+                    del self.postings[term]
+        self.total_length -= sum(page.lengths)
+        self.num_chunks -= len(page.lengths)
+
+    def _evict(self, now: float, max_age: int, max_bytes: float = math.inf):
+        while self.pages:
+            url, page = next(iter(self.pages.items()))
+            if now - page.timestamp <= max_age and self.num_bytes <= max_bytes:
+                break
+            self._remove(url)
+
+    def dense_search(
+        self, query_embedding: np.ndarray, k: int, max_age: int
+    ) -> List[Tuple[Document, float]]:
+        """Return the 'k' chunks most similar to the query embedding, with their
+        cosine similarities, best first."""
+        with self.lock:
+            self._evict(time.monotonic(), max_age)
+            if not self.pages:
+                return []
+            documents = list(
+                chain.from_iterable(page.chunks for page in self.pages.values())
+            )
+            embeddings = np.concatenate([page.embeddings for page in self.pages.values()])
+        similarity = cosine_similarity([query_embedding], embeddings)[0]
+        ranked_idxs = np.argsort(-similarity)[:k]
+        return [(documents[i], float(similarity[i])) for i in ranked_idxs]
+
+    def keyword_search(self, query: str, k: int, max_age: int) -> List[Document]:
+        """Return the 'k' chunks with the highest BM25 score for the query."""
+        scores: Dict[Tuple[str, int], float] = defaultdict(float)
+        with self.lock:
+            self._evict(time.monotonic(), max_age)
+            if not self.num_chunks:
+                return []
+            average_length = self.total_length / self.num_chunks
+            for term in set(self.tokenize(query)):
+                postings = self.postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(
+                    1 + (self.num_chunks - len(postings) + 0.5) / (len(postings) + 0.5)
+                )
+                for (url, i), freq in postings.items():
+                    length = self.pages[url].lengths[i]
+                    scores[(url, i)] += (
+                        idf
+                        * freq
+                        * (self.k1 + 1)
+                        / (
+                            freq
+                            + self.k1
+                            * (1 - self.b + self.b * length / average_length)
+                        )
+                    )
+            best = sorted(scores, key=scores.get, reverse=True)[:k]
+            return [self.pages[url].chunks[i] for url, i in best]
+
+
 class DocumentRetriever:
     spaces_regex: re.Pattern
     device: str
@@ -552,6 +1103,10 @@ class DocumentRetriever:
     client_timeout: int
     searxng_url: str
     splade_batch_size: int
+    cascade_candidates: int
+    local_index_max_age: int
+    local_index_max_bytes: int
+    local_index_threshold: float
 
     def __init__(self):
         self.embedding_model = None
@@ -561,6 +1116,10 @@ class DocumentRetriever:
         self.splade_query_model = None
         self.token_classification_chunker = None
         self.spaces_regex = re.compile(r" {3,}")
+        self.chunk_index = ChunkIndex()
+        self.local_index_max_age = 0
+        self.local_index_max_bytes = 64 * 1024 * 1024
+        self.local_index_threshold = 0.6
         self.proxy = None
         self.proxy_except_domains = None
 
@@ -580,23 +1139,34 @@ class DocumentRetriever:
         self.client_timeout = settings.client_timeout
         self.searxng_url = settings.searxng_url
         self.splade_batch_size = settings.splade_batch_size
+        self.cascade_candidates = settings.cascade_candidates
+        self.local_index_max_age = settings.local_index_max_age
+        self.local_index_max_bytes = settings.local_index_max_mb * 1024 * 1024
+        self.local_index_threshold = settings.local_index_confidence_threshold
         self.proxy = os.environ.get("https_proxy", os.environ.get("http_proxy"))
         if os.environ.get("no_proxy"):
             self.proxy_except_domains = tuple(os.environ.get("no_proxy").split(","))
         self.duckduckgo_only = settings.duckduckgo_only
 
+    def with_settings(self, settings: Tools.Valves) -> "DocumentRetriever":
+        """Return a copy of this retriever that uses the given settings.
+        The loaded models and the local index are shared with the original."""
+        document_retriever = copy.copy(self)
+        document_retriever.update_settings(settings)
+        return document_retriever
+
     async def aload_models(self, __event_emitter__):
         await emit_status(__event_emitter__, "Loading embedding model 1/3...", False)
 
         self.embedding_model = await asyncio.to_thread(
-            load_embedding_model, "all-MiniLM-L6-v2", self.model_cache_dir, self.device
+            load_embedding_model, EMBEDDING_MODEL_ID, self.model_cache_dir, self.device
         )
         self.embedding_model.to(self.device)
 
         await emit_status(__event_emitter__, "Loading embedding model 2/3...", False)
         self.splade_doc_tokenizer, self.splade_doc_model = await asyncio.to_thread(
             load_splade_model,
-            "naver/efficient-splade-VI-BT-large-doc",
+            SPLADE_DOC_MODEL_ID,
             self.model_cache_dir,
             self.device,
         )
@@ -605,7 +1175,7 @@ class DocumentRetriever:
         await emit_status(__event_emitter__, "Loading embedding model 3/3...", False)
         self.splade_query_tokenizer, self.splade_query_model = await asyncio.to_thread(
             load_splade_model,
-            "naver/efficient-splade-VI-BT-large-query",
+            SPLADE_QUERY_MODEL_ID,
             self.model_cache_dir,
             self.device,
         )
@@ -623,7 +1193,7 @@ class DocumentRetriever:
         )
 
     async def aretrieve_from_duckduckgo(
-        self, query: str, simple_search: bool, event_emitter
+        self, query: str, simple_search: bool, event_emitter, snippets_callback=None
     ):
         documents = []
         query = query.strip("\"'")
@@ -636,15 +1206,17 @@ class DocumentRetriever:
         with AsyncDDGS(proxy=self.proxy) as ddgs:
             result_documents = []
             result_urls = []
-            if self.duckduckgo_only:
-                results = await ddgs.aduckduckgo(query, self.num_results, 30)
-            else:
-                results = await ddgs.atext(
-                    query,
-                    safesearch="moderate",
-                    timelimit=None,
-                    max_results=self.num_results,
-                )
+            with timed_stage("search_engine"):
+                if self.duckduckgo_only:
+                    results = await ddgs.aduckduckgo(query, self.num_results, 30)
+                else:
+                    results = await ddgs.atext(
+                        query,
+                        safesearch="moderate",
+                        timelimit=None,
+                        max_results=self.num_results,
+                    )
+            count_metric("search_engine_results", len(results))
             for result in results:
                 result_document = Document(
                     page_content=f"Title: {result['title']}\n{result['body']}",
@@ -653,11 +1225,16 @@ class DocumentRetriever:
                 result_documents.append(result_document)
                 result_urls.append(result["href"])
 
+        await emit_search_results(event_emitter, query, result_documents)
         if simple_search:
             retrieved_docs = await self.aretrieve_from_snippets(
                 query, result_documents, event_emitter
             )
         else:
+            if snippets_callback is not None:
+                await self.asend_snippet_tier(
+                    query, result_documents, event_emitter, snippets_callback
+                )
             retrieved_docs = await self.aretrieve_from_webpages(
                 query, result_urls, event_emitter
             )
@@ -675,7 +1252,7 @@ class DocumentRetriever:
         return documents[:max_results]
 
     async def aretrieve_from_searxng(
-        self, query: str, simple_search: bool, event_emitter
+        self, query: str, simple_search: bool, event_emitter, snippets_callback=None
     ):
         await emit_status(event_emitter, f'Searching SearXNG for "{query}"...', False)
 
@@ -693,47 +1270,54 @@ class DocumentRetriever:
             if self.searxng_url.startswith("http")
             else ("http://" + self.searxng_url)
         )
-        async with aiohttp.ClientSession(headers=headers) as session:
-            while len(result_urls) < self.num_results:
-                response = await session.get(url + request_str + str(pageno))
-
-                if not result_urls:  # no results to lose by raising an exception here
-                    response.raise_for_status()
-                try:
-                    response_dict = await response.json()
-                except JSONDecodeError:
-                    raise ValueError(
-                        "JSONDecodeError: Please ensure that the SearXNG instance can return data in JSON format"
-                    )
+        with timed_stage("search_engine"):
+            async with aiohttp.ClientSession(headers=headers) as session:
+                while len(result_urls) < self.num_results:
+                    response = await session.get(url + request_str + str(pageno))
+
+                    if not result_urls:  # no results to lose by raising an exception here
+                        response.raise_for_status()
+                    try:
+                        response_dict = await response.json()
+                    except JSONDecodeError:
+                        raise ValueError(
+                            "JSONDecodeError: Please ensure that the SearXNG instance can return data in JSON format"
+                        )
 
-                result_dicts = response_dict["results"]
-                if not result_dicts:
-                    break
-                for result in result_dicts:
-                    if (
-                        "content" in result
-                    ):  # Since some websites don't provide any description
-                        result_document = Document(
-                            page_content=f"Title: {result['title']}\n{result['content']}",
-                            metadata={"source": result["url"]},
+                    result_dicts = response_dict["results"]
+                    if not result_dicts:
+                        break
+                    for result in result_dicts:
+                        if (
+                            "content" in result
+                        ):  # Since some websites don't provide any description
+                            result_document = Document(
+                                page_content=f"Title: {result['title']}\n{result['content']}",
+                                metadata={"source": result["url"]},
+                            )
+                            result_documents.append(result_document)
+                        result_urls.append(result["url"])
+
+                    answers = response_dict["answers"]
+                    for answer in answers:
+                        answer_document = Document(
+                            page_content=f"Title: {query}\n{answer}",
+                            metadata={"source": "SearXNG instant answer"},
                         )
-                        result_documents.append(result_document)
-                    result_urls.append(result["url"])
-
-                answers = response_dict["answers"]
-                for answer in answers:
-                    answer_document = Document(
-                        page_content=f"Title: {query}\n{answer}",
-                        metadata={"source": "SearXNG instant answer"},
-                    )
-                    result_documents.append(answer_document)
-                pageno += 1
+                        result_documents.append(answer_document)
+                    pageno += 1
+        count_metric("search_engine_results", len(result_urls))
 
+        await emit_search_results(event_emitter, query, result_documents)
         if simple_search:
             retrieved_docs = await self.aretrieve_from_snippets(
                 query, result_documents, event_emitter
             )
         else:
+            if snippets_callback is not None:
+                await self.asend_snippet_tier(
+                    query, result_documents, event_emitter, snippets_callback
+                )
             retrieved_docs = await self.aretrieve_from_webpages(
                 query, result_urls, event_emitter
             )
@@ -746,6 +1330,74 @@ class DocumentRetriever:
         text = text.strip()
         return text
 
+    def prefilter_documents(
+        self, query: str, documents: list[Document], k: int
+    ) -> list[Document]:
+        prefilter = BM25Retriever.from_documents(
+            documents, preprocess_func=self.preprocess_text
+        )
+        prefilter.k = k
+        return prefilter.get_relevant_documents(query)
+
+    async def aretrieve_from_index(self, query: str, event_emitter) -> list[Document]:
+        """Answer the query from recently retrieved chunks. Returns an empty list if the
+        local index is disabled or does not contain anything relevant enough."""
+        if self.local_index_max_age <= 0 or search_operators_regex.search(query):
+            return []
+        if not self.chunk_index.num_chunks:
+            return []
+
+        query_embedding = await asyncio.to_thread(self.embedding_model.encode, query)
+        dense_results = await asyncio.to_thread(
+            self.chunk_index.dense_search,
+            query_embedding,
+            self.num_results,
+            self.local_index_max_age,
+        )
+        if not dense_results or dense_results[0][1] < self.local_index_threshold:
+            return []
+
+        await emit_status(
+            event_emitter, "Retrieving relevant results from recent searches...", False
+        )
+        if self.ensemble_weighting > 0:
+            dense_result_docs = [
+                doc
+                for doc, similarity in dense_results
+                if similarity > self.similarity_threshold
+            ]
+        else:
+            dense_result_docs = []
+
+        if self.ensemble_weighting < 1:
+            sparse_results_docs = await asyncio.to_thread(
+                self.chunk_index.keyword_search,
+                query,
+                self.num_results,
+                self.local_index_max_age,
+            )
+        else:
+            sparse_results_docs = []
+
+        return weighted_reciprocal_rank(
+            [dense_result_docs, sparse_results_docs],
+            weights=[self.ensemble_weighting, 1 - self.ensemble_weighting],
+        )[: self.max_results]
+
+    async def asend_snippet_tier(
+        self,
+        query: str,
+        documents: list[Document],
+        event_emitter,
+        snippets_callback: Callable,
+    ):
+        """Pass the ranked search engine snippets to 'snippets_callback' before the
+        (much slower) webpage retrieval starts"""
+        snippet_docs = await self.aretrieve_from_snippets(
+            query, documents, event_emitter
+        )
+        await snippets_callback((snippet_docs or documents)[: self.max_results])
+
     async def aretrieve_from_snippets(
         self, query: str, documents: list[Document], event_emitter
     ) -> list[Document]:
@@ -754,13 +1406,16 @@ class DocumentRetriever:
             return []
         await emit_status(event_emitter, "Retrieving relevant results...", False)
 
-        dense_retriever = DenseRetriever(
-            self.embedding_model,
-            num_results=self.num_results,
-            similarity_threshold=self.similarity_threshold,
-        )
-        dense_retriever.add_documents(documents)
-        return dense_retriever.get_relevant_documents(query)
+        with timed_stage("snippet_retrieval"):
+            dense_retriever = DenseRetriever(
+                self.embedding_model,
+                num_results=min(self.num_results, len(documents)),
+                similarity_threshold=self.similarity_threshold,
+            )
+            await asyncio.to_thread(dense_retriever.add_documents, documents)
+            return await asyncio.to_thread(
+                dense_retriever.get_relevant_documents, query
+            )
 
     async def aretrieve_from_webpages(
         self, query: str, url_list: list[str], event_emitter
@@ -771,6 +1426,7 @@ class DocumentRetriever:
         if self.chunking_method == "semantic":
             text_splitter = BoundedSemanticChunker(
                 self.embedding_model,
+                add_start_index=True,
                 breakpoint_threshold_type="percentile",
                 breakpoint_threshold_amount=self.chunker_breakpoint_threshold_amount,
                 max_chunk_size=self.chunk_size,
@@ -781,66 +1437,105 @@ class DocumentRetriever:
             text_splitter = RecursiveCharacterTextSplitter(
                 chunk_size=self.chunk_size,
                 chunk_overlap=10,
+                add_start_index=True,
                 separators=["\n\n", "\n", ".", ", ", " ", ""],
             )
 
         await emit_status(event_emitter, "Downloading and chunking webpages...", False)
-        split_docs = await async_fetch_chunk_websites(
-            url_list,
-            text_splitter,
-            self.client_timeout,
-            self.proxy,
-            self.proxy_except_domains,
-        )
+        with timed_stage("download_and_chunk"):
+            split_docs = await async_fetch_chunk_websites(
+                url_list,
+                text_splitter,
+                self.client_timeout,
+                self.proxy,
+                self.proxy_except_domains,
+            )
+        count_metric("chunks", len(split_docs))
         if not split_docs:
             logger.warning("Failed to fetch any websites")
             return []
+        return await self.aretrieve_from_chunks(query, split_docs, event_emitter)
 
+    async def aretrieve_from_chunks(
+        self, query: str, split_docs: list[Document], event_emitter
+    ) -> list[Document]:
         await emit_status(event_emitter, "Retrieving relevant results...", False)
+        if 0 < self.cascade_candidates < len(split_docs):
+            #  Cheap lexical prefilter: only the top BM25 candidates go through
+            #  dense embedding and SPLADE document encoding.
+            with timed_stage("prefilter"):
+                split_docs = await asyncio.to_thread(
+                    self.prefilter_documents, query, split_docs, self.cascade_candidates
+                )
+
         if self.ensemble_weighting > 0:
-            dense_retriever = DenseRetriever(
-                self.embedding_model,
-                num_results=min(self.num_results, len(split_docs)),
-                similarity_threshold=self.similarity_threshold,
-            )
-            dense_retriever.add_documents(split_docs)
-            dense_result_docs = dense_retriever.get_relevant_documents(query)
+            with timed_stage("embedding"):
+                dense_retriever = DenseRetriever(
+                    self.embedding_model,
+                    num_results=min(self.num_results, len(split_docs)),
+                    similarity_threshold=self.similarity_threshold,
+                )
+                await asyncio.to_thread(dense_retriever.add_documents, split_docs)
+                dense_result_docs = await asyncio.to_thread(
+                    dense_retriever.get_relevant_documents, query
+                )
+            document_embeddings = dense_retriever.document_embeddings
         else:
             dense_result_docs = []
+            document_embeddings = None
+
+        if self.local_index_max_age > 0:
+            if document_embeddings is None:
+                with timed_stage("embedding"):
+                    document_embeddings = await asyncio.to_thread(
+                        self.embedding_model.batch_encode,
+                        [doc.page_content for doc in split_docs],
+                    )
+            await asyncio.to_thread(
+                self.chunk_index.add_documents,
+                split_docs,
+                document_embeddings,
+                self.local_index_max_age,
+                self.local_index_max_bytes,
+            )
 
         if self.ensemble_weighting < 1:
-            #  The sparse keyword retriever is good at finding relevant documents based on keywords,
-            #  while the dense retriever is good at finding relevant documents based on semantic similarity.
-            if self.keyword_retriever == "bm25":
-                keyword_retriever = BM25Retriever.from_documents(
-                    split_docs, preprocess_func=self.preprocess_text
-                )
-                keyword_retriever.k = self.num_results
-            elif self.keyword_retriever == "splade":
-                keyword_retriever = SpladeRetriever(
-                    splade_doc_tokenizer=self.splade_doc_tokenizer,
-                    splade_doc_model=self.splade_doc_model,
-                    splade_query_tokenizer=self.splade_query_tokenizer,
-                    splade_query_model=self.splade_query_model,
-                    device=self.device,
-                    batch_size=self.splade_batch_size,
-                    k=self.num_results,
-                )
-                await asyncio.to_thread(keyword_retriever.add_documents, split_docs)
-            else:
-                raise ValueError(
-                    "self.keyword_retriever must be one of ('bm25', 'splade')"
+            with timed_stage("keyword_retrieval"):
+                #  The sparse keyword retriever is good at finding relevant documents based on keywords,
+                #  while the dense retriever is good at finding relevant documents based on semantic similarity.
+                if self.keyword_retriever == "bm25":
+                    keyword_retriever = await asyncio.to_thread(
+                        BM25Retriever.from_documents,
+                        split_docs,
+                        preprocess_func=self.preprocess_text,
+                    )
+                    keyword_retriever.k = self.num_results
+                elif self.keyword_retriever == "splade":
+                    keyword_retriever = SpladeRetriever(
+                        splade_doc_tokenizer=self.splade_doc_tokenizer,
+                        splade_doc_model=self.splade_doc_model,
+                        splade_query_tokenizer=self.splade_query_tokenizer,
+                        splade_query_model=self.splade_query_model,
+                        device=self.device,
+                        batch_size=self.splade_batch_size,
+                        k=self.num_results,
+                    )
+                    await asyncio.to_thread(keyword_retriever.add_documents, split_docs)
+                else:
+                    raise ValueError(
+                        "self.keyword_retriever must be one of ('bm25', 'splade')"
+                    )
+                sparse_results_docs = await asyncio.to_thread(
+                    keyword_retriever.get_relevant_documents, query
                 )
-            sparse_results_docs = await asyncio.to_thread(
-                keyword_retriever.get_relevant_documents, query
-            )
         else:
             sparse_results_docs = []
 
-        return weighted_reciprocal_rank(
-            [dense_result_docs, sparse_results_docs],
-            weights=[self.ensemble_weighting, 1 - self.ensemble_weighting],
-        )[: self.num_results]
+        with timed_stage("fusion"):
+            return weighted_reciprocal_rank(
+                [dense_result_docs, sparse_results_docs],
+                weights=[self.ensemble_weighting, 1 - self.ensemble_weighting],
+            )[: self.num_results]
 
 
 def cosine_similarity(X, Y) -> np.ndarray:
@@ -2091,7 +2786,10 @@ async def async_download_html(
         proxy=proxy,
     ) as session:
         try:
-            resp = await session.get(url)
+            with timed_stage("page_download"):
+                resp = await session.get(url)
+                body = await resp.read()
+            count_metric("download_bytes", len(body))
             return await resp.text(), url
         except UnicodeDecodeError:
             if not resp.headers["Content-Type"].startswith("text/html"):
@@ -2128,22 +2826,94 @@ async def async_fetch_chunk_websites(
         for f in asyncio.as_completed(result_futures):
             result = await f
             if result:
+                count_metric("pages_fetched")
                 resp_html, url = result
-                document = html_to_plaintext_doc(resp_html, url)
-                new_chunks = await loop.run_in_executor(
-                    pool, text_splitter.split_documents, [document]
-                )
+                with timed_stage("html_extraction"):
+                    document = await loop.run_in_executor(
+                        pool, html_to_plaintext_doc, resp_html, url
+                    )
+                with timed_stage("chunking"):
+                    new_chunks = await loop.run_in_executor(
+                        pool, text_splitter.split_documents, [document]
+                    )
                 chunks.extend(new_chunks)
+            else:
+                count_metric("pages_failed")
     return chunks
 
 
 def docs_to_pretty_str(docs) -> str:
-    ret_str = ""
+    parts = []
     for i, doc in enumerate(docs):
-        ret_str += f"Result {i + 1}:\n"
-        ret_str += f"{doc.page_content}\n"
-        ret_str += f"Source URL: {doc.metadata['source']}\n"
-    return ret_str
+        parts.append(f"Result {i + 1}:\n")
+        parts.append(f"{doc.page_content}\n")
+        parts.append(f"Source URL: {doc.metadata['source']}\n")
+    return "".join(parts)
+
+
+def merge_source_chunks(docs: List[Document]) -> List[str]:
+    """Merge overlapping or adjacent chunks of a single source.
+
+    Chunks are located by the 'start_index' metadata written by the text splitters and
+    returned in page order. Chunks without a known position are appended unchanged.
+    """
+    positioned = sorted(
+        (doc for doc in docs if doc.metadata.get("start_index", -1) >= 0),
+        key=lambda doc: doc.metadata["start_index"],
+    )
+    texts = []
+    end = -1
+    for doc in positioned:
+        start = doc.metadata["start_index"]
+        if texts and start <= end:
+            texts[-1] += doc.page_content[end - start :]
+        else:
+            texts.append(doc.page_content)
+        end = max(end, start + len(doc.page_content))
+    texts.extend(
+        doc.page_content
+        for doc in docs
+        if doc.metadata.get("start_index", -1) < 0
+    )
+    return texts
+
+
+def _render_packed_docs(docs: List[Document]) -> str:
+    sources: Dict[str, List[Document]] = defaultdict(list)
+    for doc in docs:
+        sources[doc.metadata["source"]].append(doc)
+
+    parts = []
+    for i, (source, source_docs) in enumerate(sources.items()):
+        parts.append(f"Result {i + 1}:\n")
+        parts.extend(f"{text}\n" for text in merge_source_chunks(source_docs))
+        parts.append(f"Source URL: {source}\n")
+    return "".join(parts)
+
+
+def pack_docs_to_str(docs: List[Document], max_chars: int = 0) -> str:
+    """Pack ranked results into at most 'max_chars' characters (0 = no limit).
+
+    Results are grouped by source URL, so that each URL is printed once, and overlapping
+    chunks of the same source are merged. If the output is too long, the lowest-ranked
+    results are dropped first. If even the top result does not fit, its text is truncated,
+    and a budget smaller than the result's header and footer cuts the output itself.
+    """
+    kept = list(docs)
+    while kept:
+        packed = _render_packed_docs(kept)
+        if max_chars <= 0 or len(packed) <= max_chars:
+            return packed
+        kept.pop()
+
+    if not docs:
+        return ""
+    top_doc = docs[0]
+    overhead = len(_render_packed_docs([Document("", top_doc.metadata)]))
+    truncated_doc = Document(
+        top_doc.page_content[: max(0, max_chars - overhead)], top_doc.metadata
+    )
+    return _render_packed_docs([truncated_doc])[:max_chars]
 
 
 def html_to_plaintext_doc(html_text: str or bytes, url: str) -> Document:
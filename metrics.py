@@ -0,0 +1,160 @@
+"""
+Latency histograms and counters for the Tools API server, rendered in the Prometheus
+text exposition format for /metrics.
+
+The search pipeline in llm_web_search.py reports its stages and counters to whatever
+recorder is set in its metrics_recorder context variable. ToolServer starts a
+RequestMetrics for every request and hands it to the pipeline: it adds to the
+process-wide metrics below and keeps the request's own timings for the optional
+"timings" response object. This module deliberately doesn't import llm_web_search,
+so that the server can start before the search dependencies are loaded.
+"""
+
+import contextvars
+import threading
+import time
+from collections import defaultdict
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+REGISTRY = []
+
+
+def _escape_label_value(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(label_names, label_values, extra=()):
+    pairs = list(zip(label_names, label_values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape_label_value(value)}"' for name, value in pairs) + '}'
+
+
+def _format_value(value):
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Counter:
+    def __init__(self, name, help_text, label_names=()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self.values = defaultdict(float)
+        self.lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def inc(self, label_values=(), value=1):
+        with self.lock:
+            self.values[tuple(label_values)] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self.lock:
+            for label_values, value in sorted(self.values.items()):
+                lines.append(f"{self.name}{_format_labels(self.label_names, label_values)} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help_text, label_names=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+        # label values -> [bucket counts..., count, sum]
+        self.values = {}
+        self.lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def observe(self, label_values, value):
+        label_values = tuple(label_values)
+        with self.lock:
+            series = self.values.get(label_values)
+            if series is None:
+                series = self.values[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += 1
+            series[-1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            for label_values, series in sorted(self.values.items()):
+                for bound, count in zip(self.buckets, series):
+                    labels = _format_labels(self.label_names, label_values, [('le', _format_value(bound))])
+                    lines.append(f"{self.name}_bucket{labels} {count}")
+                labels = _format_labels(self.label_names, label_values, [('le', '+Inf')])
+                lines.append(f"{self.name}_bucket{labels} {series[-2]}")
+                labels = _format_labels(self.label_names, label_values)
+                lines.append(f"{self.name}_count{labels} {series[-2]}")
+                lines.append(f"{self.name}_sum{labels} {series[-1]!r}")
+        return lines
+
+
+REQUEST_SECONDS = Histogram(
+    'tools_request_duration_seconds', 'Tools API request latency by route', ['route']
+)
+REQUESTS = Counter(
+    'tools_requests_total', 'Tools API requests by route and status code', ['route', 'status']
+)
+STAGE_SECONDS = Histogram(
+    'tools_search_stage_duration_seconds', 'Search pipeline stage latency', ['stage']
+)
+# Search pipeline counters (pages_fetched, download_bytes, chunks, query_cache_hits, ...)
+PIPELINE_EVENTS = Counter(
+    'tools_search_events_total', 'Search pipeline counters (pages, bytes, chunks, cache hits)', ['event']
+)
+
+
+class RequestMetrics:
+    """
+    Recorder for one request. Stages that run concurrently (e.g. page downloads)
+    are summed, so stage totals can exceed the request's wall time.
+    """
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.stages = defaultdict(float)
+        self.counters = defaultdict(float)
+
+    def observe(self, stage, seconds):
+        STAGE_SECONDS.observe((stage,), seconds)
+        self.stages[stage] += seconds
+
+    def count(self, name, value=1):
+        PIPELINE_EVENTS.inc((name,), value)
+        self.counters[name] += value
+
+    def finish(self, route, status):
+        elapsed = time.perf_counter() - self.start
+        REQUEST_SECONDS.observe((route,), elapsed)
+        REQUESTS.inc((route, str(status)))
+        return elapsed
+
+    def report(self, elapsed):
+        return {
+            'total': round(elapsed, 4),
+            'stages': {stage: round(seconds, 4) for stage, seconds in self.stages.items()},
+            'counters': {name: int(value) if value == int(value) else value for name, value in self.counters.items()},
+        }
+
+
+# Recorder of the request being handled in the current context
+current_request_metrics = contextvars.ContextVar('current_request_metrics', default=None)
+
+
+def start_request_metrics():
+    """Create a recorder and make it the current request's recorder"""
+    recorder = RequestMetrics()
+    current_request_metrics.set(recorder)
+    return recorder
+
+
+def render_metrics():
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
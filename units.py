@@ -0,0 +1,203 @@
+"""
+Unit registry for the convert_units tool.
+
+Every unit is described by its dimension (exponents over the base dimensions
+length, mass, time and temperature) and an affine map to the SI base unit:
+si = value * factor + offset. Any two units with the same dimension can be converted,
+and all name, symbol and plural aliases are resolved through one prebuilt index.
+Values are converted as numpy arrays, so a list of values costs one call.
+"""
+
+from collections import namedtuple
+
+import numpy as np
+
+Unit = namedtuple('Unit', ['name', 'dimension', 'factor', 'offset'])
+
+# Results are rounded to this many significant digits, which drops the float error of
+# the affine maps (e.g. 32 fahrenheit is exactly 0 celsius, not 7e-15)
+SIGNIFICANT_DIGITS = 12
+
+# Dimension exponents: (length, mass, time, temperature)
+LENGTH = (1, 0, 0, 0)
+AREA = (2, 0, 0, 0)
+VOLUME = (3, 0, 0, 0)
+MASS = (0, 1, 0, 0)
+TIME = (0, 0, 1, 0)
+TEMPERATURE = (0, 0, 0, 1)
+SPEED = (1, 0, -1, 0)
+ENERGY = (2, 1, -2, 0)
+POWER = (2, 1, -3, 0)
+PRESSURE = (-1, 1, -2, 0)
+
+DIMENSION_NAMES = {
+    LENGTH: 'length',
+    AREA: 'area',
+    VOLUME: 'volume',
+    MASS: 'mass',
+    TIME: 'time',
+    TEMPERATURE: 'temperature',
+    SPEED: 'speed',
+    ENERGY: 'energy',
+    POWER: 'power',
+    PRESSURE: 'pressure',
+}
+
+# (name, plural, dimension, factor to SI, offset to SI, aliases)
+UNIT_DEFINITIONS = [
+    # Length (meter)
+    ('meter', 'meters', LENGTH, 1.0, 0.0, ['m', 'metre', 'metres']),
+    ('kilometer', 'kilometers', LENGTH, 1000.0, 0.0, ['km', 'kilometre', 'kilometres']),
+    ('centimeter', 'centimeters', LENGTH, 0.01, 0.0, ['cm', 'centimetre', 'centimetres']),
+    ('millimeter', 'millimeters', LENGTH, 0.001, 0.0, ['mm', 'millimetre', 'millimetres']),
+    ('mile', 'miles', LENGTH, 1609.344, 0.0, ['mi']),
+    ('yard', 'yards', LENGTH, 0.9144, 0.0, ['yd', 'yds']),
+    ('foot', 'feet', LENGTH, 0.3048, 0.0, ['ft']),
+    ('inch', 'inches', LENGTH, 0.0254, 0.0, ['in']),
+    ('nautical_mile', 'nautical_miles', LENGTH, 1852.0, 0.0, ['nmi']),
+    # Area (square meter)
+    ('square_meter', 'square_meters', AREA, 1.0, 0.0, ['m2', 'sq_m', 'square_metre', 'square_metres']),
+    ('square_kilometer', 'square_kilometers', AREA, 1e6, 0.0, ['km2', 'sq_km']),
+    ('square_foot', 'square_feet', AREA, 0.09290304, 0.0, ['ft2', 'sq_ft']),
+    ('square_mile', 'square_miles', AREA, 2589988.110336, 0.0, ['mi2', 'sq_mi']),
+    ('acre', 'acres', AREA, 4046.8564224, 0.0, ['ac']),
+    ('hectare', 'hectares', AREA, 1e4, 0.0, ['ha']),
+    # Volume (cubic meter)
+    ('cubic_meter', 'cubic_meters', VOLUME, 1.0, 0.0, ['m3']),
+    ('liter', 'liters', VOLUME, 1e-3, 0.0, ['l', 'litre', 'litres']),
+    ('milliliter', 'milliliters', VOLUME, 1e-6, 0.0, ['ml', 'millilitre', 'millilitres']),
+    ('gallon', 'gallons', VOLUME, 3.785411784e-3, 0.0, ['gal']),
+    ('quart', 'quarts', VOLUME, 9.46352946e-4, 0.0, ['qt']),
+    ('pint', 'pints', VOLUME, 4.73176473e-4, 0.0, ['pt']),
+    ('cup', 'cups', VOLUME, 2.365882365e-4, 0.0, []),
+    ('fluid_ounce', 'fluid_ounces', VOLUME, 2.95735295625e-5, 0.0, ['fl_oz']),
+    ('tablespoon', 'tablespoons', VOLUME, 1.478676478125e-5, 0.0, ['tbsp']),
+    ('teaspoon', 'teaspoons', VOLUME, 4.92892159375e-6, 0.0, ['tsp']),
+    # Mass (kilogram)
+    ('kilogram', 'kilograms', MASS, 1.0, 0.0, ['kg', 'kgs', 'kilo', 'kilos']),
+    ('gram', 'grams', MASS, 1e-3, 0.0, ['g']),
+    ('milligram', 'milligrams', MASS, 1e-6, 0.0, ['mg']),
+    ('tonne', 'tonnes', MASS, 1000.0, 0.0, ['t', 'metric_ton', 'metric_tons']),
+    ('pound', 'pounds', MASS, 0.45359237, 0.0, ['lb', 'lbs']),
+    ('ounce', 'ounces', MASS, 0.028349523125, 0.0, ['oz']),
+    ('stone', 'stones', MASS, 6.35029318, 0.0, ['st']),
+    # Time (second)
+    ('second', 'seconds', TIME, 1.0, 0.0, ['s', 'sec', 'secs']),
+    ('minute', 'minutes', TIME, 60.0, 0.0, ['min', 'mins']),
+    ('hour', 'hours', TIME, 3600.0, 0.0, ['h', 'hr', 'hrs']),
+    ('day', 'days', TIME, 86400.0, 0.0, ['d']),
+    ('week', 'weeks', TIME, 604800.0, 0.0, ['wk']),
+    # Temperature (kelvin)
+    ('kelvin', 'kelvin', TEMPERATURE, 1.0, 0.0, ['k']),
+    ('celsius', 'celsius', TEMPERATURE, 1.0, 273.15, ['c', 'degc', 'degrees_celsius', 'centigrade']),
+    ('fahrenheit', 'fahrenheit', TEMPERATURE, 5 / 9, 273.15 - 32 * 5 / 9, ['f', 'degf', 'degrees_fahrenheit']),
+    # Speed (meter per second)
+    ('meter_per_second', 'meters_per_second', SPEED, 1.0, 0.0, ['m/s', 'mps']),
+    ('kilometer_per_hour', 'kilometers_per_hour', SPEED, 1000 / 3600, 0.0, ['km/h', 'kmh', 'kph']),
+    ('mile_per_hour', 'miles_per_hour', SPEED, 1609.344 / 3600, 0.0, ['mph', 'mi/h']),
+    ('knot', 'knots', SPEED, 1852 / 3600, 0.0, ['kn', 'kt']),
+    # Energy (joule)
+    ('joule', 'joules', ENERGY, 1.0, 0.0, ['j']),
+    ('kilojoule', 'kilojoules', ENERGY, 1000.0, 0.0, ['kj']),
+    ('calorie', 'calories', ENERGY, 4.184, 0.0, ['cal']),
+    ('kilocalorie', 'kilocalories', ENERGY, 4184.0, 0.0, ['kcal']),
+    ('kilowatt_hour', 'kilowatt_hours', ENERGY, 3.6e6, 0.0, ['kwh']),
+    # Power (watt)
+    ('watt', 'watts', POWER, 1.0, 0.0, ['w']),
+    ('kilowatt', 'kilowatts', POWER, 1000.0, 0.0, ['kw']),
+    ('horsepower', 'horsepower', POWER, 745.69987158227, 0.0, ['hp']),
+    # Pressure (pascal)
+    ('pascal', 'pascals', PRESSURE, 1.0, 0.0, ['pa']),
+    ('kilopascal', 'kilopascals', PRESSURE, 1000.0, 0.0, ['kpa']),
+    ('bar', 'bars', PRESSURE, 1e5, 0.0, []),
+    ('atmosphere', 'atmospheres', PRESSURE, 101325.0, 0.0, ['atm']),
+    ('psi', 'psi', PRESSURE, 6894.757293168, 0.0, []),
+]
+
+
+def normalize_unit_name(name):
+    return '_'.join(name.strip().lower().replace('°', 'deg').replace('-', ' ').split())
+
+
+def build_unit_index(definitions):
+    """Map every name, plural and alias to its Unit"""
+    index = {}
+    for name, plural, dimension, factor, offset, aliases in definitions:
+        unit = Unit(name, dimension, factor, offset)
+        for alias in [name, plural] + aliases:
+            key = normalize_unit_name(alias)
+            if key in index and index[key] != unit:
+                raise ValueError(f"Duplicate unit alias: {alias}")
+            index[key] = unit
+    return index
+
+
+UNIT_INDEX = build_unit_index(UNIT_DEFINITIONS)
+
+
+def lookup_unit(name):
+    unit = UNIT_INDEX.get(normalize_unit_name(name))
+    if unit is None:
+        raise ValueError(f"Unknown unit: {name}")
+    return unit
+
+
+def parse_conversion(conversion):
+    """Split a conversion like 'miles_to_km' or 'degrees fahrenheit to celsius' into two units"""
+    key = normalize_unit_name(conversion)
+    if '_to_' not in key:
+        raise ValueError(f"Conversion must look like 'from_to_to', got: {conversion}")
+    from_name, to_name = key.split('_to_', 1)
+    return lookup_unit(from_name), lookup_unit(to_name)
+
+
+def round_significant(values, digits=SIGNIFICANT_DIGITS):
+    values = np.asarray(values, dtype=np.float64)
+    rounded = values.copy()
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        decimals = digits - 1 - np.floor(np.log10(np.abs(values)))
+        # Zero, inf, nan and values so small that 10**decimals overflows are left as they are
+        mask = np.isfinite(decimals) & (decimals <= 300) & np.isfinite(values)
+        selected, decimals = values[mask], decimals[mask]
+        # Multiply or divide by a positive power of ten, which is exact up to 1e22
+        scale = 10.0 ** np.abs(decimals)
+        rounded[mask] = np.where(
+            decimals >= 0,
+            np.round(selected * scale) / scale,
+            np.round(selected / scale) * scale,
+        )
+    return rounded
+
+
+def convert(values, from_unit, to_unit):
+    """
+    Convert a scalar or array of values between two units of the same dimension.
+    Returns a numpy array with the shape of values.
+    """
+    if from_unit.dimension != to_unit.dimension:
+        raise ValueError(
+            f"Cannot convert {DIMENSION_NAMES.get(from_unit.dimension, 'unknown')} ({from_unit.name}) "
+            f"to {DIMENSION_NAMES.get(to_unit.dimension, 'unknown')} ({to_unit.name})"
+        )
+    values = np.asarray(values, dtype=np.float64)
+    # Through SI, rounding the SI value too, so that offsets cancel exactly
+    si_values = round_significant(values * from_unit.factor + from_unit.offset)
+    return round_significant((si_values - to_unit.offset) / to_unit.factor)
+
+
+def convert_units(values, conversion=None, from_unit=None, to_unit=None):
+    """
+    Convert values given either a conversion string ('miles_to_km') or from/to unit names.
+    Returns (converted array, from Unit, to Unit).
+    """
+    if conversion:
+        source, target = parse_conversion(conversion)
+    elif from_unit and to_unit:
+        source, target = lookup_unit(from_unit), lookup_unit(to_unit)
+    else:
+        raise ValueError("Provide either a conversion like 'miles_to_km' or both from and to units")
+    return convert(values, source, target), source, target
+
+
+def unit_label(unit):
+    return unit.name.replace('_', ' ')
@@ -0,0 +1,87 @@
+"""
+Energy-based voice activity detection for WhisperServer.
+
+Clips are split into short frames and a frame counts as voiced when its energy is
+above a threshold that adapts to the clip's own noise floor. Leading and trailing
+silence is trimmed (keeping a little padding), and a clip with too little voiced
+audio is rejected before it reaches the model: keyboard clacks and breathing make
+Whisper hallucinate "Thank you." rather than return nothing.
+"""
+
+from collections import namedtuple
+
+import numpy as np
+
+from audio import SAMPLE_RATE
+
+VadSettings = namedtuple(
+    'VadSettings',
+    [
+        'frame_seconds',  # Analysis frame length
+        'threshold_db',  # Lowest energy (dBFS) that can count as voice
+        'noise_margin_db',  # Voice must be this far above the clip's noise floor...
+        'max_threshold_db',  # ...but a threshold above this is never required
+        'min_speech_seconds',  # Clips with less voiced audio are rejected
+        'padding_seconds',  # Kept around the voiced region when trimming
+    ],
+    defaults=(0.02, -45.0, 10.0, -30.0, 0.3, 0.2),
+)
+
+VadResult = namedtuple(
+    'VadResult',
+    ['audio', 'speech', 'input_seconds', 'kept_seconds', 'voiced_seconds', 'threshold_db'],
+)
+
+NOISE_FLOOR_PERCENTILE = 10
+
+
+def frame_energies_db(audio, frame_length):
+    """Mean energy of each frame in dBFS (the last, partial frame is zero padded)"""
+    frame_count = -(-len(audio) // frame_length)
+    frames = np.zeros(frame_count * frame_length, dtype=np.float32)
+    frames[:len(audio)] = audio
+    energy = np.mean(np.square(frames.reshape(frame_count, frame_length), dtype=np.float64), axis=1)
+    return 10 * np.log10(energy + 1e-10)
+
+
+def speech_threshold_db(energies_db, settings):
+    noise_floor = np.percentile(energies_db, NOISE_FLOOR_PERCENTILE)
+    return min(max(settings.threshold_db, noise_floor + settings.noise_margin_db), settings.max_threshold_db)
+
+
+def apply_vad(audio, settings=VadSettings(), sample_rate=SAMPLE_RATE):
+    """
+    Trim leading and trailing silence from a float32 mono clip.
+    Returns a VadResult; when speech is False the clip should not be transcribed
+    and audio is empty.
+    """
+    input_seconds = len(audio) / sample_rate
+    frame_length = max(1, int(settings.frame_seconds * sample_rate))
+    if len(audio) == 0:
+        return VadResult(audio, False, 0.0, 0.0, 0.0, settings.threshold_db)
+
+    energies_db = frame_energies_db(audio, frame_length)
+    threshold_db = speech_threshold_db(energies_db, settings)
+    voiced = np.flatnonzero(energies_db > threshold_db)
+    voiced_seconds = len(voiced) * frame_length / sample_rate
+
+    if voiced_seconds < settings.min_speech_seconds:
+        return VadResult(audio[:0], False, input_seconds, 0.0, voiced_seconds, threshold_db)
+
+    padding = int(settings.padding_seconds * sample_rate)
+    start = max(0, voiced[0] * frame_length - padding)
+    end = min(len(audio), (voiced[-1] + 1) * frame_length + padding)
+    trimmed = audio[start:end]
+    return VadResult(trimmed, True, input_seconds, len(trimmed) / sample_rate, voiced_seconds, threshold_db)
+
+
+def vad_report(result):
+    """Summary of what the VAD cut, for responses and logs"""
+    return {
+        'speech': result.speech,
+        'input_seconds': round(result.input_seconds, 3),
+        'kept_seconds': round(result.kept_seconds, 3),
+        'cut_seconds': round(result.input_seconds - result.kept_seconds, 3),
+        'voiced_seconds': round(result.voiced_seconds, 3),
+        'threshold_db': round(float(result.threshold_db), 1),
+    }
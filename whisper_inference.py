@@ -0,0 +1,290 @@
+"""
+Inference helpers for WhisperServer that go below model.transcribe.
+
+model.transcribe pads every clip to Whisper's 30 second window, so a 1.5 second
+utterance costs as much encoder compute as 30 seconds of speech. transcribe_short
+instead runs the encoder on a mel window sized to the clip (rounded up to a bucket,
+using the first positional embeddings only) and decodes greedily against those audio
+features; transcribe_short_batch does the same for several clips in one padded
+batch. Both report the same confidence signals as transcribe (average log
+probability, compression ratio, no-speech probability), so the caller can fall back
+to the standard path when the shortened context hurt the result.
+"""
+
+import json
+import os
+from collections import namedtuple
+
+import numpy as np
+import torch
+import torch.nn.functional as F
+import whisper
+from whisper.audio import HOP_LENGTH, SAMPLE_RATE
+from whisper.tokenizer import get_tokenizer
+from whisper.utils import compression_ratio
+
+# Encoder windows for the short path, in seconds. Longer clips use the standard path.
+SHORT_WINDOW_BUCKETS = (2, 4, 6, 8, 10)
+# Upper bound on decoded tokens per second of window, to cut off repetition loops early
+MAX_TOKENS_PER_SECOND = 12
+# Short path results below these thresholds should be redone with the full window
+SHORT_PATH_MIN_AVG_LOGPROB = -0.8
+SHORT_PATH_MAX_COMPRESSION_RATIO = 2.4
+# Whisper's silence rule: a likely <|nospeech|> with a low average log probability
+NO_SPEECH_THRESHOLD = 0.6
+NO_SPEECH_MAX_AVG_LOGPROB = -1.0
+
+# CPU inference settings, written by benchmarks/whisper_autotune.py
+CPU_SETTINGS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'whisper_cpu.json')
+DEFAULT_CPU_SETTINGS = {
+    'quantize': False,  # Dynamic int8 quantization of the linear layers (CPU only, opt-in: check accuracy first)
+    'intra_op_threads': None,  # None keeps torch's default
+    'inter_op_threads': None,
+    'batch_max_size': 8,
+}
+
+ShortTranscription = namedtuple(
+    'ShortTranscription',
+    ['text', 'language', 'avg_logprob', 'compression_ratio', 'no_speech_prob', 'window_seconds'],
+)
+
+
+def window_bucket(seconds):
+    """Smallest encoder window that fits the clip, or None when it is too long for the short path"""
+    for bucket in SHORT_WINDOW_BUCKETS:
+        if seconds <= bucket:
+            return bucket
+    return None
+
+
+def model_dtype(model):
+    return torch.float16 if model.device.type == 'cuda' else torch.float32
+
+
+def window_mel(model, audio, window_seconds):
+    """Log-mel spectrogram of the clip zero padded to window_seconds, shape (1, n_mels, frames)"""
+    samples = int(window_seconds * SAMPLE_RATE)
+    audio = whisper.pad_or_trim(torch.from_numpy(np.asarray(audio, dtype=np.float32)), samples)
+    mel = whisper.log_mel_spectrogram(audio, model.dims.n_mels, device=model.device)
+    return mel[:, :samples // HOP_LENGTH].unsqueeze(0).to(model_dtype(model))
+
+
+def encode_window(model, mel):
+    """
+    AudioEncoder.forward for windows shorter than 30 seconds: the stock forward
+    asserts the full 1500-frame context, this one adds only as many positional
+    embeddings as the window has frames.
+    """
+    encoder = model.encoder
+    x = F.gelu(encoder.conv1(mel))
+    x = F.gelu(encoder.conv2(x))
+    x = x.permute(0, 2, 1)
+    x = (x + encoder.positional_embedding[:x.shape[1]]).to(x.dtype)
+    for block in encoder.blocks:
+        x = block(x)
+    return encoder.ln_post(x)
+
+
+def detect_language(model, audio_features):
+    """Most likely language code from the decoder's first step after <|startoftranscript|>"""
+    tokenizer = get_tokenizer(model.is_multilingual, num_languages=model.num_languages)
+    tokens = torch.tensor([[tokenizer.sot]] * audio_features.shape[0], device=model.device)
+    logits = model.decoder(tokens, audio_features)[:, 0].float()
+    mask = torch.full_like(logits[0], float('-inf'))
+    mask[list(tokenizer.all_language_tokens)] = 0
+    best = (logits + mask).argmax(dim=-1).tolist()
+    language_by_token = dict(zip(tokenizer.all_language_tokens, tokenizer.all_language_codes))
+    return [language_by_token[token] for token in best]
+
+
+def suppressed_token_mask(tokenizer, vocab_size, device):
+    """Additive logit mask for tokens transcription never samples: specials other than
+    <|endoftext|> (including timestamps) and Whisper's non-speech symbols"""
+    mask = torch.zeros(vocab_size, device=device)
+    mask[tokenizer.eot + 1:] = float('-inf')
+    mask[list(tokenizer.non_speech_tokens)] = float('-inf')
+    return mask
+
+
+def greedy_decode(model, audio_features, initial_tokens, max_tokens):
+    """
+    Batched greedy decoding against precomputed audio features of any length.
+    initial_tokens holds one start sequence per clip, all of the same length.
+    Returns one (text tokens, sum of their log probabilities, no-speech probability)
+    per clip.
+    """
+    tokenizer = get_tokenizer(model.is_multilingual, num_languages=model.num_languages)
+    batch_size = audio_features.shape[0]
+    initial_length = len(initial_tokens[0])
+    sot_index = initial_tokens[0].index(tokenizer.sot)
+    tokens = torch.tensor(initial_tokens, device=model.device)
+    mask = suppressed_token_mask(tokenizer, model.dims.n_vocab, model.device)
+    blank = tokenizer.encode(' ') + [tokenizer.eot]
+    sum_logprobs = torch.zeros(batch_size, device=model.device)
+    finished = torch.zeros(batch_size, dtype=torch.bool, device=model.device)
+    no_speech_probs = [0.0] * batch_size
+
+    kv_cache, hooks = model.install_kv_cache_hooks()
+    try:
+        for step in range(max_tokens):
+            logits = model.decoder(tokens if step == 0 else tokens[:, -1:], audio_features, kv_cache=kv_cache).float()
+            if step == 0:
+                no_speech_probs = logits[:, sot_index].softmax(dim=-1)[:, tokenizer.no_speech].tolist()
+            step_logits = logits[:, -1] + mask
+            if step == 0:
+                step_logits[:, blank] = float('-inf')  # Don't start with a blank or end immediately
+            logprobs = F.log_softmax(step_logits, dim=-1)
+            next_tokens = step_logits.argmax(dim=-1)
+            # Finished clips keep emitting <|endoftext|>, which adds nothing to their sum
+            next_tokens[finished] = tokenizer.eot
+            token_logprobs = logprobs.gather(1, next_tokens[:, None]).squeeze(1)
+            sum_logprobs += torch.where(finished, torch.zeros_like(token_logprobs), token_logprobs)
+            finished |= next_tokens == tokenizer.eot
+            tokens = torch.cat([tokens, next_tokens[:, None]], dim=-1)
+            if finished.all():
+                break
+    finally:
+        for hook in hooks:
+            hook.remove()
+
+    results = []
+    for row, sum_logprob, no_speech_prob in zip(tokens[:, initial_length:].tolist(), sum_logprobs.tolist(), no_speech_probs):
+        if tokenizer.eot in row:
+            row = row[:row.index(tokenizer.eot)]
+        results.append((row, sum_logprob, no_speech_prob))
+    return results
+
+
+@torch.no_grad()
+def transcribe_short_batch(model, audios, language=None, prompt=None):
+    """
+    Transcribe several clips of at most SHORT_WINDOW_BUCKETS[-1] seconds as one
+    batch: every clip is padded to the window of the longest one, encoded together
+    and decoded together. A prompt is given to the decoder as previous text, which
+    biases it towards the prompt's words (as transcribe's initial_prompt).
+    Returns a ShortTranscription per clip.
+    """
+    window_seconds = window_bucket(max(len(audio) for audio in audios) / SAMPLE_RATE)
+    if window_seconds is None:
+        raise ValueError(f"Clips must be at most {SHORT_WINDOW_BUCKETS[-1]} seconds long")
+
+    mel = torch.cat([window_mel(model, audio, window_seconds) for audio in audios])
+    audio_features = encode_window(model, mel)
+    if language is not None:
+        languages = [language] * len(audios)
+    elif model.is_multilingual:
+        languages = detect_language(model, audio_features)
+    else:
+        languages = ['en'] * len(audios)
+
+    tokenizer = get_tokenizer(model.is_multilingual, num_languages=model.num_languages)
+    prefix = []
+    if prompt:
+        prompt_tokens = tokenizer.encode(' ' + prompt.strip())
+        prefix = [tokenizer.sot_prev] + prompt_tokens[-(model.dims.n_text_ctx // 2 - 1):]
+    initial_tokens = [
+        prefix + list(get_tokenizer(
+            model.is_multilingual, num_languages=model.num_languages, language=clip_language, task='transcribe'
+        ).sot_sequence_including_notimestamps)
+        for clip_language in languages
+    ]
+    max_tokens = int(window_seconds * MAX_TOKENS_PER_SECOND)
+    decoded = greedy_decode(model, audio_features, initial_tokens, max_tokens)
+
+    results = []
+    for clip_language, (tokens, sum_logprob, no_speech_prob) in zip(languages, decoded):
+        text = tokenizer.decode(tokens).strip()
+        results.append(ShortTranscription(
+            text=text,
+            language=clip_language,
+            avg_logprob=sum_logprob / (len(tokens) + 1),
+            compression_ratio=compression_ratio(text) if text else 0.0,
+            no_speech_prob=no_speech_prob,
+            window_seconds=window_seconds,
+        ))
+    return results
+
+
+def transcribe_short(model, audio, language=None):
+    """
+    Transcribe a clip of at most SHORT_WINDOW_BUCKETS[-1] seconds with a shortened
+    encoder window. Returns a ShortTranscription, or None when the clip is too long.
+    """
+    if window_bucket(len(audio) / SAMPLE_RATE) is None:
+        return None
+    return transcribe_short_batch(model, [audio], language)[0]
+
+
+def is_silence(result):
+    return result.no_speech_prob > NO_SPEECH_THRESHOLD and result.avg_logprob < NO_SPEECH_MAX_AVG_LOGPROB
+
+
+def is_confident(result):
+    return (
+        result.avg_logprob >= SHORT_PATH_MIN_AVG_LOGPROB
+        and result.compression_ratio <= SHORT_PATH_MAX_COMPRESSION_RATIO
+    )
+
+
+def segments_avg_logprob(result):
+    """Average log probability of a model.transcribe result (0 when there are no segments)"""
+    segments = result.get('segments') or []
+    if not segments:
+        return 0.0
+    return sum(segment['avg_logprob'] for segment in segments) / len(segments)
+
+
+def load_cpu_settings(path=CPU_SETTINGS_PATH):
+    """DEFAULT_CPU_SETTINGS updated with the autotuned settings file, if there is one"""
+    settings = dict(DEFAULT_CPU_SETTINGS)
+    if os.path.exists(path):
+        with open(path, encoding='utf-8') as f:
+            settings.update({key: value for key, value in json.load(f).items() if key in DEFAULT_CPU_SETTINGS})
+    return settings
+
+
+def apply_thread_settings(settings):
+    """Set torch's thread pools. Must run before the first inference: the inter-op pool
+    can't be resized once it has started."""
+    if settings['intra_op_threads']:
+        torch.set_num_threads(settings['intra_op_threads'])
+    if settings['inter_op_threads']:
+        torch.set_num_interop_threads(settings['inter_op_threads'])
+
+
+def plain_linear_layers(module):
+    """
+    Replace Whisper's Linear subclass (which casts its weights to the input dtype) with
+    torch.nn.Linear sharing the same parameters: dynamic quantization only converts
+    modules whose type is exactly nn.Linear.
+    """
+    for name, child in module.named_children():
+        if isinstance(child, torch.nn.Linear) and type(child) is not torch.nn.Linear:
+            linear = torch.nn.Linear(child.in_features, child.out_features, bias=child.bias is not None)
+            linear.weight = child.weight
+            linear.bias = child.bias
+            setattr(module, name, linear)
+        else:
+            plain_linear_layers(child)
+
+
+def quantize_model(model):
+    """Dynamic int8 quantization of every linear layer, in place. Weights are quantized
+    once, activations per call; conv layers, layer norms and embeddings stay fp32."""
+    plain_linear_layers(model)
+    torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+    return model
+
+
+def prepare_model(model, settings):
+    if settings['quantize'] and model.device.type == 'cpu':
+        quantize_model(model)
+    return model
+
+
+@torch.no_grad()
+def warm_up(model):
+    """Run both inference paths once, so the first request doesn't pay for lazy initialization"""
+    silence = np.zeros(SAMPLE_RATE, dtype=np.float32)
+    transcribe_short_batch(model, [silence], language='en')
+    model.transcribe(silence, language='en', fp16=False)